@@ -5,8 +5,17 @@ import logging
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
 
-from .const import DOMAIN, PLATFORMS
+from .const import (
+    CONF_FLEET,
+    DATA_FLEETS,
+    DATA_PRICE_SERVICE,
+    DOMAIN,
+    GRID_MODE_NONE,
+    PLATFORMS,
+)
 from .coordinator import ZendureSmartFlowCoordinator
+from .fleet import FleetDispatcher
+from .services import async_setup_services, async_unload_services
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -17,8 +26,23 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     coordinator = ZendureSmartFlowCoordinator(hass, entry)
     hass.data[DOMAIN][entry.entry_id] = coordinator
 
-    await coordinator.async_config_entry_first_refresh()
+    # fleet mode: entries on the same grid meter share one control loop
+    if entry.data.get(CONF_FLEET) and coordinator.entities.grid_mode != GRID_MODE_NONE:
+        key = coordinator.entities.meter_key()
+        fleets = hass.data.setdefault(DATA_FLEETS, {})
+        coordinator.async_join_fleet(fleets.setdefault(key, FleetDispatcher(key)))
+
+    try:
+        await coordinator.async_config_entry_first_refresh()
+    except Exception:
+        # setup is retried with a new coordinator
+        coordinator.async_leave_fleet()
+        coordinator.async_release_prices()
+        raise
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+
+    coordinator.async_start_event_listeners()
+    async_setup_services(hass)
     return True
 
 
@@ -28,4 +52,11 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         coordinator = hass.data.get(DOMAIN, {}).pop(entry.entry_id, None)
         if coordinator:
             await coordinator.async_shutdown()
+        fleets = hass.data.get(DATA_FLEETS, {})
+        for key in [key for key, fleet in fleets.items() if not fleet.members]:
+            del fleets[key]
+        prices = hass.data.get(DATA_PRICE_SERVICE)
+        if prices is not None and not prices:
+            del hass.data[DATA_PRICE_SERVICE]
+        async_unload_services(hass)
     return unload_ok
@@ -0,0 +1,388 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any
+
+from homeassistant.const import STATE_UNAVAILABLE, STATE_UNKNOWN
+from homeassistant.core import Event, EventStateChangedData, HomeAssistant, callback
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.event import async_track_state_change_event
+
+from .const import (
+    ACTUATION_CONFIRM_TIMEOUT_S,
+    ACTUATION_RECHECK_MAX_S,
+    ACTUATION_RECHECK_S,
+    ACTUATION_RETRIES,
+    ACTUATION_TOLERANCE_W,
+    ZENDURE_MODE_INPUT,
+)
+from .local_api import LocalTransport, ZendureLocalError
+from .state import ControllerState
+from .timing import StageTimer
+from .write_budget import WriteBudget
+
+_LOGGER = logging.getLogger(__name__)
+
+# ==================================================
+# Geordnete Ansteuerung mit Zustandsbestätigung
+#
+# Reihenfolge: (output_limit = 0 vor AC-Eingang) -> AC-Modus -> Limits.
+# Jeder Schritt wartet, bis das Gerät den neuen Wert meldet (Timeout,
+# Wiederholungen) – über die Zendure-Entitäten oder direkt über die
+# lokale Geräte-API (local_api.py). Läuft als Hintergrund-Task; ein neuer Sollwert während
+# der Sequenz ersetzt den alten, bereits bestätigte Schritte bleiben.
+# Limits laufen über das Schreibbudget (write_budget.py): zu kleine
+# Änderungen entfallen, ohne Token wartet die Sequenz auf den neuesten Wert.
+# Limits werden vorher auf min/max/step der Ziel-Entity begrenzt. Meldet das
+# Gerät einen Wert nach allen Versuchen nicht, gilt er als angenommen
+# (unbestätigt) und wird mit wachsendem Abstand erneut geprüft, statt ihn
+# im nächsten Zyklus sofort wieder zu schreiben.
+# ==================================================
+
+
+@dataclass(frozen=True, slots=True)
+class Target:
+    mode: str
+    input_w: int
+    output_w: int
+    error_w: float | None = None  # controller error for the change threshold
+
+
+@dataclass(frozen=True, slots=True)
+class _Step:
+    key: str  # ControllerState field of the confirmed value
+    domain: str
+    service: str
+    entity_id: str
+    value: Any
+    mandatory: bool = False  # not subject to the write budget
+
+
+@dataclass(slots=True)
+class _Unconfirmed:
+    step: _Step
+    backoff_s: float
+    due: float | None  # monotonic time of the next recheck, None: rewrite pending
+
+
+class Actuator:
+    """Ordered, confirmed writes of AC mode and input/output limits."""
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        state: ControllerState,
+        *,
+        ac_mode: str,
+        input_limit: str,
+        output_limit: str,
+        timeout_s: float = ACTUATION_CONFIRM_TIMEOUT_S,
+        retries: int = ACTUATION_RETRIES,
+        budget: WriteBudget | None = None,
+        transport: EntityTransport | LocalTransport | None = None,
+        timings: StageTimer | None = None,
+    ) -> None:
+        self.hass = hass
+        self.transport = transport or EntityTransport(hass)
+        # confirmed values live in the controller state
+        # (last_set_mode / last_set_input_w / last_set_output_w)
+        self._state = state
+        self._ac_mode = ac_mode
+        self._input_limit = input_limit
+        self._output_limit = output_limit
+        self.timeout_s = timeout_s
+        self.retries = retries
+        self.budget = budget or WriteBudget()
+        self.timings = timings
+
+        self._target: Target | None = None
+        self._task: asyncio.Task | None = None
+        self._unconfirmed: dict[str, _Unconfirmed] = {}
+
+        self.stats: dict[str, Any] = {
+            "writes": 0,
+            "confirmed": 0,
+            "timeouts": 0,
+            "failed": 0,
+            "late_confirmed": 0,
+            "last_confirm_s": None,
+            "max_confirm_s": 0.0,
+            "last_sequence_s": None,
+        }
+
+    @property
+    def busy(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @callback
+    def submit(
+        self,
+        mode: str,
+        input_w: float,
+        output_w: float,
+        *,
+        error_w: float | None = None,
+    ) -> None:
+        """New setpoint; starts the sequence unless one is already running."""
+        target = Target(
+            mode=mode,
+            input_w=int(round(float(input_w), 0)),
+            output_w=int(round(float(output_w), 0)),
+            error_w=error_w,
+        )
+        self._count_replaced(target)
+        self._target = target
+        if self.busy or (self._next_step() is None and not self._recheck_due()):
+            return
+        self._task = self.hass.async_create_background_task(
+            self._run(), "zendure_smartflow_ai_actuation"
+        )
+
+    def expected_output_w(self) -> int | None:
+        """Output limit the device holds or gets next (confirmed, or written when a token is back)."""
+        target = self._target
+        last = self._state.last_set_output_w
+        if target is None:
+            return last
+        value = self.transport.clamp(self._output_limit, target.output_w)
+        if value != last and not self.budget.worth_writing(value, last, target.error_w):
+            return last  # below the write threshold: never written
+        return value
+
+    def _count_replaced(self, new: Target) -> None:
+        old = self._target
+        if old is None:
+            return
+        for key, old_w, new_w in (
+            ("last_set_input_w", old.input_w, new.input_w),
+            ("last_set_output_w", old.output_w, new.output_w),
+        ):
+            last = getattr(self._state, key)
+            if old_w == new_w or old_w == last:
+                continue
+            if self.busy:
+                # still waiting (token / earlier step): newer value replaces it
+                self.budget.coalesced += 1
+            elif new_w != last:
+                self.budget.suppressed += 1
+
+    async def async_cancel(self) -> None:
+        if self.busy:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    def _next_step(self) -> _Step | None:
+        target = self._target
+        if target is None:
+            return None
+        st = self._state
+
+        # Zendure requires output_limit=0 before AC input
+        if (
+            target.mode == ZENDURE_MODE_INPUT
+            and st.last_set_mode != ZENDURE_MODE_INPUT
+            and st.last_set_output_w != 0
+        ):
+            return _Step(
+                "last_set_output_w", "number", "set_value", self._output_limit, 0, mandatory=True
+            )
+
+        if st.last_set_mode != target.mode:
+            return _Step(
+                "last_set_mode", "select", "select_option", self._ac_mode, target.mode, mandatory=True
+            )
+        for key, entity_id, value in (
+            ("last_set_input_w", self._input_limit, target.input_w),
+            ("last_set_output_w", self._output_limit, target.output_w),
+        ):
+            # the device cannot hold more than its entity allows
+            value = self.transport.clamp(entity_id, value)
+            last = getattr(st, key)
+            if last != value and self.budget.worth_writing(value, last, target.error_w):
+                return _Step(key, "number", "set_value", entity_id, value)
+        return None
+
+    # --------------------------------------------------
+    # unconfirmed values
+    # --------------------------------------------------
+    def _recheck_due(self) -> bool:
+        now = time.monotonic()
+        return any(u.due is not None and u.due <= now for u in self._unconfirmed.values())
+
+    def _mark_unconfirmed(self, step: _Step) -> None:
+        """Keep the written value as assumed and recheck it later."""
+        prev = self._unconfirmed.get(step.key)
+        repeated = prev is not None and prev.step.value == step.value
+        backoff_s = (
+            min(prev.backoff_s * 2.0, ACTUATION_RECHECK_MAX_S) if repeated else ACTUATION_RECHECK_S
+        )
+        self._unconfirmed[step.key] = _Unconfirmed(step, backoff_s, time.monotonic() + backoff_s)
+        setattr(self._state, step.key, step.value)
+        self.stats["failed"] += 1
+
+        log = _LOGGER.debug if repeated else _LOGGER.warning
+        log(
+            "Zendure: %s did not report %s after %s attempts (%s), rechecking in %.0f s",
+            step.key,
+            step.value,
+            1 + self.retries,
+            self.transport.name,
+            backoff_s,
+        )
+
+    async def _recheck(self) -> None:
+        now = time.monotonic()
+        for key, pending in list(self._unconfirmed.items()):
+            if pending.due is None or pending.due > now:
+                continue
+            step = pending.step
+            if await self.transport.async_matches(step, ACTUATION_TOLERANCE_W):
+                # confirmation was only late (slow cloud echo)
+                del self._unconfirmed[key]
+                self.stats["late_confirmed"] += 1
+                continue
+            pending.due = None
+            if getattr(self._state, key) == step.value:
+                # still not there: one more write, backoff grows if it fails again
+                setattr(self._state, key, None)
+
+    async def _run(self) -> None:
+        t0 = time.monotonic()
+        await self._recheck()
+        while (step := self._next_step()) is not None:
+            if not step.mandatory:
+                wait_s = self.budget.bucket.wait_s(time.monotonic())
+                if wait_s > 0.0:
+                    # out of tokens: wait, then write whatever is newest by then
+                    self.budget.throttled += 1
+                    await asyncio.sleep(wait_s)
+                    continue
+
+            if not await self._apply(step):
+                self._mark_unconfirmed(step)
+                return
+            self._unconfirmed.pop(step.key, None)
+        dt = time.monotonic() - t0
+        self.stats["last_sequence_s"] = round(dt, 2)
+        if self.timings is not None:
+            self.timings.record("actuation_sequence", dt)
+
+    async def _charge(self, step: _Step) -> None:
+        """One token per device write, retries included."""
+        bucket = self.budget.bucket
+        if step.mandatory:
+            bucket.take(time.monotonic())
+            self.budget.mandatory += 1
+            return
+        while not bucket.try_take(time.monotonic()):
+            self.budget.throttled += 1
+            await asyncio.sleep(bucket.wait_s(time.monotonic()))
+        self.budget.issued += 1
+
+    async def _apply(self, step: _Step) -> bool:
+        """Write one value and wait until the device reports it."""
+        transport = self.transport
+        tolerance = ACTUATION_TOLERANCE_W
+
+        # already there (restart, manual change, earlier attempt): no write
+        if await transport.async_matches(step, tolerance):
+            setattr(self._state, step.key, step.value)
+            return True
+
+        for attempt in range(1 + self.retries):
+            await self._charge(step)
+            t0 = time.monotonic()
+            self.stats["writes"] += 1
+            try:
+                ok = await transport.async_write_confirmed(step, self.timeout_s, tolerance)
+            except (HomeAssistantError, ZendureLocalError) as err:
+                _LOGGER.debug("Zendure: writing %s failed: %s", step.key, err)
+                continue
+            if not ok:
+                self.stats["timeouts"] += 1
+                _LOGGER.debug(
+                    "Zendure: %s=%s not confirmed (attempt %s)",
+                    step.key,
+                    step.value,
+                    attempt + 1,
+                )
+                continue
+
+            dt = time.monotonic() - t0
+            self.stats["confirmed"] += 1
+            self.stats["last_confirm_s"] = round(dt, 2)
+            self.stats["max_confirm_s"] = round(max(self.stats["max_confirm_s"], dt), 2)
+            setattr(self._state, step.key, step.value)
+            return True
+        return False
+
+
+class EntityTransport:
+    """Actuator transport via the Zendure integration's select/number entities."""
+
+    name = "entities"
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self.hass = hass
+
+    def clamp(self, entity_id: str, value: int) -> int:
+        """Limit to the number entity's min/max and round to its step."""
+        st = self.hass.states.get(entity_id)
+        if st is None:
+            return value
+        try:
+            lo = float(st.attributes.get("min", value))
+            hi = float(st.attributes.get("max", value))
+            step = float(st.attributes.get("step") or 1.0)
+        except (TypeError, ValueError):
+            return value
+        clamped = min(max(float(value), lo), hi)
+        if step > 1.0:
+            clamped = lo + round((clamped - lo) / step) * step
+        return int(round(min(clamped, hi), 0))
+
+    def _reported(self, step: _Step, tolerance_w: float) -> bool:
+        st = self.hass.states.get(step.entity_id)
+        if st is None or st.state in (STATE_UNKNOWN, STATE_UNAVAILABLE):
+            return False
+        if step.domain == "select":
+            return st.state == step.value
+        try:
+            return abs(float(st.state) - float(step.value)) <= tolerance_w
+        except (TypeError, ValueError):
+            return False
+
+    async def async_matches(self, step: _Step, tolerance_w: float) -> bool:
+        return self._reported(step, tolerance_w)
+
+    async def async_write_confirmed(self, step: _Step, timeout_s: float, tolerance_w: float) -> bool:
+        confirmed = asyncio.Event()
+
+        @callback
+        def _on_change(_event: Event[EventStateChangedData]) -> None:
+            if self._reported(step, tolerance_w):
+                confirmed.set()
+
+        unsub = async_track_state_change_event(self.hass, [step.entity_id], _on_change)
+        try:
+            data_key = "option" if step.domain == "select" else "value"
+            await self.hass.services.async_call(
+                step.domain,
+                step.service,
+                {"entity_id": step.entity_id, data_key: step.value},
+                blocking=True,
+            )
+            async with asyncio.timeout(timeout_s):
+                await confirmed.wait()
+            return True
+        except TimeoutError:
+            return False
+        finally:
+            unsub()
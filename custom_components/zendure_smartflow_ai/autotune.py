@@ -0,0 +1,289 @@
+from __future__ import annotations
+
+from collections import deque
+from collections.abc import Mapping
+from dataclasses import dataclass
+from statistics import fmean, median, pstdev
+from typing import Any
+
+from .const import (
+    AUTOTUNE_MIN_SAMPLES,
+    AUTOTUNE_PROBE_HOLD_S,
+    AUTOTUNE_PROBE_INTERVAL_S,
+    AUTOTUNE_PROBE_W,
+)
+
+# ==================================================
+# Auto-Tune der Entladeregelung
+#
+# Während der Regler entlädt, wird die Ausgangsleistung zuerst
+# AUTOTUNE_PROBE_HOLD_S auf einem festen Wert gehalten (Mittel der letzten
+# Sollwerte, eingeschwungener Netzbezug = Basis), dann um AUTOTUNE_PROBE_W
+# abgesenkt (mehr Netzbezug, nie Einspeisung) und erneut gehalten.
+# Aus der Antwort des Netzzählers ergeben sich Totzeit (Schreiben -> 50 %
+# der Antwort sichtbar), Streckenverstärkung (Δ Netz / Δ Ausgang) und
+# Messrauschen.
+# ==================================================
+
+# so viele Sollwerte bilden den Haltewert für die Basismessung
+HISTORY_LEN = 10
+
+# Sicherheitsfaktor: Totzeit-Vorhersage ist nie exakt (Zählertakt, Rampe)
+KP_SAFETY = 0.6
+
+# Parameter, die das Auto-Tune über das eingebaute Profil legt
+TUNED_KEYS = (
+    "KP_UP",
+    "KP_DOWN",
+    "MAX_STEP_UP",
+    "MAX_STEP_DOWN",
+    "DEADBAND_W",
+    "EXPORT_GUARD_W",
+    "DEAD_TIME_S",
+    "DEAD_TIME_SPREAD_S",
+)
+
+
+@dataclass(frozen=True, slots=True)
+class StepSample:
+    dead_time_s: float
+    gain: float
+    noise_w: float
+    cycle_s: float
+
+
+def _clamp(v: float, lo: float, hi: float) -> float:
+    return max(lo, min(hi, v))
+
+
+def derive_profile(
+    base: Mapping[str, float],
+    *,
+    dead_time_s: float,
+    gain: float,
+    noise_w: float,
+    cycle_s: float,
+) -> dict[str, float]:
+    """
+    Controller parameters for the measured installation.
+
+    The engine predicts writes that are not yet visible in the meter reading
+    (DEAD_TIME_S), so the error it corrects is not stale and one step may
+    close it (kp * gain < 1). The measured dead time is the first cycle
+    showing the response, i.e. up to one cycle late: centre the prediction
+    half a cycle earlier and fade it out over two cycles.
+    """
+    g = max(gain, 0.1)
+    kp_limit = 1.0 / g
+
+    kp_up = _clamp(KP_SAFETY * kp_limit, 0.1, 1.0)
+    down_ratio = float(base["KP_DOWN"]) / float(base["KP_UP"])
+    kp_down = _clamp(min(kp_up * down_ratio, kp_limit), 0.1, 1.0)
+
+    def _step(key: str, kp_new: float, kp_key: str) -> float:
+        b = float(base[key])
+        return round(_clamp(b * kp_new / float(base[kp_key]), 0.5 * b, 2.0 * b), 0)
+
+    deadband = round(_clamp(3.0 * noise_w, float(base["DEADBAND_W"]), 150.0), 0)
+
+    return {
+        "KP_UP": round(kp_up, 2),
+        "KP_DOWN": round(kp_down, 2),
+        "MAX_STEP_UP": _step("MAX_STEP_UP", kp_up, "KP_UP"),
+        "MAX_STEP_DOWN": _step("MAX_STEP_DOWN", kp_down, "KP_DOWN"),
+        "DEADBAND_W": deadband,
+        "EXPORT_GUARD_W": max(float(base["EXPORT_GUARD_W"]), deadband + 5.0),
+        "DEAD_TIME_S": round(max(dead_time_s - 0.5 * cycle_s, 0.0), 1),
+        "DEAD_TIME_SPREAD_S": round(2.0 * cycle_s, 1),
+    }
+
+
+class AutoTuner:
+    """Step-response learner; feed every control cycle while learning."""
+
+    def __init__(
+        self,
+        base: Mapping[str, float],
+        *,
+        probe_w: float = AUTOTUNE_PROBE_W,
+        hold_s: float = AUTOTUNE_PROBE_HOLD_S,
+        interval_s: float = AUTOTUNE_PROBE_INTERVAL_S,
+        min_samples: int = AUTOTUNE_MIN_SAMPLES,
+    ) -> None:
+        self.base = base
+        self.probe_w = probe_w
+        self.hold_s = hold_s
+        self.interval_s = interval_s
+        self.min_samples = min_samples
+
+        self.samples: list[StepSample] = []
+        self.rejected = 0
+
+        self._history: deque[float] = deque(maxlen=HISTORY_LEN)
+        self._intervals: deque[float] = deque(maxlen=30)
+        self._last_ts: float | None = None
+        self._last_probe_ts: float | None = None
+
+        # active probe: phase "settle" (hold base value) -> "step" (hold base - probe)
+        self._phase: str | None = None
+        self._t0 = 0.0
+        self._hold_w = 0.0
+        self._settle: list[tuple[float, float]] = []
+        self._baseline = 0.0
+        self._noise = 0.0
+        self._response: list[tuple[float, float]] = []
+
+    @property
+    def done(self) -> bool:
+        return len(self.samples) >= self.min_samples
+
+    @property
+    def probing(self) -> bool:
+        return self._phase is not None
+
+    def observe(
+        self,
+        ts: float,
+        grid_w: float,
+        out_w: float,
+        *,
+        discharging: bool,
+    ) -> float | None:
+        """
+        One control cycle (grid_w = meter reading, out_w = controller setpoint).
+
+        Returns the output limit to write instead of out_w while a probe runs.
+        """
+        if self._last_ts is not None and ts > self._last_ts:
+            self._intervals.append(ts - self._last_ts)
+        self._last_ts = ts
+
+        if self._phase is not None:
+            return self._observe_probe(ts, grid_w, discharging)
+
+        if not discharging:
+            self._history.clear()
+            return None
+        self._history.append(out_w)
+
+        hold_w = min(fmean(self._history), out_w)
+        if (
+            self.done
+            or len(self._history) < HISTORY_LEN
+            or hold_w - self.probe_w < float(self.base.get("KEEPALIVE_MIN_OUTPUT_W", 0.0))
+            or (self._last_probe_ts is not None and ts - self._last_probe_ts < self.interval_s)
+        ):
+            return None
+
+        self._phase = "settle"
+        self._t0 = ts
+        self._last_probe_ts = ts
+        self._hold_w = round(hold_w, 0)
+        self._settle = []
+        return self._hold_w
+
+    def _observe_probe(self, ts: float, grid_w: float, discharging: bool) -> float | None:
+        dt = ts - self._t0
+
+        # controller left discharging or we export: give control back
+        if not discharging or grid_w < -float(self.base.get("EXPORT_GUARD_W", 0.0)):
+            self._end_probe(None)
+            return None
+
+        if self._phase == "settle":
+            if dt < self.hold_s:
+                self._settle.append((dt, grid_w))
+                return self._hold_w
+
+            # second half of the hold = settled baseline
+            tail = [g for t, g in self._settle if t >= self.hold_s / 2.0]
+            if len(tail) < 2:
+                self._end_probe(None)
+                return None
+            self._baseline = fmean(tail)
+            self._noise = pstdev(tail)
+            if self._noise > self.probe_w / 2.0:
+                # load not steady, a step would drown in it
+                self._end_probe(None)
+                return None
+
+            self._phase = "step"
+            self._t0 = ts
+            self._hold_w -= self.probe_w
+            self._response = []
+            return self._hold_w
+
+        # disturbance (load step, PV) during the step: discard
+        if (
+            grid_w < self._baseline - 2.0 * self.probe_w
+            or grid_w > self._baseline + 3.0 * self.probe_w
+        ):
+            self._end_probe(None)
+            return None
+
+        self._response.append((dt, grid_w))
+        if dt < self.hold_s:
+            return self._hold_w
+
+        self._end_probe(self._evaluate())
+        return None
+
+    def _end_probe(self, sample: StepSample | None) -> None:
+        if sample is None:
+            self.rejected += 1
+        else:
+            self.samples.append(sample)
+        self._phase = None
+        self._settle = []
+        self._response = []
+        self._history.clear()
+
+    def _evaluate(self) -> StepSample | None:
+        tail = [g for dt, g in self._response if dt >= self.hold_s * 2.0 / 3.0]
+        if len(tail) < 2 or not self._intervals:
+            return None
+
+        rise = fmean(tail) - self._baseline
+        gain = rise / self.probe_w
+        if not 0.3 <= gain <= 2.0:
+            return None
+
+        threshold = self._baseline + 0.5 * rise
+        dead_time = next((dt for dt, g in self._response if g >= threshold), None)
+        if dead_time is None:
+            return None
+
+        return StepSample(
+            dead_time_s=dead_time,
+            gain=gain,
+            noise_w=self._noise,
+            cycle_s=median(self._intervals),
+        )
+
+    def estimates(self) -> dict[str, Any] | None:
+        if not self.samples:
+            return None
+        return {
+            "dead_time_s": round(median(s.dead_time_s for s in self.samples), 1),
+            "gain": round(median(s.gain for s in self.samples), 2),
+            "noise_w": round(median(s.noise_w for s in self.samples), 1),
+            "cycle_s": round(median(s.cycle_s for s in self.samples), 1),
+            "samples": len(self.samples),
+            "rejected": self.rejected,
+        }
+
+    def result(self) -> dict[str, Any] | None:
+        """Persistable result once enough probes were collected."""
+        if not self.done:
+            return None
+        est = self.estimates()
+        return {
+            **est,
+            "profile": derive_profile(
+                self.base,
+                dead_time_s=est["dead_time_s"],
+                gain=est["gain"],
+                noise_w=est["noise_w"],
+                cycle_s=est["cycle_s"],
+            ),
+        }
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+from collections import deque
+from math import sqrt
+from typing import Any
+
+from .const import (
+    CADENCE_ACTION_FAST_S,
+    CADENCE_ACTION_NEAR_S,
+    CADENCE_CALM_W,
+    CADENCE_FAST,
+    CADENCE_IDLE,
+    CADENCE_NORMAL,
+    CADENCE_VOLATILE_W,
+    CADENCE_WINDOW_S,
+    CADENCES,
+)
+
+# ==================================================
+# Adaptive Taktung des Coordinators
+#
+# fast:   Laden/Entladen gegen schwankende Netzleistung oder geplante
+#         Aktion unmittelbar bevorstehend
+# idle:   Leerlauf, Akku auf SoC-Minimum, keine geplante Aktion in Sicht
+# normal: alles andere
+# ==================================================
+
+# SoC-Toleranz für "Akku leer" (Anzeige springt in ganzen Prozent)
+IDLE_SOC_MARGIN = 1.0
+
+
+class GridVolatility:
+    """Standard deviation of the net grid power over a sliding time window."""
+
+    def __init__(self, window_s: float = CADENCE_WINDOW_S) -> None:
+        self.window_s = window_s
+        self._samples: deque[tuple[float, float]] = deque()
+        self._sum = 0.0
+        self._sum_sq = 0.0
+
+    def add(self, ts: float, grid_w: float) -> None:
+        self._samples.append((ts, grid_w))
+        self._sum += grid_w
+        self._sum_sq += grid_w * grid_w
+        while self._samples and ts - self._samples[0][0] > self.window_s:
+            _, old = self._samples.popleft()
+            self._sum -= old
+            self._sum_sq -= old * old
+
+    @property
+    def std_w(self) -> float:
+        n = len(self._samples)
+        if n < 2:
+            return 0.0
+        mean = self._sum / n
+        return sqrt(max(self._sum_sq / n - mean * mean, 0.0))
+
+
+def choose_cadence(
+    *,
+    current: str | None,
+    power_state: str,
+    grid_std_w: float,
+    soc: float,
+    soc_min: float,
+    seconds_to_action: float | None,
+    emergency: bool,
+) -> str:
+    """Cadence for the next cycle (hysteresis on the volatility threshold)."""
+    if seconds_to_action is not None and seconds_to_action <= CADENCE_ACTION_FAST_S:
+        return CADENCE_FAST
+
+    if power_state != "idle":
+        threshold = CADENCE_CALM_W if current == CADENCE_FAST else CADENCE_VOLATILE_W
+        return CADENCE_FAST if grid_std_w >= threshold else CADENCE_NORMAL
+
+    if (
+        not emergency
+        and soc <= soc_min + IDLE_SOC_MARGIN
+        and (seconds_to_action is None or seconds_to_action > CADENCE_ACTION_NEAR_S)
+    ):
+        return CADENCE_IDLE
+
+    return CADENCE_NORMAL
+
+
+class CadenceStats:
+    """Time spent at each cadence and number of switches."""
+
+    def __init__(self) -> None:
+        self.current: str | None = None
+        self.changes = 0
+        self.seconds: dict[str, float] = {c: 0.0 for c in CADENCES}
+        self._last_ts: float | None = None
+
+    def update(self, ts: float, cadence: str) -> bool:
+        """Account the time since the last cycle, True if the cadence changed."""
+        if self.current is not None and self._last_ts is not None and ts > self._last_ts:
+            self.seconds[self.current] += ts - self._last_ts
+        self._last_ts = ts
+
+        if cadence == self.current:
+            return False
+        if self.current is not None:
+            self.changes += 1
+        self.current = cadence
+        return True
+
+    def as_dict(self) -> dict[str, Any]:
+        total = sum(self.seconds.values())
+        return {
+            "current": self.current,
+            "changes": self.changes,
+            "seconds": {c: round(s, 0) for c, s in self.seconds.items()},
+            "share_pct": {
+                c: round(100.0 * s / total, 1) if total > 0 else 0.0
+                for c, s in self.seconds.items()
+            },
+        }
@@ -6,6 +6,7 @@ import voluptuous as vol
 
 from homeassistant import config_entries
 from homeassistant.helpers import selector
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
 
 from .const import (
     DOMAIN,
@@ -20,6 +21,9 @@ from .const import (
     CONF_GRID_POWER_ENTITY,
     CONF_GRID_IMPORT_ENTITY,
     CONF_GRID_EXPORT_ENTITY,
+    CONF_LOCAL_HOST,
+    CONF_FLEET,
+    CONF_BATTERY_CAPACITY,
     GRID_MODE_NONE,
     GRID_MODE_SINGLE,
     GRID_MODE_SPLIT,
@@ -28,6 +32,7 @@ from .const import (
     DEVICE_PROFILE_SF800PRO,
     DEFAULT_DEVICE_PROFILE,
 )
+from .local_api import ZendureLocalClient, ZendureLocalError
 
 
 class ZendureSmartFlowConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
@@ -39,13 +44,18 @@ class ZendureSmartFlowConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     # INITIAL SETUP
     # -----------------------------------------------------
     async def async_step_user(self, user_input: dict[str, Any] | None = None):
+        errors: dict[str, str] = {}
+
         if user_input is not None:
-            self._user_input = user_input
-            return await self.async_step_grid()
+            errors = await self._async_check_local_host(user_input)
+            if not errors:
+                self._user_input = user_input
+                return await self.async_step_grid()
 
         return self.async_show_form(
             step_id="user",
             data_schema=self._base_schema(),
+            errors=errors,
         )
 
     async def async_step_grid(self, user_input: dict[str, Any] | None = None):
@@ -76,15 +86,22 @@ class ZendureSmartFlowConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     # -----------------------------------------------------
     async def async_step_reconfigure(self, user_input: dict[str, Any] | None = None):
         entry = self._get_reconfigure_entry()
+        errors: dict[str, str] = {}
 
         if user_input is not None:
-            self._user_input = dict(entry.data)
-            self._user_input.update(user_input)
-            return await self.async_step_reconfigure_grid()
+            errors = await self._async_check_local_host(user_input)
+            if not errors:
+                self._user_input = dict(entry.data)
+                # cleared optional fields must not keep their old value
+                for key in (CONF_LOCAL_HOST, CONF_BATTERY_CAPACITY):
+                    self._user_input.pop(key, None)
+                self._user_input.update(user_input)
+                return await self.async_step_reconfigure_grid()
 
         return self.async_show_form(
             step_id="reconfigure",
             data_schema=self._base_schema(entry),
+            errors=errors,
         )
 
     async def async_step_reconfigure_grid(self, user_input: dict[str, Any] | None = None):
@@ -110,7 +127,7 @@ class ZendureSmartFlowConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             if not errors:
                 return self.async_update_reload_and_abort(
                     entry,
-                    data_updates=cleaned,
+                    data=cleaned,
                     reason="reconfigure_success",
                 )
 
@@ -120,6 +137,23 @@ class ZendureSmartFlowConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             errors=errors,
         )
 
+    # -----------------------------------------------------
+    # LOCAL DEVICE API (optional)
+    # -----------------------------------------------------
+    async def _async_check_local_host(self, user_input: dict[str, Any]) -> dict[str, str]:
+        host = str(user_input.get(CONF_LOCAL_HOST) or "").strip()
+        if not host:
+            user_input.pop(CONF_LOCAL_HOST, None)
+            return {}
+
+        user_input[CONF_LOCAL_HOST] = host
+        client = ZendureLocalClient(async_get_clientsession(self.hass), host)
+        try:
+            await client.async_report()
+        except ZendureLocalError:
+            return {"base": "cannot_connect"}
+        return {}
+
     # -----------------------------------------------------
     # SCHEMAS
     # -----------------------------------------------------
@@ -148,6 +182,19 @@ class ZendureSmartFlowConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                         ]
                     )
                 ),
+
+                vol.Optional(
+                    CONF_BATTERY_CAPACITY,
+                    description={"suggested_value": _val(CONF_BATTERY_CAPACITY)},
+                ): selector.NumberSelector(
+                    selector.NumberSelectorConfig(
+                        min=0.5,
+                        max=50.0,
+                        step=0.01,
+                        mode=selector.NumberSelectorMode.BOX,
+                        unit_of_measurement="kWh",
+                    )
+                ),
                 
                 vol.Required(CONF_SOC_ENTITY, default=_val(CONF_SOC_ENTITY)):
                     selector.EntitySelector(selector.EntitySelectorConfig(domain="sensor")),
@@ -170,6 +217,14 @@ class ZendureSmartFlowConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 vol.Required(CONF_OUTPUT_LIMIT_ENTITY, default=_val(CONF_OUTPUT_LIMIT_ENTITY)):
                     selector.EntitySelector(selector.EntitySelectorConfig(domain="number")),
 
+                vol.Optional(
+                    CONF_LOCAL_HOST,
+                    description={"suggested_value": _val(CONF_LOCAL_HOST)},
+                ): selector.TextSelector(),
+
+                vol.Optional(CONF_FLEET, default=bool(_val(CONF_FLEET))):
+                    selector.BooleanSelector(),
+
                 vol.Required(CONF_GRID_MODE, default=_val(CONF_GRID_MODE) or GRID_MODE_SINGLE):
                     selector.SelectSelector(
                         selector.SelectSelectorConfig(
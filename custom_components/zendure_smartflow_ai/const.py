@@ -33,6 +33,15 @@ CONF_AC_MODE_ENTITY = "ac_mode_entity"            # select input/output
 CONF_INPUT_LIMIT_ENTITY = "input_limit_entity"    # number W
 CONF_OUTPUT_LIMIT_ENTITY = "output_limit_entity"  # number W
 
+# Optional: lokale HTTP-API des Geräts (zenSDK) statt der Zendure-Entitäten
+CONF_LOCAL_HOST = "local_host"                    # IP / Hostname des SolarFlow
+
+# Optional: mit anderen Einträgen am selben Netzzähler als Flotte regeln
+CONF_FLEET = "fleet"
+
+# Optional: nutzbare Akkukapazität, sonst aus dem Geräteprofil
+CONF_BATTERY_CAPACITY = "battery_capacity_kwh"    # kWh
+
 # Grid Setup (empfohlen, weil wir daraus den Hausverbrauch intern berechnen)
 CONF_GRID_MODE = "grid_mode"
 CONF_GRID_POWER_ENTITY = "grid_power_entity"      # +import / -export
@@ -70,6 +79,20 @@ MANUAL_DISCHARGE = "discharge"
 
 MANUAL_ACTIONS = [MANUAL_STANDBY, MANUAL_CHARGE, MANUAL_DISCHARGE]
 
+# Preisplanung: Peak-Fenster (Heuristik) oder Optimierer (dynamische Programmierung)
+PLANNING_STRATEGY_PEAK_WINDOW = "peak_window"
+PLANNING_STRATEGY_OPTIMIZER = "optimizer"
+
+PLANNING_STRATEGIES = [PLANNING_STRATEGY_PEAK_WINDOW, PLANNING_STRATEGY_OPTIMIZER]
+
+# Auto-Tune der Reglerparameter: aus = eingebautes Profil,
+# lernen = Sprungantworten messen, aktiv = gelernte Werte über das Profil legen
+AUTOTUNE_OFF = "off"
+AUTOTUNE_LEARN = "learn"
+AUTOTUNE_ACTIVE = "active"
+
+AUTOTUNE_MODES = [AUTOTUNE_OFF, AUTOTUNE_LEARN, AUTOTUNE_ACTIVE]
+
 # ==================================================
 # Settings (Number entities) – entity keys
 # ==================================================
@@ -85,11 +108,93 @@ SETTING_EMERGENCY_SOC = "emergency_soc"           # Notladung wenn SoC <= x
 SETTING_EMERGENCY_CHARGE = "emergency_charge"     # Notladeleistung (W)
 
 SETTING_PROFIT_MARGIN_PCT = "profit_margin_pct"   # Arbitrage/Planung
+SETTING_PLANNING_CHARGE_W = "planning_charge_w"   # geplante Ladeleistung je Slot (W)
 
 # ==================================================
 # Defaults
 # ==================================================
-UPDATE_INTERVAL = 10  # seconds
+UPDATE_INTERVAL = 10  # seconds (Fallback-Poll, falls der Netzzähler keine Events liefert)
+
+# Adaptive Taktung: Fallback-Poll (und Event-Entprellung im Leerlauf) je nach Lage
+CADENCE_FAST = "fast"
+CADENCE_NORMAL = "normal"
+CADENCE_IDLE = "idle"
+CADENCES = [CADENCE_FAST, CADENCE_NORMAL, CADENCE_IDLE]
+UPDATE_INTERVAL_FAST = 5  # seconds (Lade-/Entladebetrieb bei schwankender Last)
+UPDATE_INTERVAL_IDLE = 60  # seconds (Leerlauf, Akku auf SoC-Minimum)
+IDLE_EVENT_DEBOUNCE_S = 10.0  # seconds
+CADENCE_WINDOW_S = 60.0  # Fenster für die Schwankung der Netzleistung
+CADENCE_VOLATILE_W = 80.0  # Standardabweichung Netz, ab der schnell getaktet wird
+CADENCE_CALM_W = 50.0  # ... und unter der wieder normal (Hysterese)
+CADENCE_ACTION_FAST_S = 60.0  # geplante Aktion so nah -> schnell
+CADENCE_ACTION_NEAR_S = 900.0  # geplante Aktion so nah -> kein Leerlauf-Takt
+
+# Event-getriebene Regelung: minimaler Abstand zwischen zwei durch
+# Zustandsänderungen (Netz/SoC/PV) ausgelösten Zyklen
+EVENT_DEBOUNCE_S = 2.0  # seconds
+
+# Ansteuerung: jeder Schritt wartet, bis die Ziel-Entity den neuen Wert meldet
+ACTUATION_CONFIRM_TIMEOUT_S = 5.0  # seconds je Versuch
+ACTUATION_RETRIES = 2  # Wiederholungen nach dem ersten Versuch
+ACTUATION_TOLERANCE_W = 5.0  # Gerät rundet Limits teils auf eigene Schritte
+# Nicht bestätigter Wert bleibt als angenommen stehen und wird erst nach
+# dieser Wartezeit erneut gegen den gemeldeten Zustand geprüft (verdoppelt
+# sich bei jedem weiteren Fehlschlag desselben Werts)
+ACTUATION_RECHECK_S = 30.0  # seconds
+ACTUATION_RECHECK_MAX_S = 600.0  # seconds
+
+# Lokale Geräte-API (local_api.py)
+LOCAL_API_TIMEOUT_S = 3.0  # seconds je HTTP-Anfrage
+LOCAL_API_POLL_S = 0.1  # seconds zwischen zwei Rücklesungen nach dem Schreiben
+
+# Schreibbudget für Leistungslimits (write_budget.py)
+WRITE_BUDGET_PER_MIN = 12  # Limits je Minute (Token-Bucket)
+WRITE_BUDGET_BURST = 4  # so viele Schreibzugriffe dürfen direkt hintereinander
+WRITE_MIN_DELTA_W = 10.0  # Mindeständerung bei großem Regelfehler
+WRITE_MAX_DELTA_W = 40.0  # Mindeständerung nahe am Ziel
+WRITE_ERROR_SCALE_W = 200.0  # ab diesem Regelfehler gilt WRITE_MIN_DELTA_W
+
+# Laufzeitmessung: so viele Zyklen je Stufe für p50/p95/max (timing.py)
+TIMING_WINDOW = 300
+
+# Service profile_cycles: cProfile der nächsten N Zyklen (profiling.py)
+SERVICE_PROFILE_CYCLES = "profile_cycles"
+ATTR_CYCLES = "cycles"
+PROFILE_CYCLES_DEFAULT = 20
+PROFILE_CYCLES_MAX = 1000
+
+# Flottenbetrieb (fleet.py)
+DATA_FLEETS = f"{DOMAIN}_fleets"  # hass.data: Netzzähler -> FleetDispatcher
+FLEET_MIN_SHARE_W = 50.0  # kleinere Anteile gehen an die übrigen Geräte
+
+# Gemeinsamer Preisdienst (price_service.py)
+DATA_PRICE_SERVICE = f"{DOMAIN}_prices"  # hass.data: Preis-Entität -> PriceCurve
+
+# Persistenz: Zähler/Latches werden verzögert und zusammengefasst gespeichert
+SAVE_DELAY_S = 120  # seconds
+
+# Preisplanung (langsame Schleife): nur an Slotgrenzen, bei neuen Preisdaten
+# oder wenn sich der SoC seit der letzten Planung deutlich verändert hat
+PLANNING_SLOT_MINUTES = 15
+PLANNING_SOC_DELTA = 2.0  # % SoC
+
+# Zeitgenaue Weckzeitpunkte (statt auf den nächsten Poll zu warten):
+# Slotgrenze, latest_start und so lange vor dem nächsten Preispeak
+WAKEUP_PEAK_LEAD_MINUTES = 30
+WAKEUP_OFFSET_S = 1.0  # nach der Slotgrenze, damit der neue Preis sicher gilt
+
+# Optimierer: Horizont; Batteriekapazität nur als Rückfall, wenn weder
+# Eintrag noch Geräteprofil eine liefern (BATTERY_CAPACITY_KWH)
+OPTIMIZER_HORIZON_H = 48
+OPTIMIZER_SOC_STEP = 1.0  # % SoC je DP-Zustand
+DEFAULT_BATTERY_CAPACITY_KWH = 1.92
+DEFAULT_ROUND_TRIP_EFFICIENCY = 0.85
+
+# Auto-Tune: Testsprung der Ausgangsleistung (nach unten -> nie Einspeisung)
+AUTOTUNE_PROBE_W = 100.0
+AUTOTUNE_PROBE_HOLD_S = 20.0  # Regler hält den Sprung so lange fest
+AUTOTUNE_PROBE_INTERVAL_S = 300.0  # Mindestabstand zwischen zwei Testsprüngen
+AUTOTUNE_MIN_SAMPLES = 5
 
 DEFAULT_SOC_MIN = 12.0
 DEFAULT_SOC_MAX = 100.0  # Herstellerempfehlung ✔
@@ -105,6 +210,11 @@ DEFAULT_EMERGENCY_CHARGE = 1200.0
 
 DEFAULT_PROFIT_MARGIN_PCT = 27.0
 
+# Geplantes Laden: erst alle günstigen Slots mit dieser Leistung füllen,
+# nur wenn das nicht reicht bis zur maximalen Ladeleistung aufstocken
+DEFAULT_PLANNING_CHARGE_W = 800.0
+PLANNING_MIN_CHARGE_W = 100.0  # kleinere Restleistung in einem Slot wird angehoben
+
 # ==================================================
 # Status / Enum values (internal)
 # ==================================================
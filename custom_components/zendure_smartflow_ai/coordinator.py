@@ -4,18 +4,66 @@ import logging
 from dataclasses import dataclass
 from datetime import timedelta
 from typing import Any
+from .actuation import Actuator
+from .local_api import LocalTransport, ZendureLocalClient
+from .autotune import TUNED_KEYS, AutoTuner
+from .cadence import CadenceStats, GridVolatility, choose_cadence
 from .device_profiles import DEVICE_PROFILES
+from .engine import (
+    Decision,
+    Measurements,
+    Settings,
+    decide,
+    store_planning,
+    track_applied_output,
+    update_analytics,
+)
+from .fleet import FleetDispatcher, FleetUnit, aggregate, split_setpoint
+from .planner import evaluate_price_planning
+from .price_curve import PriceCurve
+from .price_service import PriceService
+from .state import ControllerState, migrate_v1
+from .profiling import CycleProfiler
+from .timing import StageTimer
 from .const import CONF_DEVICE_PROFILE, DEFAULT_DEVICE_PROFILE
 
+from homeassistant.components import persistent_notification
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.const import STATE_UNAVAILABLE, STATE_UNKNOWN
+from homeassistant.core import (
+    CALLBACK_TYPE,
+    Event,
+    EventStateChangedData,
+    HomeAssistant,
+    callback,
+)
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.debounce import Debouncer
+from homeassistant.helpers.event import (
+    async_track_point_in_utc_time,
+    async_track_state_change_event,
+)
 from homeassistant.helpers.storage import Store
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 from homeassistant.util import dt as dt_util
 
 from .const import (
+    DATA_PRICE_SERVICE,
     DOMAIN,
     UPDATE_INTERVAL,
+    UPDATE_INTERVAL_FAST,
+    UPDATE_INTERVAL_IDLE,
+    EVENT_DEBOUNCE_S,
+    IDLE_EVENT_DEBOUNCE_S,
+    CADENCE_FAST,
+    CADENCE_IDLE,
+    SAVE_DELAY_S,
+    PLANNING_SLOT_MINUTES,
+    PLANNING_SOC_DELTA,
+    WAKEUP_PEAK_LEAD_MINUTES,
+    WAKEUP_OFFSET_S,
+    DEFAULT_BATTERY_CAPACITY_KWH,
+    DEFAULT_ROUND_TRIP_EFFICIENCY,
     # config keys
     CONF_SOC_ENTITY,
     CONF_PV_ENTITY,
@@ -28,6 +76,8 @@ from .const import (
     CONF_GRID_POWER_ENTITY,
     CONF_GRID_IMPORT_ENTITY,
     CONF_GRID_EXPORT_ENTITY,
+    CONF_LOCAL_HOST,
+    CONF_BATTERY_CAPACITY,
     GRID_MODE_NONE,
     GRID_MODE_SINGLE,
     GRID_MODE_SPLIT,
@@ -41,6 +91,7 @@ from .const import (
     SETTING_EMERGENCY_SOC,
     SETTING_EMERGENCY_CHARGE,
     SETTING_PROFIT_MARGIN_PCT,
+    SETTING_PLANNING_CHARGE_W,
     # defaults
     DEFAULT_SOC_MIN,
     DEFAULT_SOC_MAX,
@@ -51,36 +102,50 @@ from .const import (
     DEFAULT_EMERGENCY_SOC,
     DEFAULT_EMERGENCY_CHARGE,
     DEFAULT_PROFIT_MARGIN_PCT,
+    DEFAULT_PLANNING_CHARGE_W,
     # modes
     AI_MODE_AUTOMATIC,
-    AI_MODE_SUMMER,
-    AI_MODE_WINTER,
     AI_MODE_MANUAL,
     MANUAL_STANDBY,
     MANUAL_CHARGE,
     MANUAL_DISCHARGE,
+    PLANNING_STRATEGY_PEAK_WINDOW,
+    AUTOTUNE_OFF,
+    AUTOTUNE_LEARN,
+    AUTOTUNE_ACTIVE,
     # statuses
     STATUS_INIT,
     STATUS_OK,
     STATUS_SENSOR_INVALID,
     STATUS_PRICE_INVALID,
     AI_STATUS_STANDBY,
-    AI_STATUS_CHARGE_SURPLUS,
-    AI_STATUS_COVER_DEFICIT,
-    AI_STATUS_EXPENSIVE_DISCHARGE,
-    AI_STATUS_VERY_EXPENSIVE_FORCE,
-    AI_STATUS_EMERGENCY_CHARGE,
-    AI_STATUS_MANUAL,
     RECO_STANDBY,
-    RECO_CHARGE,
-    RECO_DISCHARGE,
-    RECO_EMERGENCY,
-    ZENDURE_MODE_INPUT,
     ZENDURE_MODE_OUTPUT,
 )
 
 _LOGGER = logging.getLogger(__name__)
-STORE_VERSION = 1
+STORE_VERSION = 2  # 2: ControllerState.durable() (state.py)
+
+# cadence -> (fallback poll s, event debounce s)
+CADENCE_TIMING = {
+    CADENCE_FAST: (UPDATE_INTERVAL_FAST, EVENT_DEBOUNCE_S),
+    CADENCE_IDLE: (UPDATE_INTERVAL_IDLE, IDLE_EVENT_DEBOUNCE_S),
+}
+
+
+class ZendureStore(Store[dict[str, Any]]):
+    """Store with the v1 (free-form dict) -> v2 (ControllerState.durable) migration."""
+
+    async def _async_migrate_func(
+        self,
+        old_major_version: int,
+        old_minor_version: int,
+        old_data: dict[str, Any],
+    ) -> dict[str, Any]:
+        if old_major_version == 1:
+            return migrate_v1(old_data if isinstance(old_data, dict) else {})
+        return old_data
+
 
 def _to_float(v: Any, default: float | None = None) -> float | None:
     try:
@@ -110,6 +175,19 @@ class SelectedEntities:
     grid_import: str | None
     grid_export: str | None
 
+    def trigger_entities(self) -> list[str]:
+        """Entities whose state changes should trigger a control cycle."""
+        ids: list[str | None] = [self.soc, self.pv]
+        if self.grid_mode == GRID_MODE_SINGLE:
+            ids.append(self.grid_power)
+        elif self.grid_mode == GRID_MODE_SPLIT:
+            ids.extend((self.grid_import, self.grid_export))
+        return [eid for eid in ids if eid]
+
+    def meter_key(self) -> tuple[str, str | None, str | None, str | None]:
+        """Entries with the same key read the same grid meter (fleet mode)."""
+        return (self.grid_mode, self.grid_power, self.grid_import, self.grid_export)
+
 
 class ZendureSmartFlowCoordinator(DataUpdateCoordinator[dict[str, Any]]):
     def __init__(self, hass: HomeAssistant, entry: ConfigEntry) -> None:
@@ -145,72 +223,358 @@ class ZendureSmartFlowCoordinator(DataUpdateCoordinator[dict[str, Any]]):
         self.runtime_mode: dict[str, Any] = {
             "ai_mode": AI_MODE_AUTOMATIC,
             "manual_action": MANUAL_STANDBY,
+            "planning_strategy": PLANNING_STRATEGY_PEAK_WINDOW,
+            "autotune": AUTOTUNE_OFF,
         }
 
-        self._store = Store(hass, STORE_VERSION, f"{DOMAIN}.{entry.entry_id}")
-        self._persist: dict[str, Any] = {
-            "runtime_mode": dict(self.runtime_mode),
-            # hysteresis
-            "pv_surplus_cnt": 0,
-            "pv_clear_cnt": 0,
-            # emergency latch
-            "emergency_active": False,
-            # planning
-            "planning_checked": False,
-            "planning_status": "not_checked",
-            "planning_blocked_by": None,
-            "planning_active": False,
-            "planning_target_soc": None,
-            "planning_next_peak": None,
-            "planning_reason": None,
-            # analytics
-            "trade_avg_charge_price": None,
-            "trade_charged_kwh": 0.0,
-            "prev_soc": None,
-            # last applied setpoints
-            "last_set_mode": None,
-            "last_set_input_w": None,
-            "last_set_output_w": None,
-            # energy/profit counters
-            "avg_charge_price": None,
-            "charged_kwh": 0.0,
-            "discharged_kwh": 0.0,
-            "profit_eur": 0.0,
-            "last_ts": None,
-            # state
-            "power_state": "idle",  # idle | discharging | charging
-            "price_discharge_latched": False,
-            # transparency
-            "next_action_time": None,
-            # smoothing
-            "ema_deficit": None,
-            "ema_surplus": None,
-            "ema_house_load": None,
-            "ema_last_ts": None,
-            # discharge controller memory
-            "discharge_target_w": 0.0,
-            # planning transparency
-            "next_planned_action": None,  # charge | discharge | wait | emergency | none
-            "next_planned_action_time": None,  # ISO timestamp / ""
-        }
+        self._store = ZendureStore(hass, STORE_VERSION, f"{DOMAIN}.{entry.entry_id}")
+        self._loaded = False
+        self._saved: dict[str, Any] | None = None  # last durable snapshot written
+        self._save_scheduled = False
+        # controller / analytics state (state.py), durable part in the Store
+        self._ctrl = ControllerState()
+
+        # auto-tune learner (volatile, only while runtime_mode autotune == learn)
+        self._autotuner: AutoTuner | None = None
+
+        # parsed price export, shared with every entry on the same price entity
+        self._prices: PriceService = hass.data.setdefault(DATA_PRICE_SERVICE, PriceService())
+        if self.entities.price_export:
+            self._prices.acquire(self.entities.price_export, entry.entry_id)
+        self._price_curve: PriceCurve | None = None
+
+        # slow planning loop cache (re-evaluated only when _planning_due)
+        self._planning: dict[str, Any] | None = None
+        self._planning_inputs: tuple | None = None
+        self._planning_soc: float | None = None
+        self._planning_price_stamp: Any = None
+        self._planning_valid_until: Any = None
+
+        # event-driven control (V1.5.x): state listeners of meter / SoC / PV
+        self._unsub_state_listeners: CALLBACK_TYPE | None = None
+        self._listen = False
+
+        # fleet mode: several entries on one grid meter (fleet.py)
+        self._fleet: FleetDispatcher | None = None
+
+        # hardware writes (output=0 -> AC mode -> limits, each confirmed),
+        # optionally straight to the device's local API
+        local_host = entry.data.get(CONF_LOCAL_HOST)
+        # per-stage run time of the update cycle (timing.py)
+        self._timings = StageTimer()
+        # cProfile over the next N cycles (service profile_cycles), else None
+        self._profiler: CycleProfiler | None = None
+        self._actuator = Actuator(
+            hass,
+            self._ctrl,
+            ac_mode=self.entities.ac_mode,
+            input_limit=self.entities.input_limit,
+            output_limit=self.entities.output_limit,
+            transport=(
+                LocalTransport(ZendureLocalClient(async_get_clientsession(hass), local_host))
+                if local_host
+                else None
+            ),
+            timings=self._timings,
+        )
+
+        # point-in-time wakeup for the next planning event
+        self._unsub_wakeup: CALLBACK_TYPE | None = None
+        self._wakeup_at: Any = None
+
+        # adaptive cadence (fallback poll + idle debounce)
+        self._grid_volatility = GridVolatility()
+        self._cadence = CadenceStats()
+        self._refresh_debouncer = Debouncer(
+            hass,
+            _LOGGER,
+            cooldown=EVENT_DEBOUNCE_S,
+            immediate=True,
+        )
 
         super().__init__(
             hass,
             _LOGGER,
             name="Zendure SmartFlow AI",
+            # timed fallback poll – regular cycles are triggered by meter events
             update_interval=timedelta(seconds=UPDATE_INTERVAL),
+            request_refresh_debouncer=self._refresh_debouncer,
+        )
+
+    # --------------------------------------------------
+    # event-driven control loop
+    # --------------------------------------------------
+    @callback
+    def async_start_event_listeners(self) -> None:
+        """Run the control step on every new grid meter / SoC / PV reading."""
+        self._listen = True
+        self._async_subscribe_inputs()
+
+    @callback
+    def _async_subscribe_inputs(self) -> None:
+        self._async_stop_event_listeners()
+        if not self._listen or not self.fleet_leader:
+            return
+
+        # fleet leader: the meter once, SoC / PV of every member
+        members = self._fleet.members.values() if self._fleet else (self,)
+        entity_ids = list(
+            dict.fromkeys(eid for member in members for eid in member.entities.trigger_entities())
+        )
+        if not entity_ids:
+            return
+
+        self._unsub_state_listeners = async_track_state_change_event(
+            self.hass, entity_ids, self._async_handle_input_change
+        )
+        _LOGGER.debug("Zendure: event-driven control on %s", entity_ids)
+
+    @callback
+    def _async_stop_event_listeners(self) -> None:
+        if self._unsub_state_listeners is not None:
+            self._unsub_state_listeners()
+            self._unsub_state_listeners = None
+
+    @callback
+    def _async_handle_input_change(self, event: Event[EventStateChangedData]) -> None:
+        new_state = event.data["new_state"]
+        if new_state is None or new_state.state in (STATE_UNKNOWN, STATE_UNAVAILABLE):
+            return
+
+        # attribute-only updates carry no new reading
+        old_state = event.data["old_state"]
+        if old_state is not None and old_state.state == new_state.state:
+            return
+
+        # debounced: bursts within EVENT_DEBOUNCE_S collapse into one cycle,
+        # every refresh also re-arms the (cadence dependent) fallback poll
+        self.hass.async_create_task(self.async_request_refresh())
+
+    # --------------------------------------------------
+    # fleet mode (several batteries on one grid meter, fleet.py)
+    # --------------------------------------------------
+    @property
+    def fleet_leader(self) -> bool:
+        return self._fleet is None or self._fleet.is_leader(self)
+
+    @callback
+    def async_join_fleet(self, fleet: FleetDispatcher) -> None:
+        self._fleet = fleet
+        fleet.add(self)
+        for member in list(fleet.members.values()):
+            member.async_update_fleet_role()
+
+    @callback
+    def async_leave_fleet(self) -> None:
+        fleet, self._fleet = self._fleet, None
+        if fleet is None:
+            return
+        fleet.remove(self)
+        for member in list(fleet.members.values()):
+            member.async_update_fleet_role()
+
+    @callback
+    def async_update_fleet_role(self) -> None:
+        """Only the leader polls, listens and plans."""
+        if self.fleet_leader:
+            if self.update_interval is None:
+                # promoted (previous leader unloaded): take over right away
+                self.update_interval = timedelta(seconds=UPDATE_INTERVAL)
+                self.hass.async_create_task(self.async_request_refresh())
+        else:
+            self.update_interval = None
+            self._async_cancel_wakeup()
+        self._async_subscribe_inputs()
+
+    def fleet_unit(self) -> FleetUnit | None:
+        soc = _to_float(self._state(self.entities.soc), None)
+        pv = _to_float(self._state(self.entities.pv), None)
+        if soc is None or pv is None:
+            return None
+        return self._fleet_unit(self._effective_profile(), soc, pv)
+
+    def _fleet_unit(self, profile: dict[str, float], soc: float, pv: float) -> FleetUnit:
+        soc_min, soc_max, max_charge, max_discharge = self._limits(profile)
+        return FleetUnit(
+            key=self.entry.entry_id,
+            soc=soc,
+            pv_w=pv,
+            soc_min=soc_min,
+            soc_max=soc_max,
+            max_charge=max_charge,
+            max_discharge=max_discharge,
+            efficiency=float(profile.get("ROUND_TRIP_EFF", DEFAULT_ROUND_TRIP_EFFICIENCY)),
+            capacity_kwh=self._capacity_kwh(profile),
+        )
+
+    def _fleet_dispatch(
+        self,
+        decision: Decision,
+        units: list[FleetUnit | None],
+        *,
+        error_w: float,
+    ) -> float:
+        """Split the fleet setpoint and hand every member its share; returns the held output."""
+        fleet = self._fleet
+        charge = decision.ac_mode != ZENDURE_MODE_OUTPUT
+        shares = split_setpoint(
+            decision.in_w if charge else decision.out_w,
+            [u for u in units if u is not None],
+            charge=charge,
+        )
+        readings = {u.key: u for u in units if u is not None}
+        fleet.shares = {}
+        held_w = 0.0
+        for entry_id, member in fleet.members.items():
+            share = shares.get(entry_id, 0.0)  # no reading: hold at 0 W
+            fleet.shares[entry_id] = round(share if charge else -share, 0)
+            member_w = member.async_apply_fleet_share(
+                decision,
+                readings.get(entry_id),
+                in_w=share if charge else 0.0,
+                out_w=0.0 if charge else share,
+                error_w=error_w,
+            )
+            held_w += share if charge or member_w is None else member_w
+        return held_w
+
+    @callback
+    def async_apply_fleet_share(
+        self,
+        decision: Decision,
+        unit: FleetUnit | None,
+        *,
+        in_w: float,
+        out_w: float,
+        error_w: float,
+    ) -> int | None:
+        self._actuator.submit(decision.ac_mode, in_w, out_w, error_w=error_w)
+        held_w = self._actuator.expected_output_w()
+        if self.fleet_leader:
+            return held_w
+
+        # members run no cycle of their own: publish the share here
+        self.async_set_updated_data(
+            {
+                "status": STATUS_OK if unit is not None else STATUS_SENSOR_INVALID,
+                "ai_status": decision.ai_status,
+                "recommendation": decision.recommendation,
+                "debug": "FLEET_MEMBER",
+                "details": {
+                    "fleet_role": "member",
+                    "fleet_leader": self._fleet.leader.entry.title if self._fleet else None,
+                    "soc": unit.soc if unit else None,
+                    "pv_w": unit.pv_w if unit else None,
+                    "power_state": (
+                        "charging" if in_w > 0.0 else "discharging" if out_w > 0.0 else "idle"
+                    ),
+                    "set_mode": decision.ac_mode,
+                    "set_input_w": int(round(in_w, 0)),
+                    "set_output_w": int(round(out_w, 0)),
+                    "writes_issued": self._actuator.budget.issued + self._actuator.budget.mandatory,
+                    "writes_suppressed": self._actuator.budget.suppressed + self._actuator.budget.coalesced,
+                },
+                "decision_reason": decision.decision_reason,
+                "next_action_time": None,
+                "next_planned_action_time": None,
+                "next_action_state": "none",
+                "cycle_time_ms": None,
+            }
+        )
+        return held_w
+
+    # --------------------------------------------------
+    # time-scheduled wakeups (slot boundary, latest_start, before peak)
+    # --------------------------------------------------
+    def _next_wakeup(self, now: Any) -> Any:
+        """Earliest future planning event, None if nothing is scheduled."""
+        candidates = []
+        if self._planning_valid_until is not None:
+            candidates.append(self._planning_valid_until)
+
+        planning = self._planning or {}
+        latest_start = dt_util.parse_datetime(str(planning.get("latest_start") or ""))
+        if latest_start is not None:
+            candidates.append(dt_util.as_utc(latest_start))
+        next_peak = dt_util.parse_datetime(str(planning.get("next_peak") or ""))
+        if next_peak is not None:
+            candidates.append(
+                dt_util.as_utc(next_peak) - timedelta(minutes=WAKEUP_PEAK_LEAD_MINUTES)
+            )
+
+        future = [t for t in candidates if t > now]
+        return min(future) if future else None
+
+    @callback
+    def _async_schedule_wakeup(self, now: Any) -> None:
+        when = self._next_wakeup(now)
+        if when is not None:
+            when += timedelta(seconds=WAKEUP_OFFSET_S)
+        if when == self._wakeup_at:
+            return
+        self._async_cancel_wakeup()
+        if when is None:
+            return
+        self._wakeup_at = when
+        self._unsub_wakeup = async_track_point_in_utc_time(
+            self.hass, self._async_handle_wakeup, when
         )
 
+    @callback
+    def _async_cancel_wakeup(self) -> None:
+        if self._unsub_wakeup is not None:
+            self._unsub_wakeup()
+            self._unsub_wakeup = None
+        self._wakeup_at = None
+
+    @callback
+    def _async_handle_wakeup(self, _now: Any) -> None:
+        self._unsub_wakeup = None
+        self._wakeup_at = None
+        # not debounced: the planned action should start on the second
+        self.hass.async_create_task(self.async_refresh())
+
+    async def async_shutdown(self) -> None:
+        self._listen = False
+        self.async_leave_fleet()
+        self.async_release_prices()
+        self._async_stop_event_listeners()
+        self._async_cancel_wakeup()
+        await self._actuator.async_cancel()
+        await self._save()
+        await super().async_shutdown()
+
     async def _load(self) -> None:
         data = await self._store.async_load()
         if isinstance(data, dict):
-            self._persist.update(data)
+            self._ctrl.restore(data)
             if "runtime_mode" in data and isinstance(data["runtime_mode"], dict):
                 self.runtime_mode.update(data["runtime_mode"])
+        self._saved = self._durable_snapshot()
+        self._loaded = True
+
+    def _durable_snapshot(self) -> dict[str, Any]:
+        return {"runtime_mode": dict(self.runtime_mode), **self._ctrl.durable()}
+
+    def _data_to_save(self) -> dict[str, Any]:
+        """Called by the Store when the delayed write is due (latest state wins)."""
+        self._save_scheduled = False
+        self._saved = self._durable_snapshot()
+        return self._saved
+
+    def _schedule_save(self) -> None:
+        """Delayed, coalesced save – only when a durable field actually changed."""
+        if self._save_scheduled or self._durable_snapshot() == self._saved:
+            return
+        self._save_scheduled = True
+        self._store.async_delay_save(self._data_to_save, SAVE_DELAY_S)
 
     async def _save(self) -> None:
-        self._persist["runtime_mode"] = dict(self.runtime_mode)
-        await self._store.async_save(self._persist)
+        """Immediate write (shutdown / unload)."""
+        if not self._loaded:
+            return
+        if self._save_scheduled or self._durable_snapshot() != self._saved:
+            await self._store.async_save(self._data_to_save())
 
     def _state(self, entity_id: str | None) -> Any:
         if not entity_id:
@@ -226,61 +590,192 @@ class ZendureSmartFlowCoordinator(DataUpdateCoordinator[dict[str, Any]]):
             return None
         return st.attributes.get(attr)
 
+    # --------------------------------------------------
+    # on-demand profiling (service profile_cycles)
+    # --------------------------------------------------
+    @property
+    def profiling(self) -> bool:
+        return self._profiler is not None
+
+    @callback
+    def async_start_profiling(self, cycles: int, path: str) -> None:
+        self._profiler = CycleProfiler(cycles, path)
+        _LOGGER.info("Zendure: profiling the next %s update cycles -> %s", cycles, path)
+
+    async def _async_finish_profiling(self, profiler: CycleProfiler) -> None:
+        try:
+            summary = await self.hass.async_add_executor_job(profiler.dump)
+        except OSError as err:
+            _LOGGER.error("Zendure: writing profile %s failed: %s", profiler.path, err)
+            return
+
+        _LOGGER.warning(
+            "Zendure: profile of %s cycles (%s ms) written to %s",
+            summary["cycles"],
+            summary["total_ms"],
+            summary["path"],
+        )
+        top = "\n".join(
+            f"- {row['cumulative_ms']} ms  {row['function']}"
+            for row in summary["top_cumulative"][:5]
+        )
+        persistent_notification.async_create(
+            self.hass,
+            f"{summary['cycles']} cycles, {summary['total_ms']} ms in total.\n\n"
+            f"Profile: `{summary['path']}`\n\n{top}",
+            title="Zendure SmartFlow AI – profile",
+            notification_id=f"{DOMAIN}_profile_{self.entry.entry_id}",
+        )
+
+    def diagnostics(self) -> dict[str, Any]:
+        """Snapshot for the diagnostics download (not recorded anywhere)."""
+        return {
+            "device_profile": self.device_profile_key,
+            "device_profile_cfg": dict(self._device_profile_cfg),
+            "runtime_mode": dict(self.runtime_mode),
+            "last_update_success": self.last_update_success,
+            "update_interval_s": (
+                self.update_interval.total_seconds() if self.update_interval else None
+            ),
+            "cadence": {
+                **self._cadence.as_dict(),
+                "grid_std_w": round(self._grid_volatility.std_w, 1),
+            },
+            "actuation": {
+                **self._actuator.stats,
+                "busy": self._actuator.busy,
+                "transport": self._actuator.transport.name,
+                "last_ack_s": getattr(self._actuator.transport, "last_ack_s", None),
+            },
+            "write_budget": self._actuator.budget.as_dict(),
+            "fleet": self._fleet.as_dict() if self._fleet is not None else None,
+            "timings": self._timings.summary(),
+            "autotune": self._ctrl.autotune,
+            "autotune_learning": (
+                self._autotuner.estimates() if self._autotuner else None
+            ),
+            "planning": dict(self._planning) if self._planning else None,
+            "price_curve_slots": len(self._price_curve) if self._price_curve else 0,
+            "price_service": self._prices.as_dict(),
+            "state": self._ctrl.as_dict(),
+            "data": self.data,
+        }
+
     def set_ai_mode(self, mode: str) -> None:
         self.runtime_mode["ai_mode"] = mode
 
     def set_manual_action(self, action: str) -> None:
         self.runtime_mode["manual_action"] = action
 
-    async def _set_ac_mode(self, mode: str) -> None:
-        """Set AC mode only when it actually differs from current state."""
-        current = self._state(self.entities.ac_mode)
+    # --------------------------------------------------
+    # auto-tune (learned controller parameters over the device profile)
+    # --------------------------------------------------
+    def _effective_profile(self) -> dict[str, float]:
+        base = DEVICE_PROFILES[self.device_profile_key]
+        tuned = (self._ctrl.autotune or {}).get("profile")
+        if self.runtime_mode.get("autotune") != AUTOTUNE_ACTIVE or not isinstance(tuned, dict):
+            return base
+        return {**base, **{k: float(v) for k, v in tuned.items() if k in TUNED_KEYS}}
+
+    def _autotune_step(self, now_ts: float, decision: Decision) -> None:
+        """Let the learner hold / step the output limit, store the result when done."""
+        if self._autotuner is None:
+            self._autotuner = AutoTuner(DEVICE_PROFILES[self.device_profile_key])
+
+        hold_w = self._autotuner.observe(
+            now_ts,
+            decision.net_grid_w,
+            decision.out_w,
+            discharging=decision.ac_mode == ZENDURE_MODE_OUTPUT and decision.out_w > 0.0,
+        )
+        if hold_w is not None:
+            decision.out_w = hold_w
+            decision.out_w_real = hold_w
+            decision.decision_reason = "autotune_probe"
+            self._ctrl.discharge_target_w = hold_w
+
+        result = self._autotuner.result()
+        if result is not None:
+            self._ctrl.autotune = result
+            self.runtime_mode["autotune"] = AUTOTUNE_ACTIVE
+            self._autotuner = None
+            _LOGGER.info("Zendure: auto-tune finished: %s", result)
 
-        # If HA already shows the desired option, nothing to do
-        if current == mode:
-            self._persist["last_set_mode"] = mode
-            return
+    # --------------------------------------------------
+    # settings (stored in config entry options)
+    # --------------------------------------------------
+    def _capacity_kwh(self, profile: dict[str, float]) -> float:
+        """Usable battery capacity: config entry, else device profile."""
+        configured = _to_float(
+            self.entry.options.get(CONF_BATTERY_CAPACITY, self.entry.data.get(CONF_BATTERY_CAPACITY)),
+            None,
+        )
+        if configured is not None and configured > 0.0:
+            return configured
+        return float(profile.get("BATTERY_CAPACITY_KWH", DEFAULT_BATTERY_CAPACITY_KWH))
+
+    def _limits(self, profile: dict[str, float]) -> tuple[float, float, float, float]:
+        """soc_min, soc_max, max_charge, max_discharge (clamped to the profile)."""
+        soc_min = self._get_setting(
+            SETTING_SOC_MIN,
+            profile.get("SOC_MIN", DEFAULT_SOC_MIN),
+        )
 
-        # Always try to enforce (especially important after a failed switch)
-        self._persist["last_set_mode"] = mode
-        await self.hass.services.async_call(
-            "select",
-            "select_option",
-            {"entity_id": self.entities.ac_mode, "option": mode},
-            blocking=False,
+        soc_max = self._get_setting(
+            SETTING_SOC_MAX,
+            profile.get("SOC_MAX", DEFAULT_SOC_MAX),
         )
 
-    async def _set_input_limit(self, watts: float) -> None:
-        """Set input limit only when it changes."""
-        val = int(round(float(watts), 0))
-        last = self._persist.get("last_set_input_w")
-        if last == val:
-            return
-        self._persist["last_set_input_w"] = val
-        await self.hass.services.async_call(
-            "number",
-            "set_value",
-            {"entity_id": self.entities.input_limit, "value": val},
-            blocking=False,
+        max_charge = self._get_setting(
+            SETTING_MAX_CHARGE,
+            profile.get("MAX_CHARGE_W", DEFAULT_MAX_CHARGE),
         )
 
-    async def _set_output_limit(self, watts: float) -> None:
-        """Set output limit only when it changes."""
-        val = int(round(float(watts), 0))
-        last = self._persist.get("last_set_output_w")
-        if last == val:
+        max_discharge = self._get_setting(
+            SETTING_MAX_DISCHARGE,
+            profile.get("MAX_DISCHARGE_W", DEFAULT_MAX_DISCHARGE),
+        )
+
+        # --- PROFILE HARD LIMITS (Clamp) ---
+        profile_max_in = float(profile.get("MAX_INPUT_W", max_charge))
+        profile_max_out = float(profile.get("MAX_OUTPUT_W", max_discharge))
+
+        max_charge = min(float(max_charge), profile_max_in)
+        max_discharge = min(float(max_discharge), profile_max_out)
+        return float(soc_min), float(soc_max), max_charge, max_discharge
+
+    def _seconds_to_planned_action(self, now: Any) -> float | None:
+        if self._ctrl.next_planned_action not in ("charge", "discharge"):
+            return None
+        when = dt_util.parse_datetime(str(self._ctrl.next_planned_action_time or ""))
+        if when is None:
+            return None
+        return max((dt_util.as_utc(when) - now).total_seconds(), 0.0)
+
+    def _apply_cadence(self, now: Any, decision: Decision, *, soc: float, soc_min: float) -> None:
+        """Adapt fallback poll and event debounce to power state and grid volatility."""
+        now_ts = now.timestamp()
+        self._grid_volatility.add(now_ts, decision.net_grid_w)
+        cadence = choose_cadence(
+            current=self._cadence.current,
+            power_state=self._ctrl.power_state,
+            grid_std_w=self._grid_volatility.std_w,
+            soc=soc,
+            soc_min=soc_min,
+            seconds_to_action=self._seconds_to_planned_action(now),
+            emergency=self._ctrl.emergency_active,
+        )
+        if not self._cadence.update(now_ts, cadence):
             return
-        self._persist["last_set_output_w"] = val
-        await self.hass.services.async_call(
-            "number",
-            "set_value",
-            {"entity_id": self.entities.output_limit, "value": val},
-            blocking=False,
+
+        interval_s, debounce_s = CADENCE_TIMING.get(
+            cadence, (UPDATE_INTERVAL, EVENT_DEBOUNCE_S)
         )
+        # takes effect when the coordinator re-arms its timer after this refresh
+        self.update_interval = timedelta(seconds=interval_s)
+        self._refresh_debouncer.cooldown = debounce_s
+        _LOGGER.debug("Zendure: cadence %s (poll %ss, debounce %ss)", cadence, interval_s, debounce_s)
 
-    # --------------------------------------------------
-    # settings (stored in config entry options)
-    # --------------------------------------------------
     def _get_setting(self, key: str, default: float) -> float:
         try:
             val = self.entry.options.get(key, default)
@@ -326,6 +821,8 @@ class ZendureSmartFlowCoordinator(DataUpdateCoordinator[dict[str, Any]]):
 
     def _evaluate_price_planning(
         self,
+        now_ts: float,
+        *,
         soc: float,
         soc_max: float,
         soc_min: float,
@@ -334,245 +831,106 @@ class ZendureSmartFlowCoordinator(DataUpdateCoordinator[dict[str, Any]]):
         very_expensive: float,
         profit_margin_pct: float,
         max_charge: float,
-        surplus_w: float | None,
+        max_discharge: float,
+        capacity_kwh: float,
+        slot_charge_w: float,
         ai_mode: str,
+        strategy: str = PLANNING_STRATEGY_PEAK_WINDOW,
     ) -> dict[str, Any]:
-        """Price planning: find future peak, then locate cheap window before it."""
-        result: dict[str, Any] = {
-            "action": "none",
-            "watts": 0.0,
-            "status": "not_checked",
-            "blocked_by": None,
-            "next_peak": None,
-            "reason": None,
-            "latest_start": None,
-            "target_soc": None,
-        }
-
-        # FIX #1: defensive init, damit wir nie in einen NameError laufen
-        peak_start: Any | None = None
-        peak_end: Any | None = None
-        peak_price: float | None = None
-
-        if ai_mode != AI_MODE_AUTOMATIC:
-            result.update(status="planning_inactive_mode", blocked_by="mode")
-            return result
-
-        if float(soc) >= float(soc_max) - 0.1:
-            result.update(status="planning_blocked_soc_full", blocked_by="soc")
-            return result
-
-        if price_now is None:
-            result.update(status="planning_no_price_now", blocked_by="price_now")
-            return result
-
-        if not self.entities.price_export:
-            result.update(status="planning_no_price_data", blocked_by="price_data")
-            return result
-
-        export = self._attr(self.entities.price_export, "data")
-        if not isinstance(export, list):
-            result.update(status="planning_no_price_data", blocked_by="price_data")
-            return result
-
-        now = dt_util.utcnow()
-
-        # Only consider points >= now (avoid “peaks” from the past)
-        future: list[tuple[Any, float]] = []
-        for item in export:
-            if not isinstance(item, dict):
-                continue
-
-            start = (
-                item.get("start_time")
-                or item.get("starts_at")
-                or item.get("start")
-                or item.get("time")
-            )
-            end = item.get("end_time") or item.get("ends_at")
-
-            p = _to_float(item.get("price_per_kwh"), None)
-            if not start or p is None:
-                continue
-
-            t_start = dt_util.parse_datetime(str(start))
-            if not t_start:
-                continue
-
-            # --- Tibber fallback: kein end_time → Slotdauer schätzen ---
-            if end:
-                t_end = dt_util.parse_datetime(str(end))
-                if not t_end:
-                    continue
-            else:
-                # Tibber / generisch: 15-Minuten-Slot annehmen
-                t_end = t_start + timedelta(minutes=15)
-
-            # Slot muss noch (teilweise) in der Zukunft liegen
-            if t_end <= now:
-                continue
-
-            future.append((t_start, t_end, float(p)))
-
-        if len(future) < 8:
-            result.update(status="planning_no_price_data", blocked_by="price_data")
-            return result
-
-        # Peak = Slot mit höchstem Preis
-        peak_start, peak_end, peak_price = max(
-            future,
-            key=lambda x: x[2]
+        """Price planning on the cached price curve (see planner.py)."""
+        return evaluate_price_planning(
+            self._get_price_curve(),
+            now_ts,
+            soc=soc,
+            soc_max=soc_max,
+            soc_min=soc_min,
+            price_now=price_now,
+            expensive=expensive,
+            very_expensive=very_expensive,
+            profit_margin_pct=profit_margin_pct,
+            max_charge=max_charge,
+            max_discharge=max_discharge,
+            ai_mode=ai_mode,
+            strategy=strategy,
+            capacity_kwh=capacity_kwh,
+            slot_charge_w=slot_charge_w,
+            round_trip_eff=float(
+                self._device_profile_cfg.get("ROUND_TRIP_EFF", DEFAULT_ROUND_TRIP_EFFICIENCY)
+            ),
         )
 
-        if peak_price < float(expensive) and peak_price < float(very_expensive):
-            result.update(status="planning_no_peak_detected", blocked_by=None)
-            return result
-
-        if peak_price >= float(very_expensive) and soc > soc_min:
-            result.update(
-                action="discharge",
-                status="planning_discharge_planned",
-                next_peak=peak_start.isoformat(),
-                reason="discharge_during_price_peak",
-                target_soc=soc_min,
-            )
-            return result
-
-        margin = max(float(profit_margin_pct or 0.0), 0.0) / 100.0
-        target_price = float(peak_price) * (1.0 - margin)
-
-        pre_peak = [
-            (s, e, p)
-            for (s, e, p) in future
-            if e <= peak_start
-        ]
-        if len(pre_peak) < 4:
-            result.update(status="planning_peak_detected_insufficient_window", blocked_by="price_data")
-            return result
-
-        cheap_slots = [
-            (s, e, p)
-            for (s, e, p) in pre_peak
-            if p <= target_price
-        ]
-        if not cheap_slots:
-            result.update(
-                status="planning_waiting_for_cheap_window",
-                blocked_by="price_data",
-                next_peak=peak_start.isoformat(),
-                reason="waiting_for_cheap_price",
-            )
-            return result
-
-        # letzter günstiger Slot vor dem Peak
-        last_cheap_start, last_cheap_end, last_cheap_price = max(
-            cheap_slots,
-            key=lambda x: x[0]
-        )
+    # --------------------------------------------------
+    # slow planning loop (cached between slot boundaries)
+    # --------------------------------------------------
+    @callback
+    def async_release_prices(self) -> None:
+        """Drop this entry's hold on the shared price curves."""
+        self._prices.release(self.entry.entry_id)
 
-        # --- FIX #4: Zeitfenster-basierte Entscheidung (EPEX & Tibber) ---
-        is_within_cheap_window = (
-            last_cheap_start <= now < last_cheap_end
-        )
+    def _get_price_curve(self) -> PriceCurve | None:
+        """Parsed price export (price_service.py: one parse per entity update for all entries)."""
+        if not self.entities.price_export:
+            return None
+        st = self.hass.states.get(self.entities.price_export)
+        if st is None:
+            return None
 
-        latest_cheap_time, _, _ = max(cheap_slots, key=lambda x: x[0])
-        target_soc = min(float(soc_max), float(soc) + 30.0)
-
-        if is_within_cheap_window:
-            watts = max(float(max_charge), 0.0)
-            result.update(
-                action="charge",
-                watts=watts,
-                status="planning_charge_now",
-                next_peak=peak_start.isoformat(),
-                reason="charge_before_price_peak",
-                latest_start=last_cheap_start.isoformat(),
-                target_soc=target_soc,
-            )
-            return result
-
-        result.update(
-            action="none",
-            status="planning_waiting_for_cheap_window",
-            next_peak=peak_start.isoformat(),
-            reason="waiting_for_cheap_price",
-            latest_start=latest_cheap_time.isoformat(),
-            target_soc=target_soc,
+        self._price_curve = self._prices.curve(
+            self.entities.price_export,
+            st.last_updated,
+            st.attributes.get("data"),
+            dt_util.DEFAULT_TIME_ZONE,
         )
-        return result
+        return self._price_curve
 
-    # --------------------------------------------------
-    def _delta_discharge_w(
+    def _price_data_stamp(self) -> Any:
+        """Identity of the current price curve (changes when new prices arrive)."""
+        if not self.entities.price_export:
+            return None
+        st = self.hass.states.get(self.entities.price_export)
+        return st.last_updated if st else None
+
+    def _planning_due(self, now: Any, soc: float, plan_inputs: tuple) -> bool:
+        if self._planning is None or self._planning_inputs != plan_inputs:
+            return True
+        if self._planning_valid_until is None or now >= self._planning_valid_until:
+            return True
+        if self._price_data_stamp() != self._planning_price_stamp:
+            return True
+        if self._planning_soc is None or abs(soc - self._planning_soc) >= PLANNING_SOC_DELTA:
+            return True
+        return False
+
+    def _remember_planning(
         self,
-        *,
-        deficit_w: float,
-        prev_out_w: float,
-        max_discharge: float,
+        planning: dict[str, Any],
+        now: Any,
         soc: float,
-        soc_min: float,
-        allow_zero: bool = True,
-    ) -> float:
-        """
-        Delta / incremental discharge controller:
-        drives grid import close to a small target (avoids export / oscillation).
-        """
-
-        PROFILE = self._device_profile_cfg
-
-        # Lass bewusst einen kleinen Netzbezug stehen -> verhindert Einspeisung durch Messrauschen
-        TARGET_IMPORT_W = PROFILE["TARGET_IMPORT_W"]
-        DEADBAND_W = PROFILE["DEADBAND_W"]
-
-        # Anti-Export Guard: ab dieser Einspeisung wird aggressiv reduziert
-        EXPORT_GUARD_W = PROFILE["EXPORT_GUARD_W"]
-
-        # Hard constraints
-        if soc <= soc_min + 0.05:
-            return 0.0
-
-        net = float(deficit_w)          # + import / - export
-        out_w = float(prev_out_w)
-
-        # 1) Anti-Export Guard: wenn wir exportieren, sofort stark reduzieren
-        if net < -EXPORT_GUARD_W:
-            # so weit runter, dass wir wieder Richtung TARGET_IMPORT kommen
-            cut = (abs(net) + TARGET_IMPORT_W) * 1.4
-            out_w = max(0.0, out_w - cut)
-            return float(min(float(max_discharge), out_w))
-
-        # 2) Normalregelung (Import-Target)
-        err = net - TARGET_IMPORT_W  # + => Import zu hoch => mehr entladen, - => zu wenig Import => weniger entladen
-
-        # schneller hoch, deutlich schneller runter als vorher
-        KP_UP = PROFILE["KP_UP"]
-        KP_DOWN = PROFILE["KP_DOWN"]
-        MAX_STEP_UP = PROFILE["MAX_STEP_UP"]
-        MAX_STEP_DOWN = PROFILE["MAX_STEP_DOWN"]
-
-        if err > DEADBAND_W:
-            step = min(MAX_STEP_UP, max(40.0, KP_UP * err))
-            out_w += step
-        elif err < -DEADBAND_W:
-            step = min(MAX_STEP_DOWN, max(60.0, KP_DOWN * abs(err)))
-            out_w -= step
-        else:
-            # in der Deadband: HALTEN, nicht abbauen
-            out_w = out_w
-
-        out_w = max(0.0, min(float(max_discharge), out_w))
-
-        KEEPALIVE_MIN_DEFICIT_W = PROFILE["KEEPALIVE_MIN_DEFICIT_W"]
-        KEEPALIVE_MIN_OUTPUT_W = PROFILE["KEEPALIVE_MIN_OUTPUT_W"]
+        plan_inputs: tuple,
+    ) -> None:
+        # valid until the next quarter-hour (covers 15 and 60 minute price slots)
+        slot = PLANNING_SLOT_MINUTES
+        next_boundary = now.replace(second=0, microsecond=0) + timedelta(
+            minutes=slot - (now.minute % slot)
+        )
 
-        # 3) Optional: nur wirklich bei quasi 0 Import ausmachen (nicht bei 20-30W!)
-        if allow_zero and deficit_w <= KEEPALIVE_MIN_DEFICIT_W:
-            out_w = max(out_w, KEEPALIVE_MIN_OUTPUT_W)
-        return float(out_w)
+        self._planning = planning
+        self._planning_inputs = plan_inputs
+        self._planning_soc = soc
+        self._planning_price_stamp = self._price_data_stamp()
+        self._planning_valid_until = next_boundary
 
-    # --------------------------------------------------
     async def _async_update_data(self) -> dict[str, Any]:
+        profiler = self._profiler
         try:
-            if self._persist.get("last_ts") is None:
+            if profiler is not None:
+                try:
+                    profiler.enable()
+                except (ValueError, RuntimeError) as err:
+                    # e.g. another profiler is already active: give up this capture
+                    _LOGGER.error("Zendure: profiling could not start: %s", err)
+                    self._profiler = profiler = None
+            if not self._loaded:
                 await self._load()
                 
                 # --- STEP 7.3: Migration-Safety Device Profile ---
@@ -582,42 +940,27 @@ class ZendureSmartFlowCoordinator(DataUpdateCoordinator[dict[str, Any]]):
                         CONF_DEVICE_PROFILE: DEFAULT_DEVICE_PROFILE,
                     }
                     
-                self._persist["last_ts"] = dt_util.utcnow().isoformat()
+                self._ctrl.last_ts = dt_util.utcnow().timestamp()
 
-            now = dt_util.utcnow()
+            if not self.fleet_leader:
+                # fleet member: the leader regulates and publishes our share
+                self.hass.async_create_task(self._fleet.leader.async_request_refresh())
+                return self.data or {
+                    "status": STATUS_INIT,
+                    "ai_status": AI_STATUS_STANDBY,
+                    "recommendation": RECO_STANDBY,
+                    "debug": "FLEET_MEMBER",
+                    "details": {"fleet_role": "member"},
+                    "decision_reason": "fleet_member",
+                }
 
-            house_load = 0.0
-            surplus = 0.0
-            deficit_raw = 0.0
-            pv_w = 0.0
-            price_now = None
+            lap = self._timings.lap()
+            now = dt_util.utcnow()
+            now_ts = now.timestamp()
 
             soc = _to_float(self._state(self.entities.soc), None)
             pv = _to_float(self._state(self.entities.pv), None)
 
-            # EMA helper
-            EMA_TAU_S = 45.0
-            now_ts = now.timestamp()
-
-            last_ts_ema = self._persist.get("ema_last_ts")
-            if last_ts_ema is None:
-                dt = None
-            else:
-                dt = max(now_ts - float(last_ts_ema), 0.0)
-
-            alpha = 1.0 if dt is None or dt <= 0 else min(dt / (EMA_TAU_S + dt), 1.0)
-
-            def _ema(key: str, value: float) -> float:
-                prev = self._persist.get(key)
-                if prev is None:
-                    self._persist[key] = float(value)
-                    return float(value)
-                v = (1.0 - alpha) * float(prev) + alpha * float(value)
-                self._persist[key] = float(v)
-                return float(v)
-
-            self._persist["ema_last_ts"] = float(now_ts)
-
             if soc is None or pv is None:
                 return {
                     "status": STATUS_SENSOR_INVALID,
@@ -634,34 +977,28 @@ class ZendureSmartFlowCoordinator(DataUpdateCoordinator[dict[str, Any]]):
             soc = float(soc)
             pv = float(pv)
 
-            profile = self._device_profile_cfg
-
-            soc_min = self._get_setting(
-                SETTING_SOC_MIN,
-                profile.get("SOC_MIN", DEFAULT_SOC_MIN),
-            )
-
-            soc_max = self._get_setting(
-                SETTING_SOC_MAX,
-                profile.get("SOC_MAX", DEFAULT_SOC_MAX),
+            profile = self._device_profile_cfg = self._effective_profile()
+            soc_min, soc_max, max_charge, max_discharge = self._limits(profile)
+            capacity_kwh = self._capacity_kwh(profile)
+            # planned per-slot charge power, as a share of max_charge (fleet: of the sum)
+            slot_share = (
+                min(self._get_setting(SETTING_PLANNING_CHARGE_W, DEFAULT_PLANNING_CHARGE_W) / max_charge, 1.0)
+                if max_charge > 0.0
+                else 1.0
             )
 
-            max_charge = self._get_setting(
-                SETTING_MAX_CHARGE,
-                profile.get("MAX_CHARGE_W", DEFAULT_MAX_CHARGE),
-            )
-
-            max_discharge = self._get_setting(
-                SETTING_MAX_DISCHARGE,
-                profile.get("MAX_DISCHARGE_W", DEFAULT_MAX_DISCHARGE),
-            )
-
-            # --- PROFILE HARD LIMITS (Clamp) ---
-            profile_max_in = float(self._device_profile_cfg.get("MAX_INPUT_W", max_charge))
-            profile_max_out = float(self._device_profile_cfg.get("MAX_OUTPUT_W", max_discharge))
-
-            max_charge = min(float(max_charge), profile_max_in)
-            max_discharge = min(float(max_discharge), profile_max_out)
+            # fleet leader: plan and regulate the summed battery (fleet.py)
+            fleet_units: list[FleetUnit | None] | None = None
+            if self._fleet is not None:
+                fleet_units = [
+                    self._fleet_unit(profile, soc, pv) if member is self else member.fleet_unit()
+                    for member in self._fleet.members.values()
+                ]
+                total = aggregate([u for u in fleet_units if u is not None])
+                soc, pv = total.soc, total.pv_w
+                soc_min, soc_max = total.soc_min, total.soc_max
+                max_charge, max_discharge = total.max_charge, total.max_discharge
+                capacity_kwh = total.capacity_kwh
 
             expensive = self._get_setting(SETTING_PRICE_THRESHOLD, DEFAULT_PRICE_THRESHOLD)
             very_expensive = self._get_setting(SETTING_VERY_EXPENSIVE_THRESHOLD, DEFAULT_VERY_EXPENSIVE_THRESHOLD)
@@ -670,21 +1007,10 @@ class ZendureSmartFlowCoordinator(DataUpdateCoordinator[dict[str, Any]]):
             profit_margin_pct = self._get_setting(SETTING_PROFIT_MARGIN_PCT, DEFAULT_PROFIT_MARGIN_PCT)
 
             ai_mode = self.runtime_mode.get("ai_mode", AI_MODE_AUTOMATIC)
-
-            # --- FIX: reset power_state on AI mode change ---
-            prev_ai_mode = self._persist.get("prev_ai_mode")
-            if prev_ai_mode != ai_mode:
-                self._persist["power_state"] = "idle"
-                self._persist["discharge_target_w"] = 0.0
-                _LOGGER.debug(
-                    "Zendure: AI mode changed %s → %s, resetting power_state",
-                    prev_ai_mode,
-                    ai_mode,
-                )
-
-            self._persist["prev_ai_mode"] = ai_mode
-
             manual_action = self.runtime_mode.get("manual_action", MANUAL_STANDBY)
+            planning_strategy = self.runtime_mode.get(
+                "planning_strategy", PLANNING_STRATEGY_PEAK_WINDOW
+            )
 
             grid = self._get_grid()
 
@@ -695,754 +1021,185 @@ class ZendureSmartFlowCoordinator(DataUpdateCoordinator[dict[str, Any]]):
                 deficit_raw_val, surplus_raw_val = grid
             price_now = self._get_price_now()
 
-            deficit_raw = float(deficit_raw_val) if deficit_raw_val is not None else 0.0
-            surplus_raw = float(surplus_raw_val) if surplus_raw_val is not None else 0.0
-            net_grid_w = float(deficit_raw) - float(surplus_raw)  # + import, - export
-
-            surplus = _ema("ema_surplus", surplus_raw)
-
-            pv_w = float(pv)
-            grid_import = deficit_raw if deficit_raw > 0.0 else 0.0
-            grid_export = surplus_raw if surplus_raw > 0.0 else 0.0
-
-            # --- FIX: correct house load calculation including battery discharge ---
-
-            # Battery discharge power (AC) – use last known target (safe)
-            battery_discharge = 0.0
-            if self._persist.get("power_state") == "discharging":
-                battery_discharge = float(self._persist.get("discharge_target_w") or 0.0)
-
-            # Eigenverbrauch = PV + Batterieentladung - Einspeisung
-            eigenverbrauch = max(0.0, pv_w + battery_discharge - grid_export)
-
-            # Hauslast = Netzbezug + Eigenverbrauch
-            house_load_raw = grid_import + eigenverbrauch
-            house_load_raw = max(house_load_raw, 0.0)
-
-            house_load = _ema("ema_house_load", house_load_raw) or house_load_raw
-            no_house_load = house_load < 120.0
-
-            # --- FIX: distinguish real PV surplus from battery-induced export ---
-            real_pv_surplus = (
-                surplus_raw > 80.0
-                and pv_w > surplus_raw + 50.0
-                and self._persist.get("power_state") != "discharging"
-            )
-
-            # Winter detection
-            is_winter_mode = (
-                ai_mode in (AI_MODE_WINTER, AI_MODE_AUTOMATIC)
-                and surplus < 50.0
-                and price_now is not None
-                and price_now < expensive
-            )
-
-            # PV surplus hysteresis (kept, but will NOT forcibly flip discharge -> charge anymore)
-            PV_STOP_W = 80.0
-            PV_STOP_N = 3
-
-            if real_pv_surplus:
-                self._persist["pv_surplus_cnt"] = int(self._persist.get("pv_surplus_cnt") or 0) + 1
-            else:
-                self._persist["pv_surplus_cnt"] = 0
-
-            pv_stop_discharge = int(self._persist.get("pv_surplus_cnt") or 0) >= PV_STOP_N
-
-            # Emergency latch
-            if soc <= emergency_soc:
-                self._persist["emergency_active"] = True
-            if self._persist.get("emergency_active") and soc >= soc_min:
-                self._persist["emergency_active"] = False
-
-            # IMPORTANT: used in expensive discharge decision
-            avg_charge_price = self._persist.get("trade_avg_charge_price")
-            
-            # --------------------------------------------------
-            # PRICE BASED DISCHARGE (explicit, independent of planning)
-            # --------------------------------------------------
-            PRICE_DISCHARGE_RESERVE_SOC = soc_min + 5.0
-
-            price_discharge_active = (
-                ai_mode == AI_MODE_AUTOMATIC
-                and price_now is not None
-                and avg_charge_price is not None
-                and price_now >= expensive
-                and price_now > float(avg_charge_price)
-                and soc > PRICE_DISCHARGE_RESERVE_SOC
-            )
-
-            # Decide setpoints
-            status = STATUS_OK
-            ac_mode = ZENDURE_MODE_INPUT
-            in_w = 0.0
-            out_w = 0.0
-            recommendation = RECO_STANDBY
-            decision_reason = "standby"
-            prev_power_state = str(self._persist.get("power_state") or "idle")
-            power_state = prev_power_state
-            force_no_charge = prev_power_state == "discharging"
-
-            # reset planning flags each cycle
-            self._persist["planning_checked"] = False
-            self._persist["planning_status"] = "not_checked"
-            self._persist["planning_blocked_by"] = None
-            self._persist["planning_active"] = False
-            self._persist["planning_reason"] = None
-            self._persist["planning_target_soc"] = None
-            self._persist["planning_next_peak"] = None
-
-            planning = self._evaluate_price_planning(
+            measurements = Measurements(
+                now_ts=now_ts,
                 soc=soc,
-                soc_max=soc_max,
-                soc_min=soc_min,
+                pv_w=pv,
+                deficit_w=float(deficit_raw_val) if deficit_raw_val is not None else 0.0,
+                surplus_w=float(surplus_raw_val) if surplus_raw_val is not None else 0.0,
                 price_now=price_now,
+            )
+            settings = Settings(
+                soc_min=soc_min,
+                soc_max=soc_max,
+                max_charge=max_charge,
+                max_discharge=max_discharge,
                 expensive=expensive,
                 very_expensive=very_expensive,
+                emergency_soc=emergency_soc,
+                emergency_w=emergency_w,
                 profit_margin_pct=profit_margin_pct,
-                max_charge=max_charge,
-                surplus_w=surplus,
                 ai_mode=ai_mode,
+                manual_action=manual_action,
+                profile=profile,
             )
 
-            self._persist["planning_checked"] = True
-            self._persist["planning_status"] = planning.get("status")
-            self._persist["planning_blocked_by"] = planning.get("blocked_by")
-            self._persist["planning_reason"] = planning.get("reason")
-            self._persist["planning_target_soc"] = planning.get("target_soc")
-            self._persist["planning_next_peak"] = planning.get("next_peak")
-
-            # --- ensure sensors are never None ---
-            self._persist.setdefault("next_planned_action", "none")
-            self._persist.setdefault("next_planned_action_time", "")
-
-            # --- next planned action (single source of truth) ---
-            next_action = None
-            next_time = None
-            if planning.get("action") == "discharge" and planning.get("next_peak"):
-                next_action = "discharge"
-                next_time = planning.get("next_peak")
-            elif planning.get("status") == "planning_waiting_for_cheap_window" and planning.get("latest_start"):
-                next_action = "charge"
-                next_time = planning.get("latest_start")
-            elif planning.get("status") == "planning_charge_now":
-                next_action = "charge"
-                next_time = now.isoformat()
-
-            if next_action is not None:
-                self._persist["next_planned_action"] = str(next_action)
-                self._persist["next_planned_action_time"] = str(next_time or "")
-
-            self._persist["planning_active"] = planning.get("action") in ("charge", "discharge")
+            status = STATUS_OK
+            lap.mark("inputs")
 
             # --------------------------------------------------
-            # PRICE PLANNING OVERRIDE
-            # --------------------------------------------------
-            planning_override = False
-            
+            # SLOW LOOP: price planning only on slot boundaries,
+            # new price data, changed settings or larger SoC moves
             # --------------------------------------------------
-            # PRICE BASED DISCHARGE (override everything else)
-            # --------------------------------------------------
-            if price_discharge_active:
-                planning_override = True
-                self._persist["planning_active"] = False
-
-                ac_mode = ZENDURE_MODE_OUTPUT
-                recommendation = RECO_DISCHARGE
-
-                prev_out = float(self._persist.get("discharge_target_w") or 0.0)
-                out_w = self._delta_discharge_w(
-                    deficit_w=net_grid_w,
-                    prev_out_w=prev_out,
-                    max_discharge=max_discharge,
+            plan_inputs = (
+                ai_mode,
+                price_now,
+                soc >= soc_max - 0.1,
+                soc_min,
+                soc_max,
+                expensive,
+                very_expensive,
+                profit_margin_pct,
+                max_charge,
+                max_discharge,
+                capacity_kwh,
+                slot_share,
+                planning_strategy,
+            )
+            if self._planning_due(now, soc, plan_inputs):
+                planning = self._evaluate_price_planning(
+                    now_ts,
                     soc=soc,
+                    soc_max=soc_max,
                     soc_min=soc_min,
+                    price_now=price_now,
+                    expensive=expensive,
+                    very_expensive=very_expensive,
+                    profit_margin_pct=profit_margin_pct,
+                    max_charge=max_charge,
+                    max_discharge=max_discharge,
+                    capacity_kwh=capacity_kwh,
+                    slot_charge_w=max_charge * slot_share,
+                    ai_mode=ai_mode,
+                    strategy=planning_strategy,
                 )
-                self._persist["discharge_target_w"] = float(out_w)
-
-                in_w = 0.0
-                decision_reason = "price_based_discharge"
-                self._persist["power_state"] = "discharging"
-                power_state = "discharging"
-                self._persist["price_discharge_latched"] = True
-
-            # Charge now in cheap window
-            elif (
-                ai_mode == AI_MODE_AUTOMATIC
-                and planning.get("action") == "charge"
-                and planning.get("status") == "planning_charge_now"
-                and soc < float(planning.get("target_soc") or soc_max)
-                and not self._persist.get("emergency_active")
-                and (
-                    self._persist.get("block_planning_charge_until_price") is None
-                    or price_now is None
-                    or price_now < self._persist["block_planning_charge_until_price"]
-                )
-            ):
-                planning_override = True
-                self._persist["planning_active"] = True
-
-                ac_mode = ZENDURE_MODE_INPUT
-                in_w = float(max_charge)
-                out_w = 0.0
-                recommendation = RECO_CHARGE
-                decision_reason = "planning_charge_before_peak"
-                self._persist["power_state"] = "charging"
-                power_state = "charging"
-
-            # Discharge only close to peak (next 30 min)
-            elif (
-                ai_mode == AI_MODE_AUTOMATIC
-                and planning.get("action") == "discharge"
-                and planning.get("status") == "planning_discharge_planned"
-                and planning.get("next_peak") is not None
-                and not self._persist.get("emergency_active")
-            ):
-                peak_dt = dt_util.parse_datetime(str(planning["next_peak"]))
-                if peak_dt:
-                    secs_to_peak = (peak_dt - now).total_seconds()
-                    if 0 <= secs_to_peak <= 1800 and soc > soc_min:
-                        planning_override = True
-                        self._persist["planning_active"] = True
-
-                        ac_mode = ZENDURE_MODE_OUTPUT
-                        in_w = 0.0
-
-                        prev_out = float(self._persist.get("discharge_target_w") or 0.0)
-                        out_w = self._delta_discharge_w(
-                            deficit_w=net_grid_w,
-                            prev_out_w=prev_out,
-                            max_discharge=max_discharge,
-                            soc=soc,
-                            soc_min=soc_min,
-                        )
-                        self._persist["discharge_target_w"] = float(out_w)
-
-                        recommendation = RECO_DISCHARGE
-                        decision_reason = "planning_discharge_peak"
-                        self._persist["power_state"] = "discharging"
-                        power_state = "discharging"
-
-                peak_dt = dt_util.parse_datetime(str(planning["next_peak"]))
-                if peak_dt:
-                    secs_to_peak = (peak_dt - now).total_seconds()
-                    if 0 <= secs_to_peak <= 1800 and soc > soc_min:
-                        planning_override = True
-                        self._persist["planning_active"] = True
-
-                        ac_mode = ZENDURE_MODE_OUTPUT
-                        in_w = 0.0
-                        # DELTA controller for planning discharge too
-                        prev_out = float(self._persist.get("discharge_target_w") or 0.0)
-                        out_w = self._delta_discharge_w(
-                            deficit_w=net_grid_w,
-                            prev_out_w=prev_out,
-                            max_discharge=max_discharge,
-                            soc=soc,
-                            soc_min=soc_min,
-                        )
-                        self._persist["discharge_target_w"] = float(out_w)
-
-                        recommendation = RECO_DISCHARGE
-                        decision_reason = "planning_discharge_peak"
-                        self._persist["power_state"] = "discharging"
-                        power_state = "discharging"
-
-            # 1) emergency always wins
-            if self._persist.get("emergency_active"):
-                planning_override = False
-                self._persist["planning_active"] = False
-                self._persist["price_discharge_latched"] = False
-
-                ac_mode = ZENDURE_MODE_INPUT
-                recommendation = RECO_EMERGENCY
-                in_w = min(max_charge, max(float(emergency_w), 0.0))
-                out_w = 0.0
-                decision_reason = "emergency_latched_charge"
-                self._persist["power_state"] = "charging"
-                power_state = "charging"
-
-            # --- FIX: SUMMER MODE discharge on deficit (no price logic) ---
-            elif (
-                ai_mode == AI_MODE_SUMMER
-                and deficit_raw > 80.0
-                and house_load > 150.0
-                and soc > soc_min
-            ):
-                ac_mode = ZENDURE_MODE_OUTPUT
-                recommendation = RECO_DISCHARGE
-                out_w = min(float(max_discharge), float(deficit_raw))
-                in_w = 0.0
-                decision_reason = "summer_discharge_cover_deficit"
-                self._persist["power_state"] = "discharging"
-                power_state = "discharging"
-                planning_override = True
-
-            # 2) manual mode
-            elif ai_mode == AI_MODE_MANUAL:
-                planning_override = False
-                self._persist["planning_active"] = False
-                self._persist["price_discharge_latched"] = False
-
-                if manual_action == MANUAL_STANDBY:
-                    ac_mode = ZENDURE_MODE_INPUT
-                    in_w = 0.0
-                    out_w = 0.0
-                    recommendation = RECO_STANDBY
-                    decision_reason = "manual_standby"
-                    self._persist["power_state"] = "idle"
-                    power_state = "idle"
-                    self._persist["discharge_target_w"] = 0.0
-
-                elif manual_action == MANUAL_CHARGE:
-                    ac_mode = ZENDURE_MODE_INPUT
-                    in_w = float(max_charge)
-                    out_w = 0.0
-                    recommendation = RECO_CHARGE
-                    decision_reason = "manual_charge"
-                    self._persist["power_state"] = "charging"
-                    power_state = "charging"
-                    self._persist["discharge_target_w"] = 0.0
-
-                elif manual_action == MANUAL_DISCHARGE:
-                    ac_mode = ZENDURE_MODE_OUTPUT
-                    in_w = 0.0
-
-                    prev_out = float(self._persist.get("discharge_target_w") or 0.0)
-                    out_w = self._delta_discharge_w(
-                        deficit_w=net_grid_w,
-                        prev_out_w=prev_out,
-                        max_discharge=max_discharge,
-                        soc=soc,
-                        soc_min=soc_min,
-                    )
-                    self._persist["discharge_target_w"] = float(out_w)
-
-                    recommendation = RECO_DISCHARGE
-                    decision_reason = "manual_discharge"
-                    self._persist["power_state"] = "discharging" if out_w > 0 else "idle"
-                    power_state = self._persist["power_state"]
-            
-            # --------------------------------------------------
-            # EXIT price based discharge when price advantage is gone
-            # --------------------------------------------------
-            elif (
-                self._persist.get("price_discharge_latched")
-                and self._persist.get("power_state") == "discharging"
-                and not price_discharge_active
-            ):
-                self._persist["price_discharge_latched"] = False
-                self._persist["power_state"] = "idle"
-                self._persist["discharge_target_w"] = 0.0
-
-                ac_mode = ZENDURE_MODE_INPUT
-                in_w = 0.0 
-                out_w = 0.0
-                recommendation = RECO_STANDBY
-                decision_reason = "price_discharge_exit"
-                power_state = "idle"
-                self._persist["power_state"] = "idle"
-                self._persist["discharge_target_w"] = 0.0
-
-                ac_mode = ZENDURE_MODE_INPUT
-                in_w = 0.0
-                out_w = 0.0
-                recommendation = RECO_STANDBY
-                decision_reason = "price_discharge_exit"
-                power_state = "idle"
-
-            # 3) automatic state machine (only if planning is NOT overriding)
-            elif ai_mode != AI_MODE_MANUAL and not planning_override:
-                # State transitions
-                if power_state == "charging" and (soc >= soc_max or surplus <= 0.0):
-                    power_state = "idle"
-                    self._persist["power_state"] = "idle"
-
-                    # FIX: reset input limit when leaving charging
-                    in_w = 0.0
-                    self._persist["last_set_input_w"] = None
-
-                # Stop discharging when no deficit / no load / soc too low
-                # --- HARD GUARD: never auto-switch to charging while discharging ---
-                if power_state == "discharging":
-                    # forbid charging entry regardless of PV / surplus / grid
-                    force_no_charge = True
-                else:
-                    force_no_charge = False
-                    # Stop only when there is basically no load OR SoC low
-                    if house_load <= 80.0 or soc <= soc_min:
-                        power_state = "idle"
-                        self._persist["power_state"] = "idle"
-                        self._persist["discharge_target_w"] = 0.0
-                    # near perfect balance and already low discharge => go idle
-                    elif abs(net_grid_w) <= 25.0:
-                        # Feintuning-Zone: NICHT abschalten, nur leicht nachregeln
-                        self._persist["discharge_target_w"] = max(
-                            60.0,  # Mindestleistung, damit OUTPUT aktiv bleibt
-                            float(self._persist.get("discharge_target_w") or 0.0) - 20.0,
-                        )
-                        power_state = "discharging"
-                        self._persist["power_state"] = "discharging"
-
-                if power_state == "idle":
-                    if (
-                        not is_winter_mode
-                        and house_load > 150.0
-                        and deficit_raw > 80.0
-                        and soc > soc_min
-                    ):
-                        power_state = "discharging"
-                        self._persist["power_state"] = "discharging"
-                        decision_reason = "state_enter_discharge"
-
-                    elif (
-                        real_pv_surplus
-                        and soc < soc_max
-                        and float(self._persist.get("discharge_target_w") or 0.0) == 0.0
-                    ):
-                        power_state = "charging"
-                        self._persist["power_state"] = "charging"
-                        decision_reason = "state_enter_charge"
-
-                    else:
-                        decision_reason = "state_idle"
-
-                    if house_load < 120.0:
-                        power_state = "idle"
-                        self._persist["power_state"] = "idle"
-
-                # Actions
-                if power_state == "discharging":
-                    ac_mode = ZENDURE_MODE_OUTPUT
-                    recommendation = RECO_DISCHARGE
-
-                    prev_out = float(self._persist.get("discharge_target_w") or 0.0)
-                    out_w = self._delta_discharge_w(
-                        deficit_w=net_grid_w,
-                        prev_out_w=prev_out,
-                        max_discharge=max_discharge,
-                        soc=soc,
-                        soc_min=soc_min,
-                    )
-                    self._persist["discharge_target_w"] = float(out_w)
-                    in_w = 0.0
-                    decision_reason = (
-                        decision_reason if decision_reason.startswith("state_enter") else "state_discharging"
-                    )
-
-                    # IMPORTANT: do NOT auto-flip to charging just because surplus appears
-                    # (surplus could be caused by discharge overshoot/noise).
-                    # Only allow the existing CHARGE state if it was entered from IDLE.
-                    if (
-                        pv_stop_discharge
-                        and real_pv_surplus
-                        and soc < soc_max
-                        and out_w < 120.0
-                    ):
-                        # soft stop discharge; next cycle IDLE can decide CHARGE
-                        self._persist["discharge_target_w"] = 0.0
-                        out_w = 0.0
-                        power_state = "idle"
-                        self._persist["power_state"] = "idle"
-                        decision_reason = "state_exit_discharge_pv_surplus"
-
-                elif power_state == "charging":
-                    ac_mode = ZENDURE_MODE_INPUT
-                    recommendation = RECO_CHARGE
-                    in_w = min(float(max_charge), max(float(pv_w - house_load), 0.0))
-                    out_w = 0.0
-                    self._persist["discharge_target_w"] = 0.0
-                    decision_reason = decision_reason if decision_reason.startswith("state_enter") else "state_charging"
-
-                else:
-                    ac_mode = ZENDURE_MODE_INPUT
-                    recommendation = RECO_STANDBY
-                    in_w = 0.0
-                    out_w = 0.0
-                    self._persist["discharge_target_w"] = 0.0
-
-                # Expensive / very expensive discharge forcing (uses delta too)
-                RESERVE_SOC = float(soc_min) + 5.0
-                if price_now is not None and soc > RESERVE_SOC and power_state != "charging":
-                    if price_now >= very_expensive:
-                        ac_mode = ZENDURE_MODE_OUTPUT
-                        recommendation = RECO_DISCHARGE
-                        prev_out = float(self._persist.get("discharge_target_w") or 0.0)
-                        out_w = self._delta_discharge_w(
-                            deficit_w=net_grid_w,
-                            prev_out_w=prev_out,
-                            max_discharge=max_discharge,
-                            soc=soc,
-                            soc_min=soc_min,
-                        )
-                        self._persist["discharge_target_w"] = float(out_w)
-                        in_w = 0.0
-                        decision_reason = "very_expensive_force_discharge"
-                        self._persist["power_state"] = "discharging" if out_w > 0 else "idle"
-                        power_state = self._persist["power_state"]
-
-                    elif (
-                        price_now >= expensive
-                        and power_state == "idle"
-                        and deficit_raw > 0.0
-                        and avg_charge_price is not None
-                        and price_now > float(avg_charge_price)
-                    ):
-                        ac_mode = ZENDURE_MODE_OUTPUT
-                        recommendation = RECO_DISCHARGE
-                        prev_out = float(self._persist.get("discharge_target_w") or 0.0)
-                        out_w = self._delta_discharge_w(
-                            deficit_w=net_grid_w,
-                            prev_out_w=prev_out,
-                            max_discharge=max_discharge,
-                            soc=soc,
-                            soc_min=soc_min,
-                        )
-                        self._persist["discharge_target_w"] = float(out_w)
-                        in_w = 0.0
-                        decision_reason = "expensive_discharge"
-                        self._persist["power_state"] = "discharging" if out_w > 0 else "idle"
-                        power_state = self._persist["power_state"]
-
-            # enforce SoC-min on discharge
-            if ac_mode == ZENDURE_MODE_OUTPUT and soc <= soc_min:
-                ac_mode = ZENDURE_MODE_INPUT
-                out_w = 0.0
-                self._persist["discharge_target_w"] = 0.0
-                if recommendation == RECO_DISCHARGE:
-                    recommendation = RECO_STANDBY
-                decision_reason = "soc_min_enforced"
-
-            # Apply hardware setpoints
-            if ac_mode == ZENDURE_MODE_OUTPUT:
-                in_w = 0.0
-            if ac_mode == ZENDURE_MODE_INPUT:
-                out_w = 0.0
-
-            # Zendure requires output_limit=0 before AC input
-            if ac_mode == ZENDURE_MODE_INPUT:
-                if self._persist.get("last_set_output_w", 0) != 0:
-                    await self._set_output_limit(0)
-                    _LOGGER.debug("Zendure: forcing output_limit=0 before switching to AC INPUT")
-
-            await self._set_ac_mode(ac_mode)
-
-            # Zendure safety: after switching to OUTPUT, force output_limit again
-            if ac_mode == ZENDURE_MODE_OUTPUT:
-                await self._set_output_limit(out_w)
-
-            last_mode = self._persist.get("last_set_mode")
-            if last_mode != ac_mode:
-                _LOGGER.debug("Zendure: AC mode changed, skipping limits this cycle")
+                self._remember_planning(planning, now, soc, plan_inputs)
+                store_planning(self._ctrl, planning)
             else:
-                await self._set_input_limit(in_w)
-                await self._set_output_limit(out_w)
+                planning = self._planning
+            lap.mark("planning")
 
-            is_charging = ac_mode == ZENDURE_MODE_INPUT and float(in_w) > 0.0
-            is_discharging = ac_mode == ZENDURE_MODE_OUTPUT and float(out_w) > 0.0
-
-            # Zendure OUTPUT-Safety: unter Mindestleistung gilt als AUS
-            MIN_REAL_DISCHARGE_W = 30.0
-
-            if ac_mode == ZENDURE_MODE_OUTPUT and float(out_w) < MIN_REAL_DISCHARGE_W:
-                out_w = 0.0
-    
             # --------------------------------------------------
-            # HARD SYNC: power_state follows hardware reality
+            # FAST LOOP: decision (engine.py), then hardware
             # --------------------------------------------------
-            if is_charging:
-                self._persist["power_state"] = "charging"
-                power_state = "charging"
+            learning = self.runtime_mode.get("autotune") == AUTOTUNE_LEARN
+            # the predictor is fed after the writes: with the value actually sent
+            decision = decide(self._ctrl, measurements, settings, planning, track_output=False)
 
-            elif is_discharging:
-                self._persist["power_state"] = "discharging"
-                power_state = "discharging"
-
-            else:
-                self._persist["power_state"] = "idle"
-                power_state = "idle"
-                self._persist["discharge_target_w"] = 0.0
-
-            # Zendure quirk: OUTPUT aktiv aber effektiv 0W → idle erzwingen
-            if (
-                ac_mode == ZENDURE_MODE_OUTPUT
-                and float(out_w) == 0.0
-            ):
-                self._persist["power_state"] = "idle"
-                power_state = "idle"
-
-            # NEXT ACTION TIMESTAMP
-            if self._persist.get("power_state") in ("charging", "discharging"):
-                self._persist["next_action_time"] = (
-                    self._persist.get("next_planned_action_time") or dt_util.utcnow().isoformat()
-                )
+            if learning:
+                self._autotune_step(now_ts, decision)
             else:
-                self._persist["next_action_time"] = None
-
-            if not is_charging and not is_discharging and not planning_override:
-                recommendation = RECO_STANDBY
-                decision_reason = "state_idle"
-
-            # FINAL AI STATUS
-            if ai_mode == AI_MODE_MANUAL:
-                ai_status = AI_STATUS_MANUAL
-            elif self._persist.get("emergency_active"):
-                ai_status = AI_STATUS_EMERGENCY_CHARGE
-            elif is_charging:
-                ai_status = AI_STATUS_CHARGE_SURPLUS
-            elif is_discharging:
-                if decision_reason == "price_based_discharge":
-                    ai_status = AI_STATUS_EXPENSIVE_DISCHARGE
-                elif decision_reason.startswith("very_expensive"):
-                    ai_status = AI_STATUS_VERY_EXPENSIVE_FORCE
-                elif decision_reason == "expensive_discharge":
-                    ai_status = AI_STATUS_EXPENSIVE_DISCHARGE
-                else:
-                    ai_status = AI_STATUS_COVER_DEFICIT
+                self._autotuner = None
+
+            ac_mode = decision.ac_mode
+            lap.mark("decide")
+
+            # ordered, confirmed writes in the background (actuation.py):
+            # a direction change no longer costs a whole cycle
+            target_import_w = float(profile["TARGET_IMPORT_W"])  # as in engine.delta_discharge_w
+            error_w = decision.net_grid_w - target_import_w
+            if fleet_units is None:
+                self._actuator.submit(ac_mode, decision.in_w, decision.out_w, error_w=error_w)
+                held_w = self._actuator.expected_output_w()
             else:
-                ai_status = AI_STATUS_STANDBY
+                held_w = self._fleet_dispatch(decision, fleet_units, error_w=error_w)
+            # suppressed change: the controller continues from the old limit
+            track_applied_output(self._ctrl, now_ts, decision, held_w)
+            lap.mark("actuation")
 
-            # Analytics timing
-            last_ts = self._persist.get("last_ts")
-            dt_s = 0.0
-            if last_ts:
-                try:
-                    prev_dt = dt_util.parse_datetime(str(last_ts))
-                    if prev_dt:
-                        dt_s = max((now - prev_dt).total_seconds(), 0.0)
-                except Exception:
-                    dt_s = 0.0
-
-            in_w_f = float(in_w)
-            out_w_f = float(out_w)
-
-            charged_kwh = float(self._persist.get("charged_kwh") or 0.0)
-            discharged_kwh = float(self._persist.get("discharged_kwh") or 0.0)
-            profit_eur = float(self._persist.get("profit_eur") or 0.0)
-
-            trade_charged_kwh = float(self._persist.get("trade_charged_kwh") or 0.0)
-            prev_soc = self._persist.get("prev_soc")
-
-            SOC_EPS = 0.2
-
-            # Robust reset: sobald SoC den unteren Bereich erreicht, ist der Trade-Zyklus beendet
-            if (
-                prev_soc is not None
-                and float(prev_soc) > float(soc_min) + SOC_EPS
-                and float(soc) <= float(soc_min) + SOC_EPS
-            ):
-                avg_charge_price = None
-                trade_charged_kwh = 0.0
-                # FIX: block immediate planning charge after soc_min
-                self._persist["block_planning_charge_until_price"] = price_now
-
-                # optional: auch in persist sofort spiegeln (hilft gegen Race Conditions / spätere Entscheidungen)
-                self._persist["avg_charge_price"] = None
-                self._persist["trade_avg_charge_price"] = None
-                self._persist["trade_charged_kwh"] = 0.0
-
-            if ac_mode == ZENDURE_MODE_INPUT and in_w_f > 0.0:
-                e_kwh = (in_w_f * dt_s) / 3600000.0
-                charged_kwh += e_kwh
-
-                c_price = price_now
-                is_grid_charge = (
-                    ac_mode == ZENDURE_MODE_INPUT
-                    and in_w_f > 0.0
-                    and decision_reason != "emergency_latched_charge"
-                )
-                if is_grid_charge and c_price is not None:
-                    trade_charged_kwh += e_kwh
-                    if avg_charge_price is None:
-                        avg_charge_price = float(c_price)
-                    else:
-                        prev_e = max(trade_charged_kwh - e_kwh, 0.0)
-                        avg_charge_price = (
-                            (float(avg_charge_price) * prev_e) + (float(c_price) * e_kwh)
-                        ) / max(trade_charged_kwh, 1e-9)
-
-            if ac_mode == ZENDURE_MODE_OUTPUT and out_w_f > 0.0:
-                e_kwh = (out_w_f * dt_s) / 3600000.0
-                discharged_kwh += e_kwh
-                if price_now is not None and avg_charge_price is not None:
-                    delta = float(price_now) - float(avg_charge_price)
-                    if delta > 0:
-                        profit_eur += e_kwh * delta
-
-            self._persist["trade_avg_charge_price"] = avg_charge_price
-            self._persist["trade_charged_kwh"] = trade_charged_kwh
-            self._persist["prev_soc"] = float(soc)
-            self._persist["avg_charge_price"] = avg_charge_price
-
-            self._persist["charged_kwh"] = charged_kwh
-            self._persist["discharged_kwh"] = discharged_kwh
-            self._persist["profit_eur"] = profit_eur
-            self._persist["last_ts"] = now.isoformat()
-
-            await self._save()
+            update_analytics(self._ctrl, measurements, settings, decision)
+
+            self._apply_cadence(now, decision, soc=soc, soc_min=soc_min)
+            self._async_schedule_wakeup(now)
+            self._schedule_save()
+            lap.mark("analytics")
 
             details = {
                 "soc": soc,
-                "pv_w": pv_w,
-                "surplus": float(surplus),
-                "deficit": float(deficit_raw),
-                "house_load": int(round(house_load, 0)),
+                "pv_w": decision.pv_w,
+                "surplus": decision.surplus,
+                "deficit": decision.deficit_w,
+                "house_load": int(round(decision.house_load, 0)),
                 "price_now": price_now,
                 "expensive_threshold": expensive,
                 "very_expensive_threshold": very_expensive,
                 "emergency_soc": emergency_soc,
                 "emergency_charge_w": emergency_w,
-                "emergency_active": bool(self._persist.get("emergency_active")),
-                "power_state": str(self._persist.get("power_state") or "idle"),
+                "emergency_active": self._ctrl.emergency_active,
+                "power_state": self._ctrl.power_state,
+                "cadence": self._cadence.current,
                 "next_action_state": (
                     "manual_charge"
                     if ai_mode == AI_MODE_MANUAL and manual_action == MANUAL_CHARGE
                     else "manual_discharge"
                     if ai_mode == AI_MODE_MANUAL and manual_action == MANUAL_DISCHARGE
                     else "emergency_charge"
-                    if self._persist.get("emergency_active")
+                    if self._ctrl.emergency_active
                     else "charging_active"
-                    if self._persist.get("power_state") == "charging"
+                    if self._ctrl.power_state == "charging"
                     else "discharging_active"
-                    if self._persist.get("power_state") == "discharging"
+                    if self._ctrl.power_state == "discharging"
                     else "none"
                 ),
-                "next_planned_action": self._persist.get("next_planned_action"),
-                "next_planned_action_time": self._persist.get("next_planned_action_time"),
-                "next_action_time": self._persist.get("next_action_time"),
-                "planning_checked": bool(self._persist.get("planning_checked")),
-                "planning_status": self._persist.get("planning_status"),
-                "planning_blocked_by": self._persist.get("planning_blocked_by"),
-                "planning_active": bool(self._persist.get("planning_active")),
-                "planning_target_soc": self._persist.get("planning_target_soc"),
-                "planning_next_peak": self._persist.get("planning_next_peak"),
-                "planning_reason": self._persist.get("planning_reason"),
+                "next_planned_action": self._ctrl.next_planned_action,
+                "next_planned_action_time": self._ctrl.next_planned_action_time,
+                "next_action_time": self._ctrl.next_action_time,
+                "planning_checked": self._ctrl.planning_checked,
+                "planning_status": self._ctrl.planning_status,
+                "planning_blocked_by": self._ctrl.planning_blocked_by,
+                "planning_active": self._ctrl.planning_active,
+                "planning_target_soc": self._ctrl.planning_target_soc,
+                "planning_next_peak": self._ctrl.planning_next_peak,
+                "planning_schedule": planning.get("schedule"),
+                "planning_charge_kwh": planning.get("charge_kwh"),
+                "planning_charge_slots": planning.get("charge_slots"),
+                "planning_reason": self._ctrl.planning_reason,
                 "max_charge": max_charge,
                 "max_discharge": max_discharge,
                 "set_mode": ac_mode,
-                "set_input_w": int(round(in_w_f, 0)),
-                "set_output_w": int(round(out_w_f, 0)),
-                "avg_charge_price": avg_charge_price,
-                "charged_kwh": charged_kwh,
-                "discharged_kwh": discharged_kwh,
-                "profit_eur": profit_eur,
+                "set_input_w": int(round(decision.in_w, 0)),
+                "set_output_w": int(round(decision.out_w_real, 0)),
+                "writes_issued": self._actuator.budget.issued + self._actuator.budget.mandatory,
+                "writes_suppressed": self._actuator.budget.suppressed + self._actuator.budget.coalesced,
+                "fleet_role": "leader" if self._fleet is not None else None,
+                "fleet_shares_w": dict(self._fleet.shares) if self._fleet is not None else None,
+                "stage_p95_ms": {
+                    stage: self._timings.percentile_ms(stage, 0.95)
+                    for stage in ("inputs", "planning", "decide", "actuation", "analytics", "actuation_sequence")
+                },
+                "avg_charge_price": self._ctrl.avg_charge_price,
+                "charged_kwh": self._ctrl.charged_kwh,
+                "discharged_kwh": self._ctrl.discharged_kwh,
+                "profit_eur": self._ctrl.profit_eur,
                 "profit_margin_pct": profit_margin_pct,
                 "ai_mode": ai_mode,
                 "manual_action": manual_action,
-                "decision_reason": decision_reason,
-                "delta_discharge_target_w": float(self._persist.get("discharge_target_w") or 0.0),
-                "force_no_charge": force_no_charge,
-                "target_import_w": 35.0,
-                "net_grid_w": net_grid_w,
+                "decision_reason": decision.decision_reason,
+                "delta_discharge_target_w": self._ctrl.discharge_target_w,
+                "force_no_charge": decision.force_no_charge,
+                "target_import_w": target_import_w,
+                "net_grid_w": decision.net_grid_w,
                 "device_profile": self.device_profile_key,
-                "profile_max_input_w": profile_max_in,
-                "profile_max_output_w": profile_max_out,
+                "profile_max_input_w": float(profile.get("MAX_INPUT_W", max_charge)),
+                "profile_max_output_w": float(profile.get("MAX_OUTPUT_W", max_discharge)),
+                "battery_capacity_kwh": round(capacity_kwh, 2),
             }
 
             # --- FINAL SENSOR STATES (Top-Level, never None) ---
 
             next_planned_action_time_state = (
-                self._persist.get("next_planned_action_time")
-                if isinstance(self._persist.get("next_planned_action_time"), str)
+                self._ctrl.next_planned_action_time
+                if isinstance(self._ctrl.next_planned_action_time, str)
                 else ""
             )
 
@@ -1458,27 +1215,36 @@ class ZendureSmartFlowCoordinator(DataUpdateCoordinator[dict[str, Any]]):
                     return None
 
             next_action_time_state = _iso_or_none(
-                self._persist.get("next_action_time")
+                self._ctrl.next_action_time
             )
 
             next_action_state = (
-                self._persist.get("next_planned_action")
-                if isinstance(self._persist.get("next_planned_action"), str)
+                self._ctrl.next_planned_action
+                if isinstance(self._ctrl.next_planned_action, str)
                 else "none"
             )
+            lap.mark("details")
+            lap.done()
 
             return {
                 "status": status,
-                "ai_status": ai_status,
-                "recommendation": recommendation,
+                "ai_status": decision.ai_status,
+                "recommendation": decision.recommendation,
                 "debug": "OK" if status == STATUS_OK else str(status).upper(),
                 "details": details,
-                "decision_reason": decision_reason,
+                "decision_reason": decision.decision_reason,
                 # --- SENSOR STATE (TOP LEVEL!) ---
                 "next_action_time": next_action_time_state,
                 "next_planned_action_time": next_planned_action_time_state,
                 "next_action_state": next_action_state,
+                "cycle_time_ms": self._timings.percentile_ms("total", 0.95),
             }
 
         except Exception as err:
             raise UpdateFailed(str(err)) from err
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                if profiler.finished and self._profiler is profiler:
+                    self._profiler = None
+                    self.hass.async_create_task(self._async_finish_profiling(profiler))
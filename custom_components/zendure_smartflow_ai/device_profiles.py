@@ -8,6 +8,13 @@ SF800PRO_PROFILE = {
     "MAX_STEP_DOWN": 400.0,
     "KEEPALIVE_MIN_DEFICIT_W": 15.0,
     "KEEPALIVE_MIN_OUTPUT_W": 60.0,
+    "KFF_LOAD": 0.9,
+    "KFF_PV": 0.8,
+    "FF_MIN_STEP_W": 80.0,
+    "DEAD_TIME_S": 5.0,
+    "DEAD_TIME_SPREAD_S": 4.0,
+    "ROUND_TRIP_EFF": 0.85,
+    "BATTERY_CAPACITY_KWH": 1.92,  # one AB2000
 }
 
 SF2400AC_PROFILE = {
@@ -20,6 +27,13 @@ SF2400AC_PROFILE = {
     "MAX_STEP_DOWN": 900.0,
     "KEEPALIVE_MIN_DEFICIT_W": 15.0,
     "KEEPALIVE_MIN_OUTPUT_W": 60.0,
+    "KFF_LOAD": 0.9,
+    "KFF_PV": 0.8,
+    "FF_MIN_STEP_W": 80.0,
+    "DEAD_TIME_S": 5.0,
+    "DEAD_TIME_SPREAD_S": 4.0,
+    "ROUND_TRIP_EFF": 0.85,
+    "BATTERY_CAPACITY_KWH": 2.88,  # built-in battery
 }
 
 DEVICE_PROFILES = {
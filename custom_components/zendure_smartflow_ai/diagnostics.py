@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import CONF_LOCAL_HOST, DOMAIN
+
+# Geräteadresse und Seriennummer gehören nicht in geteilte Diagnosedaten
+TO_REDACT = {CONF_LOCAL_HOST, "sn", "host"}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant,
+    entry: ConfigEntry,
+) -> dict[str, Any]:
+    """Diagnostics download: config, runtime state and the last cycle's details."""
+    coordinator = hass.data[DOMAIN][entry.entry_id]
+
+    return async_redact_data(
+        {
+            "entry": {
+                "title": entry.title,
+                "data": dict(entry.data),
+                "options": dict(entry.options),
+            },
+            **coordinator.diagnostics(),
+        },
+        TO_REDACT,
+    )
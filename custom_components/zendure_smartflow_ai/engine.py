@@ -0,0 +1,982 @@
+from __future__ import annotations
+
+import logging
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any
+
+from .const import (
+    AI_MODE_AUTOMATIC,
+    AI_MODE_MANUAL,
+    AI_MODE_SUMMER,
+    AI_MODE_WINTER,
+    AI_STATUS_CHARGE_SURPLUS,
+    AI_STATUS_COVER_DEFICIT,
+    AI_STATUS_EMERGENCY_CHARGE,
+    AI_STATUS_EXPENSIVE_DISCHARGE,
+    AI_STATUS_MANUAL,
+    AI_STATUS_STANDBY,
+    AI_STATUS_VERY_EXPENSIVE_FORCE,
+    MANUAL_CHARGE,
+    MANUAL_DISCHARGE,
+    MANUAL_STANDBY,
+    RECO_CHARGE,
+    RECO_DISCHARGE,
+    RECO_EMERGENCY,
+    RECO_STANDBY,
+    ZENDURE_MODE_INPUT,
+    ZENDURE_MODE_OUTPUT,
+)
+from .state import ControllerState
+
+_LOGGER = logging.getLogger(__name__)
+
+# ==================================================
+# Decision engine (pure): no hass, no entity access, no I/O.
+# The coordinator feeds live readings, the simulator feeds recorded ones.
+# ==================================================
+
+
+@dataclass(slots=True)
+class Measurements:
+    """One set of readings (all powers in W, grid split into import/export)."""
+
+    now_ts: float
+    soc: float
+    pv_w: float
+    deficit_w: float = 0.0  # grid import
+    surplus_w: float = 0.0  # grid export
+    price_now: float | None = None
+
+
+@dataclass(slots=True)
+class Settings:
+    """Effective settings for one cycle (already clamped to the profile)."""
+
+    soc_min: float
+    soc_max: float
+    max_charge: float
+    max_discharge: float
+    expensive: float
+    very_expensive: float
+    emergency_soc: float
+    emergency_w: float
+    profit_margin_pct: float
+    ai_mode: str = AI_MODE_AUTOMATIC
+    manual_action: str = MANUAL_STANDBY
+    profile: Mapping[str, float] = field(default_factory=dict)
+
+
+@dataclass(slots=True)
+class Decision:
+    """
+    Result of one control step.
+
+    in_w / out_w are the setpoints to actuate; out_w_real is what counts as
+    real discharge (the device treats very small output limits as off).
+    """
+
+    ac_mode: str
+    in_w: float
+    out_w: float
+    out_w_real: float
+    recommendation: str
+    decision_reason: str
+    ai_status: str
+    power_state: str
+    planning_override: bool
+    force_no_charge: bool
+    is_charging: bool
+    is_discharging: bool
+    pv_w: float
+    surplus: float
+    deficit_w: float
+    net_grid_w: float
+    house_load: float
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+def _parse_ts(val: Any) -> float | None:
+    try:
+        dt = datetime.fromisoformat(str(val))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+# --------------------------------------------------
+def delta_discharge_w(
+    *,
+    profile: Mapping[str, float],
+    deficit_w: float,
+    prev_out_w: float,
+    max_discharge: float,
+    soc: float,
+    soc_min: float,
+    allow_zero: bool = True,
+    ff_w: float = 0.0,
+    inflight_w: float = 0.0,
+) -> float:
+    """
+    Delta / incremental discharge controller:
+    drives grid import close to a small target (avoids export / oscillation).
+
+    Dead-time compensation (Smith predictor): inflight_w is the sum of output
+    changes the meter cannot show yet (see predict_inflight_w); the controller
+    regulates on the predicted reading instead of the stale one.
+    ff_w is this cycle's feed-forward correction (see feed_forward_w); it is
+    taken out of the error as well, so P only trims the residual.
+    """
+
+    # Lass bewusst einen kleinen Netzbezug stehen -> verhindert Einspeisung durch Messrauschen
+    TARGET_IMPORT_W = profile["TARGET_IMPORT_W"]
+    DEADBAND_W = profile["DEADBAND_W"]
+
+    # Anti-Export Guard: ab dieser Einspeisung wird aggressiv reduziert
+    EXPORT_GUARD_W = profile["EXPORT_GUARD_W"]
+
+    # Hard constraints
+    if soc <= soc_min + 0.05:
+        return 0.0
+
+    # vorhergesagter Zählerwert: noch nicht sichtbare Sollwertänderungen abziehen
+    net = float(deficit_w) - float(ff_w) - float(inflight_w)  # + import / - export
+    out_w = float(prev_out_w) + float(ff_w)
+
+    # 1) Anti-Export Guard: wenn wir exportieren, sofort stark reduzieren
+    if net < -EXPORT_GUARD_W:
+        # so weit runter, dass wir wieder Richtung TARGET_IMPORT kommen
+        cut = (abs(net) + TARGET_IMPORT_W) * 1.4
+        out_w = max(0.0, out_w - cut)
+        return float(min(float(max_discharge), out_w))
+
+    # 2) Normalregelung (Import-Target)
+    err = net - TARGET_IMPORT_W  # + => Import zu hoch => mehr entladen, - => zu wenig Import => weniger entladen
+
+    # schneller hoch, deutlich schneller runter als vorher
+    KP_UP = profile["KP_UP"]
+    KP_DOWN = profile["KP_DOWN"]
+    MAX_STEP_UP = profile["MAX_STEP_UP"]
+    MAX_STEP_DOWN = profile["MAX_STEP_DOWN"]
+
+    if err > DEADBAND_W:
+        step = min(MAX_STEP_UP, max(40.0, KP_UP * err))
+        out_w += step
+    elif err < -DEADBAND_W:
+        step = min(MAX_STEP_DOWN, max(60.0, KP_DOWN * abs(err)))
+        out_w -= step
+    else:
+        # in der Deadband: HALTEN, nicht abbauen
+        out_w = out_w
+
+    out_w = max(0.0, min(float(max_discharge), out_w))
+
+    KEEPALIVE_MIN_DEFICIT_W = profile["KEEPALIVE_MIN_DEFICIT_W"]
+    KEEPALIVE_MIN_OUTPUT_W = profile["KEEPALIVE_MIN_OUTPUT_W"]
+
+    # 3) Optional: nur wirklich bei quasi 0 Import ausmachen (nicht bei 20-30W!)
+    if allow_zero and deficit_w <= KEEPALIVE_MIN_DEFICIT_W:
+        out_w = max(out_w, KEEPALIVE_MIN_OUTPUT_W)
+    return float(out_w)
+
+
+def predict_inflight_w(
+    state: ControllerState,
+    profile: Mapping[str, float],
+    now_ts: float,
+) -> float:
+    """
+    Output-limit changes the meter does not show yet (Smith predictor).
+
+    predicted grid = measured grid - inflight. A change counts fully for
+    DEAD_TIME_S - spread/2 and fades out linearly over DEAD_TIME_SPREAD_S:
+    meter sampling makes the real dead time jitter by about one period, and
+    a hard cut-off a cycle off in either direction corrects the same error twice.
+    """
+    dead_time = float(profile.get("DEAD_TIME_S", 0.0))
+    spread = max(float(profile.get("DEAD_TIME_SPREAD_S", 0.0)), 0.0)
+    horizon = dead_time + spread / 2.0
+
+    pending: list[tuple[float, float]] = []
+    total = 0.0
+    for ts, delta in state.inflight:
+        left = horizon - (now_ts - ts)
+        if left <= 0.0:
+            continue
+        pending.append((ts, delta))
+        weight = min(left / spread, 1.0) if spread > 0.0 else 1.0
+        total += weight * delta
+
+    state.inflight = pending
+    return total
+
+
+def track_setpoint(state: ControllerState, now_ts: float, out_w: float) -> None:
+    """Remember this cycle's output limit change for the predictor."""
+    last = state.last_out_w
+    state.last_out_w = float(out_w)
+    if last is not None and abs(float(out_w) - last) >= 1.0:
+        state.inflight.append((float(now_ts), float(out_w) - last))
+
+
+def track_applied_output(
+    state: ControllerState,
+    now_ts: float,
+    decision: Decision,
+    held_w: float | None,
+) -> None:
+    """
+    Predictor and discharge integrator continue from what the device holds.
+
+    held_w: output limit confirmed, or pending until a write token is back
+    (None: unknown, the decision is assumed). A change below the write
+    threshold is never written: the next cycle regulates from the old limit.
+    """
+    if decision.ac_mode != ZENDURE_MODE_OUTPUT:
+        track_setpoint(state, now_ts, 0.0)
+        return
+    if held_w is None or int(round(decision.out_w, 0)) == int(held_w):
+        # written as decided (limits are whole watts)
+        track_setpoint(state, now_ts, decision.out_w)
+        return
+    track_setpoint(state, now_ts, float(held_w))
+    if decision.out_w > 0.0:
+        state.discharge_target_w = float(held_w)
+
+
+def feed_forward_inputs(
+    state: ControllerState,
+    *,
+    house_load_w: float,
+    pv_w: float,
+) -> tuple[float, float]:
+    """
+    (load step, PV step) since the last cycle.
+
+    Only between two cycles without output changes in flight: otherwise the
+    load estimate still depends on how well the dead-time model fits.
+    """
+    prev_load = state.ff_prev_load
+    prev_pv = state.ff_prev_pv
+    if state.inflight:
+        state.ff_prev_load = None
+        state.ff_prev_pv = None
+        return 0.0, 0.0
+
+    state.ff_prev_load = float(house_load_w)
+    state.ff_prev_pv = float(pv_w)
+    if prev_load is None or prev_pv is None:
+        return 0.0, 0.0
+    return float(house_load_w) - prev_load, float(pv_w) - prev_pv
+
+
+def feed_forward_w(profile: Mapping[str, float], load_step_w: float, pv_step_w: float) -> float:
+    """Setpoint correction for a load / PV step (0 below FF_MIN_STEP_W)."""
+    ff = float(profile.get("KFF_LOAD", 0.0)) * load_step_w - float(profile.get("KFF_PV", 0.0)) * pv_step_w
+    if abs(ff) < float(profile.get("FF_MIN_STEP_W", 0.0)) or ff == 0.0:
+        return 0.0
+    return ff
+
+
+def store_planning(state: ControllerState, planning: dict[str, Any]) -> None:
+    """Mirror a fresh planning result into the state (slow loop only)."""
+    state.planning_checked = True
+    state.planning_status = planning.get("status")
+    state.planning_blocked_by = planning.get("blocked_by")
+    state.planning_reason = planning.get("reason")
+    state.planning_target_soc = planning.get("target_soc")
+    state.planning_next_peak = planning.get("next_peak")
+
+
+def decide(
+    state: ControllerState,
+    m: Measurements,
+    s: Settings,
+    planning: dict[str, Any],
+    *,
+    track_output: bool = True,
+) -> Decision:
+    """
+    One control step: updates `state` in place and returns the setpoints.
+
+    `planning` is the (cached) result of the price planner.
+    track_output=False: the caller may still replace the output limit
+    (auto-tune probe, write budget) and calls track_applied_output with
+    the value the device actually holds.
+    """
+    profile = s.profile
+    now_ts = m.now_ts
+    soc = float(m.soc)
+    pv_w = float(m.pv_w)
+    price_now = m.price_now
+
+    soc_min = s.soc_min
+    soc_max = s.soc_max
+    max_charge = s.max_charge
+    max_discharge = s.max_discharge
+    expensive = s.expensive
+    very_expensive = s.very_expensive
+    emergency_soc = s.emergency_soc
+    emergency_w = s.emergency_w
+    ai_mode = s.ai_mode
+    manual_action = s.manual_action
+
+    # EMA helper
+    EMA_TAU_S = 45.0
+
+    last_ts_ema = state.ema_last_ts
+    if last_ts_ema is None:
+        dt = None
+    else:
+        dt = max(now_ts - last_ts_ema, 0.0)
+
+    alpha = 1.0 if dt is None or dt <= 0 else min(dt / (EMA_TAU_S + dt), 1.0)
+
+    def _ema(prev: float | None, value: float) -> float:
+        if prev is None:
+            return float(value)
+        return (1.0 - alpha) * prev + alpha * float(value)
+
+    state.ema_last_ts = float(now_ts)
+
+    # --- FIX: reset power_state on AI mode change ---
+    prev_ai_mode = state.prev_ai_mode
+    if prev_ai_mode != ai_mode:
+        state.power_state = "idle"
+        state.discharge_target_w = 0.0
+        _LOGGER.debug(
+            "Zendure: AI mode changed %s → %s, resetting power_state",
+            prev_ai_mode,
+            ai_mode,
+        )
+
+    state.prev_ai_mode = ai_mode
+
+    deficit_raw = float(m.deficit_w)
+    surplus_raw = float(m.surplus_w)
+
+    net_grid_w = float(deficit_raw) - float(surplus_raw)  # + import, - export
+
+    surplus = state.ema_surplus = _ema(state.ema_surplus, surplus_raw)
+
+    grid_import = deficit_raw if deficit_raw > 0.0 else 0.0
+    grid_export = surplus_raw if surplus_raw > 0.0 else 0.0
+
+    # --- FIX: correct house load calculation including battery discharge ---
+
+    # output changes the meter does not show yet (dead time)
+    inflight = predict_inflight_w(state, profile, now_ts)
+
+    # Battery discharge power (AC) – last target minus what is still in flight
+    battery_discharge = 0.0
+    if state.power_state == "discharging":
+        battery_discharge = max(state.discharge_target_w - inflight, 0.0)
+
+    # Eigenverbrauch = PV + Batterieentladung - Einspeisung
+    eigenverbrauch = max(0.0, pv_w + battery_discharge - grid_export)
+
+    # Hauslast = Netzbezug + Eigenverbrauch
+    house_load_raw = grid_import + eigenverbrauch
+    house_load_raw = max(house_load_raw, 0.0)
+
+    state.ema_house_load = _ema(state.ema_house_load, house_load_raw)
+    house_load = state.ema_house_load or house_load_raw
+    no_house_load = house_load < 120.0
+
+    # --- feed-forward: load / PV steps go straight into the discharge setpoint ---
+    # (raw load estimate: the 45 s EMA would spread a step over minutes)
+    load_step, pv_step = feed_forward_inputs(state, house_load_w=house_load_raw, pv_w=pv_w)
+    ff_w = feed_forward_w(profile, load_step, pv_step)
+    cycle_start_out = state.discharge_target_w
+
+    def _delta_out() -> float:
+        # a second call in the same cycle sees the first one as in flight,
+        # feed-forward is applied only once
+        prev_out = state.discharge_target_w
+        first = prev_out == cycle_start_out
+        out = delta_discharge_w(
+            profile=profile,
+            deficit_w=net_grid_w,
+            prev_out_w=prev_out,
+            max_discharge=max_discharge,
+            soc=soc,
+            soc_min=soc_min,
+            ff_w=ff_w if first else 0.0,
+            inflight_w=inflight + prev_out - cycle_start_out,
+        )
+        state.discharge_target_w = float(out)
+        return out
+
+    # --- FIX: distinguish real PV surplus from battery-induced export ---
+    real_pv_surplus = (
+        surplus_raw > 80.0
+        and pv_w > surplus_raw + 50.0
+        and state.power_state != "discharging"
+    )
+
+    # Winter detection
+    is_winter_mode = (
+        ai_mode in (AI_MODE_WINTER, AI_MODE_AUTOMATIC)
+        and surplus < 50.0
+        and price_now is not None
+        and price_now < expensive
+    )
+
+    # PV surplus hysteresis (kept, but will NOT forcibly flip discharge -> charge anymore)
+    PV_STOP_W = 80.0
+    PV_STOP_N = 3
+
+    if real_pv_surplus:
+        state.pv_surplus_cnt = state.pv_surplus_cnt + 1
+    else:
+        state.pv_surplus_cnt = 0
+
+    pv_stop_discharge = state.pv_surplus_cnt >= PV_STOP_N
+
+    # Emergency latch
+    if soc <= emergency_soc:
+        state.emergency_active = True
+    if state.emergency_active and soc >= soc_min:
+        state.emergency_active = False
+
+    # IMPORTANT: used in expensive discharge decision
+    avg_charge_price = state.trade_avg_charge_price
+
+    # --------------------------------------------------
+    # PRICE BASED DISCHARGE (explicit, independent of planning)
+    # --------------------------------------------------
+    PRICE_DISCHARGE_RESERVE_SOC = soc_min + 5.0
+
+    price_discharge_active = (
+        ai_mode == AI_MODE_AUTOMATIC
+        and price_now is not None
+        and avg_charge_price is not None
+        and price_now >= expensive
+        and price_now > avg_charge_price
+        and soc > PRICE_DISCHARGE_RESERVE_SOC
+    )
+
+    # Decide setpoints
+    ac_mode = ZENDURE_MODE_INPUT
+    in_w = 0.0
+    out_w = 0.0
+    recommendation = RECO_STANDBY
+    decision_reason = "standby"
+    prev_power_state = state.power_state
+    power_state = prev_power_state
+    force_no_charge = prev_power_state == "discharging"
+
+    # --- next planned action (single source of truth) ---
+    next_action = None
+    next_time = None
+    if planning.get("action") == "discharge" and planning.get("next_peak"):
+        next_action = "discharge"
+        next_time = planning.get("next_peak")
+    elif planning.get("status") == "planning_waiting_for_cheap_window" and planning.get("latest_start"):
+        next_action = "charge"
+        next_time = planning.get("latest_start")
+    elif planning.get("status") == "planning_charge_now":
+        next_action = "charge"
+        next_time = _iso(now_ts)
+
+    if next_action is not None:
+        state.next_planned_action = str(next_action)
+        state.next_planned_action_time = str(next_time or "")
+
+    state.planning_active = planning.get("action") in ("charge", "discharge")
+
+    # --------------------------------------------------
+    # PRICE PLANNING OVERRIDE
+    # --------------------------------------------------
+    planning_override = False
+
+    # --------------------------------------------------
+    # PRICE BASED DISCHARGE (override everything else)
+    # --------------------------------------------------
+    if price_discharge_active:
+        planning_override = True
+        state.planning_active = False
+
+        ac_mode = ZENDURE_MODE_OUTPUT
+        recommendation = RECO_DISCHARGE
+
+        out_w = _delta_out()
+
+        in_w = 0.0
+        decision_reason = "price_based_discharge"
+        state.power_state = "discharging"
+        power_state = "discharging"
+        state.price_discharge_latched = True
+
+    # Charge now in cheap window
+    elif (
+        ai_mode == AI_MODE_AUTOMATIC
+        and planning.get("action") == "charge"
+        and planning.get("status") == "planning_charge_now"
+        and soc < float(planning.get("target_soc") or soc_max)
+        and not state.emergency_active
+        and (
+            state.block_planning_charge_until_price is None
+            or price_now is None
+            or price_now < state.block_planning_charge_until_price
+        )
+    ):
+        planning_override = True
+        state.planning_active = True
+
+        ac_mode = ZENDURE_MODE_INPUT
+        in_w = min(float(max_charge), float(planning.get("watts") or max_charge))
+        out_w = 0.0
+        recommendation = RECO_CHARGE
+        decision_reason = "planning_charge_before_peak"
+        state.power_state = "charging"
+        power_state = "charging"
+
+    # Discharge only close to peak (next 30 min)
+    elif (
+        ai_mode == AI_MODE_AUTOMATIC
+        and planning.get("action") == "discharge"
+        and planning.get("status") == "planning_discharge_planned"
+        and planning.get("next_peak") is not None
+        and not state.emergency_active
+    ):
+        peak_ts = _parse_ts(planning["next_peak"])
+        if peak_ts is not None:
+            secs_to_peak = peak_ts - now_ts
+            if secs_to_peak <= 1800 and soc > soc_min:
+                planning_override = True
+                state.planning_active = True
+
+                ac_mode = ZENDURE_MODE_OUTPUT
+                in_w = 0.0
+
+                out_w = _delta_out()
+
+                recommendation = RECO_DISCHARGE
+                decision_reason = "planning_discharge_peak"
+                state.power_state = "discharging"
+                power_state = "discharging"
+
+    # 1) emergency always wins
+    if state.emergency_active:
+        planning_override = False
+        state.planning_active = False
+        state.price_discharge_latched = False
+
+        ac_mode = ZENDURE_MODE_INPUT
+        recommendation = RECO_EMERGENCY
+        in_w = min(max_charge, max(float(emergency_w), 0.0))
+        out_w = 0.0
+        decision_reason = "emergency_latched_charge"
+        state.power_state = "charging"
+        power_state = "charging"
+
+    # --- FIX: SUMMER MODE discharge on deficit (no price logic) ---
+    elif (
+        ai_mode == AI_MODE_SUMMER
+        and deficit_raw > 80.0
+        and house_load > 150.0
+        and soc > soc_min
+    ):
+        ac_mode = ZENDURE_MODE_OUTPUT
+        recommendation = RECO_DISCHARGE
+        out_w = min(float(max_discharge), float(deficit_raw))
+        in_w = 0.0
+        decision_reason = "summer_discharge_cover_deficit"
+        state.power_state = "discharging"
+        power_state = "discharging"
+        planning_override = True
+
+    # 2) manual mode
+    elif ai_mode == AI_MODE_MANUAL:
+        planning_override = False
+        state.planning_active = False
+        state.price_discharge_latched = False
+
+        if manual_action == MANUAL_STANDBY:
+            ac_mode = ZENDURE_MODE_INPUT
+            in_w = 0.0
+            out_w = 0.0
+            recommendation = RECO_STANDBY
+            decision_reason = "manual_standby"
+            state.power_state = "idle"
+            power_state = "idle"
+            state.discharge_target_w = 0.0
+
+        elif manual_action == MANUAL_CHARGE:
+            ac_mode = ZENDURE_MODE_INPUT
+            in_w = float(max_charge)
+            out_w = 0.0
+            recommendation = RECO_CHARGE
+            decision_reason = "manual_charge"
+            state.power_state = "charging"
+            power_state = "charging"
+            state.discharge_target_w = 0.0
+
+        elif manual_action == MANUAL_DISCHARGE:
+            ac_mode = ZENDURE_MODE_OUTPUT
+            in_w = 0.0
+
+            out_w = _delta_out()
+
+            recommendation = RECO_DISCHARGE
+            decision_reason = "manual_discharge"
+            state.power_state = "discharging" if out_w > 0 else "idle"
+            power_state = state.power_state
+
+    # --------------------------------------------------
+    # EXIT price based discharge when price advantage is gone
+    # --------------------------------------------------
+    elif (
+        state.price_discharge_latched
+        and state.power_state == "discharging"
+        and not price_discharge_active
+    ):
+        state.price_discharge_latched = False
+        state.power_state = "idle"
+        state.discharge_target_w = 0.0
+
+        ac_mode = ZENDURE_MODE_INPUT
+        in_w = 0.0 
+        out_w = 0.0
+        recommendation = RECO_STANDBY
+        decision_reason = "price_discharge_exit"
+        power_state = "idle"
+        state.power_state = "idle"
+        state.discharge_target_w = 0.0
+
+        ac_mode = ZENDURE_MODE_INPUT
+        in_w = 0.0
+        out_w = 0.0
+        recommendation = RECO_STANDBY
+        decision_reason = "price_discharge_exit"
+        power_state = "idle"
+
+    # 3) automatic state machine (only if planning is NOT overriding)
+    elif ai_mode != AI_MODE_MANUAL and not planning_override:
+        # State transitions
+        if power_state == "charging" and (soc >= soc_max or surplus <= 0.0):
+            power_state = "idle"
+            state.power_state = "idle"
+
+            # FIX: reset input limit when leaving charging
+            in_w = 0.0
+            state.last_set_input_w = None
+
+        # Stop discharging when no deficit / no load / soc too low
+        # --- HARD GUARD: never auto-switch to charging while discharging ---
+        if power_state == "discharging":
+            # forbid charging entry regardless of PV / surplus / grid
+            force_no_charge = True
+        else:
+            force_no_charge = False
+            # Stop only when there is basically no load OR SoC low
+            if house_load <= 80.0 or soc <= soc_min:
+                power_state = "idle"
+                state.power_state = "idle"
+                state.discharge_target_w = 0.0
+            # near perfect balance and already low discharge => go idle
+            elif abs(net_grid_w) <= 25.0:
+                # Feintuning-Zone: NICHT abschalten, nur leicht nachregeln
+                state.discharge_target_w = max(
+                    60.0,  # Mindestleistung, damit OUTPUT aktiv bleibt
+                    state.discharge_target_w - 20.0,
+                )
+                power_state = "discharging"
+                state.power_state = "discharging"
+
+        if power_state == "idle":
+            if (
+                not is_winter_mode
+                and house_load > 150.0
+                and deficit_raw > 80.0
+                and soc > soc_min
+            ):
+                power_state = "discharging"
+                state.power_state = "discharging"
+                decision_reason = "state_enter_discharge"
+
+            elif (
+                real_pv_surplus
+                and soc < soc_max
+                and state.discharge_target_w == 0.0
+            ):
+                power_state = "charging"
+                state.power_state = "charging"
+                decision_reason = "state_enter_charge"
+
+            else:
+                decision_reason = "state_idle"
+
+            if house_load < 120.0:
+                power_state = "idle"
+                state.power_state = "idle"
+
+        # Actions
+        if power_state == "discharging":
+            ac_mode = ZENDURE_MODE_OUTPUT
+            recommendation = RECO_DISCHARGE
+
+            out_w = _delta_out()
+            in_w = 0.0
+            decision_reason = (
+                decision_reason if decision_reason.startswith("state_enter") else "state_discharging"
+            )
+
+            # IMPORTANT: do NOT auto-flip to charging just because surplus appears
+            # (surplus could be caused by discharge overshoot/noise).
+            # Only allow the existing CHARGE state if it was entered from IDLE.
+            if (
+                pv_stop_discharge
+                and real_pv_surplus
+                and soc < soc_max
+                and out_w < 120.0
+            ):
+                # soft stop discharge; next cycle IDLE can decide CHARGE
+                state.discharge_target_w = 0.0
+                out_w = 0.0
+                power_state = "idle"
+                state.power_state = "idle"
+                decision_reason = "state_exit_discharge_pv_surplus"
+
+        elif power_state == "charging":
+            ac_mode = ZENDURE_MODE_INPUT
+            recommendation = RECO_CHARGE
+            in_w = min(float(max_charge), max(float(pv_w - house_load), 0.0))
+            out_w = 0.0
+            state.discharge_target_w = 0.0
+            decision_reason = decision_reason if decision_reason.startswith("state_enter") else "state_charging"
+
+        else:
+            ac_mode = ZENDURE_MODE_INPUT
+            recommendation = RECO_STANDBY
+            in_w = 0.0
+            out_w = 0.0
+            state.discharge_target_w = 0.0
+
+        # Expensive / very expensive discharge forcing (uses delta too)
+        RESERVE_SOC = float(soc_min) + 5.0
+        if price_now is not None and soc > RESERVE_SOC and power_state != "charging":
+            if price_now >= very_expensive:
+                ac_mode = ZENDURE_MODE_OUTPUT
+                recommendation = RECO_DISCHARGE
+                out_w = _delta_out()
+                in_w = 0.0
+                decision_reason = "very_expensive_force_discharge"
+                state.power_state = "discharging" if out_w > 0 else "idle"
+                power_state = state.power_state
+
+            elif (
+                price_now >= expensive
+                and power_state == "idle"
+                and deficit_raw > 0.0
+                and avg_charge_price is not None
+                and price_now > avg_charge_price
+            ):
+                ac_mode = ZENDURE_MODE_OUTPUT
+                recommendation = RECO_DISCHARGE
+                out_w = _delta_out()
+                in_w = 0.0
+                decision_reason = "expensive_discharge"
+                state.power_state = "discharging" if out_w > 0 else "idle"
+                power_state = state.power_state
+
+    # enforce SoC-min on discharge
+    if ac_mode == ZENDURE_MODE_OUTPUT and soc <= soc_min:
+        ac_mode = ZENDURE_MODE_INPUT
+        out_w = 0.0
+        state.discharge_target_w = 0.0
+        if recommendation == RECO_DISCHARGE:
+            recommendation = RECO_STANDBY
+        decision_reason = "soc_min_enforced"
+
+    # Apply hardware setpoints
+    if ac_mode == ZENDURE_MODE_OUTPUT:
+        in_w = 0.0
+    if ac_mode == ZENDURE_MODE_INPUT:
+        out_w = 0.0
+
+    out_w_set = out_w
+
+    if track_output:
+        track_setpoint(state, now_ts, out_w_set if ac_mode == ZENDURE_MODE_OUTPUT else 0.0)
+
+    is_charging = ac_mode == ZENDURE_MODE_INPUT and float(in_w) > 0.0
+    is_discharging = ac_mode == ZENDURE_MODE_OUTPUT and float(out_w) > 0.0
+
+    # Zendure OUTPUT-Safety: unter Mindestleistung gilt als AUS
+    MIN_REAL_DISCHARGE_W = 30.0
+
+    if ac_mode == ZENDURE_MODE_OUTPUT and float(out_w) < MIN_REAL_DISCHARGE_W:
+        out_w = 0.0
+
+    # --------------------------------------------------
+    # HARD SYNC: power_state follows hardware reality
+    # --------------------------------------------------
+    if is_charging:
+        state.power_state = "charging"
+        power_state = "charging"
+
+    elif is_discharging:
+        state.power_state = "discharging"
+        power_state = "discharging"
+
+    else:
+        state.power_state = "idle"
+        power_state = "idle"
+        state.discharge_target_w = 0.0
+
+    # Zendure quirk: OUTPUT aktiv aber effektiv 0W → idle erzwingen
+    if (
+        ac_mode == ZENDURE_MODE_OUTPUT
+        and float(out_w) == 0.0
+    ):
+        state.power_state = "idle"
+        power_state = "idle"
+
+    # NEXT ACTION TIMESTAMP
+    if state.power_state in ("charging", "discharging"):
+        state.next_action_time = (
+            state.next_planned_action_time or _iso(now_ts)
+        )
+    else:
+        state.next_action_time = None
+
+    if not is_charging and not is_discharging and not planning_override:
+        recommendation = RECO_STANDBY
+        decision_reason = "state_idle"
+
+    # FINAL AI STATUS
+    if ai_mode == AI_MODE_MANUAL:
+        ai_status = AI_STATUS_MANUAL
+    elif state.emergency_active:
+        ai_status = AI_STATUS_EMERGENCY_CHARGE
+    elif is_charging:
+        ai_status = AI_STATUS_CHARGE_SURPLUS
+    elif is_discharging:
+        if decision_reason == "price_based_discharge":
+            ai_status = AI_STATUS_EXPENSIVE_DISCHARGE
+        elif decision_reason.startswith("very_expensive"):
+            ai_status = AI_STATUS_VERY_EXPENSIVE_FORCE
+        elif decision_reason == "expensive_discharge":
+            ai_status = AI_STATUS_EXPENSIVE_DISCHARGE
+        else:
+            ai_status = AI_STATUS_COVER_DEFICIT
+    else:
+        ai_status = AI_STATUS_STANDBY
+
+    return Decision(
+        ac_mode=ac_mode,
+        in_w=float(in_w),
+        out_w=float(out_w_set),
+        out_w_real=float(out_w),
+        recommendation=recommendation,
+        decision_reason=decision_reason,
+        ai_status=ai_status,
+        power_state=power_state,
+        planning_override=planning_override,
+        force_no_charge=force_no_charge,
+        is_charging=is_charging,
+        is_discharging=is_discharging,
+        pv_w=pv_w,
+        surplus=float(surplus),
+        deficit_w=float(deficit_raw),
+        net_grid_w=net_grid_w,
+        house_load=float(house_load),
+    )
+
+
+def update_analytics(
+    state: ControllerState,
+    m: Measurements,
+    s: Settings,
+    decision: Decision,
+) -> None:
+    """Integrate charged/discharged energy, trade average price and profit."""
+    now_ts = m.now_ts
+    soc = float(m.soc)
+    soc_min = s.soc_min
+    price_now = m.price_now
+    ac_mode = decision.ac_mode
+    in_w = decision.in_w
+    out_w = decision.out_w_real
+    decision_reason = decision.decision_reason
+    avg_charge_price = state.trade_avg_charge_price
+
+    # Analytics timing
+    last_ts = state.last_ts
+    dt_s = 0.0
+    if last_ts is not None:
+        dt_s = max(now_ts - last_ts, 0.0)
+
+    in_w_f = float(in_w)
+    out_w_f = float(out_w)
+
+    charged_kwh = state.charged_kwh
+    discharged_kwh = state.discharged_kwh
+    profit_eur = state.profit_eur
+
+    trade_charged_kwh = state.trade_charged_kwh
+    prev_soc = state.prev_soc
+
+    SOC_EPS = 0.2
+
+    # Robust reset: sobald SoC den unteren Bereich erreicht, ist der Trade-Zyklus beendet
+    if (
+        prev_soc is not None
+        and prev_soc > float(soc_min) + SOC_EPS
+        and float(soc) <= float(soc_min) + SOC_EPS
+    ):
+        avg_charge_price = None
+        trade_charged_kwh = 0.0
+        # FIX: block immediate planning charge after soc_min
+        state.block_planning_charge_until_price = price_now
+
+        # optional: auch in persist sofort spiegeln (hilft gegen Race Conditions / spätere Entscheidungen)
+        state.avg_charge_price = None
+        state.trade_avg_charge_price = None
+        state.trade_charged_kwh = 0.0
+
+    if ac_mode == ZENDURE_MODE_INPUT and in_w_f > 0.0:
+        e_kwh = (in_w_f * dt_s) / 3600000.0
+        charged_kwh += e_kwh
+
+        c_price = price_now
+        is_grid_charge = (
+            ac_mode == ZENDURE_MODE_INPUT
+            and in_w_f > 0.0
+            and decision_reason != "emergency_latched_charge"
+        )
+        if is_grid_charge and c_price is not None:
+            trade_charged_kwh += e_kwh
+            if avg_charge_price is None:
+                avg_charge_price = float(c_price)
+            else:
+                prev_e = max(trade_charged_kwh - e_kwh, 0.0)
+                avg_charge_price = (
+                    (avg_charge_price * prev_e) + (float(c_price) * e_kwh)
+                ) / max(trade_charged_kwh, 1e-9)
+
+    if ac_mode == ZENDURE_MODE_OUTPUT and out_w_f > 0.0:
+        e_kwh = (out_w_f * dt_s) / 3600000.0
+        discharged_kwh += e_kwh
+        if price_now is not None and avg_charge_price is not None:
+            delta = float(price_now) - avg_charge_price
+            if delta > 0:
+                profit_eur += e_kwh * delta
+
+    state.trade_avg_charge_price = avg_charge_price
+    state.trade_charged_kwh = trade_charged_kwh
+    state.prev_soc = float(soc)
+    state.avg_charge_price = avg_charge_price
+
+    state.charged_kwh = charged_kwh
+    state.discharged_kwh = discharged_kwh
+    state.profit_eur = profit_eur
+    state.last_ts = now_ts
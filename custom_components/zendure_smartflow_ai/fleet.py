@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+from .const import DEFAULT_BATTERY_CAPACITY_KWH, DEFAULT_ROUND_TRIP_EFFICIENCY, FLEET_MIN_SHARE_W
+
+if TYPE_CHECKING:
+    from .coordinator import ZendureSmartFlowCoordinator
+
+# ==================================================
+# Flottenbetrieb: mehrere Akkus am selben Netzzähler
+#
+# Statt N Regler, die alle denselben Netzwert ausregeln (und sich
+# gegenseitig aufschaukeln), rechnet der erste Eintrag der Flotte (Leader)
+# einmal pro Zyklus mit dem summierten Akku: ein Zählerwert, eine Planung,
+# ein Sollwert. Der wird nach nutzbarer Energie (kWh) und Wirkungsgrad auf
+# die Geräte verteilt (Wasserstand mit Leistungsgrenzen).
+# ==================================================
+
+
+@dataclass(frozen=True, slots=True)
+class FleetUnit:
+    """One battery as seen by the dispatcher (readings + effective limits)."""
+
+    key: str  # config entry id
+    soc: float
+    pv_w: float
+    soc_min: float
+    soc_max: float
+    max_charge: float
+    max_discharge: float
+    efficiency: float = DEFAULT_ROUND_TRIP_EFFICIENCY
+    capacity_kwh: float = DEFAULT_BATTERY_CAPACITY_KWH
+
+
+def aggregate(units: Sequence[FleetUnit]) -> FleetUnit:
+    """
+    The fleet as one battery: SoC values weighted by capacity, PV and
+    capacity summed, power limits summed over the units that can still move
+    in that direction.
+    """
+    weights = [max(u.capacity_kwh, 1e-6) for u in units]
+    total = sum(weights)
+
+    def _avg(values: list[float]) -> float:
+        return sum(v * w for v, w in zip(values, weights)) / total
+
+    return FleetUnit(
+        key="fleet",
+        soc=_avg([u.soc for u in units]),
+        pv_w=sum(u.pv_w for u in units),
+        soc_min=_avg([u.soc_min for u in units]),
+        soc_max=_avg([u.soc_max for u in units]),
+        max_charge=sum(u.max_charge for u in units if u.soc < u.soc_max),
+        max_discharge=sum(u.max_discharge for u in units if u.soc > u.soc_min),
+        efficiency=_avg([u.efficiency for u in units]),
+        capacity_kwh=sum(u.capacity_kwh for u in units),
+    )
+
+
+def _weight(u: FleetUnit, charge: bool) -> float:
+    # usable energy in that direction (kWh) x efficiency, power via the caps
+    if charge:
+        return max(u.soc_max - u.soc, 0.0) * u.capacity_kwh * u.efficiency
+    return max(u.soc - u.soc_min, 0.0) * u.capacity_kwh * u.efficiency
+
+
+def split_setpoint(
+    total_w: float,
+    units: Sequence[FleetUnit],
+    *,
+    charge: bool,
+    min_share_w: float = FLEET_MIN_SHARE_W,
+) -> dict[str, float]:
+    """
+    Split one charge / discharge setpoint across the units.
+
+    Proportional to _weight (usable kWh), a unit at its power limit is fixed there and the
+    rest is shared by the others. Shares below min_share_w (the device treats
+    very small limits as off) go to the remaining units instead.
+    """
+    shares = {u.key: 0.0 for u in units}
+    cap = {u.key: (u.max_charge if charge else u.max_discharge) for u in units}
+    active = {u.key: w for u in units if (w := _weight(u, charge)) > 0.0 and cap[u.key] > 0.0}
+
+    while active:
+        remaining = min(max(float(total_w), 0.0), sum(cap[k] for k in active))
+        fixed = 0.0
+        alloc: dict[str, float] = {}
+        pending = dict(active)
+        # water-filling: fix units at their cap until the rest fits
+        while pending:
+            wsum = sum(pending.values())
+            capped = [k for k, w in pending.items() if (remaining - fixed) * w / wsum >= cap[k]]
+            if not capped:
+                for k, w in pending.items():
+                    alloc[k] = (remaining - fixed) * w / wsum
+                break
+            for k in capped:
+                alloc[k] = cap[k]
+                fixed += cap[k]
+                del pending[k]
+
+        small = [k for k, w in alloc.items() if 0.0 < w < min_share_w]
+        if not small or len(active) == 1:
+            shares.update(alloc)
+            return shares
+        # drop the weakest small share and split again
+        del active[min(small, key=lambda k: active[k])]
+
+    return shares
+
+
+class FleetDispatcher:
+    """Coordinators on one grid meter; the first member runs the control loop."""
+
+    def __init__(self, key: tuple[Any, ...]) -> None:
+        self.key = key
+        self.members: dict[str, ZendureSmartFlowCoordinator] = {}
+        self.shares: dict[str, float] = {}  # last split, + charge / - discharge (W)
+
+    @property
+    def leader(self) -> ZendureSmartFlowCoordinator | None:
+        return next(iter(self.members.values()), None)
+
+    def is_leader(self, coordinator: ZendureSmartFlowCoordinator) -> bool:
+        return self.leader is coordinator
+
+    def add(self, coordinator: ZendureSmartFlowCoordinator) -> None:
+        self.members[coordinator.entry.entry_id] = coordinator
+
+    def remove(self, coordinator: ZendureSmartFlowCoordinator) -> None:
+        self.members.pop(coordinator.entry.entry_id, None)
+        self.shares.pop(coordinator.entry.entry_id, None)
+
+    def as_dict(self) -> dict[str, Any]:
+        leader = self.leader
+        return {
+            "leader": leader.entry.entry_id if leader else None,
+            "members": list(self.members),
+            "shares_w": dict(self.shares),
+        }
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any
+
+import aiohttp
+
+from .const import (
+    LOCAL_API_POLL_S,
+    LOCAL_API_TIMEOUT_S,
+    ZENDURE_MODE_INPUT,
+    ZENDURE_MODE_OUTPUT,
+)
+
+# ==================================================
+# Lokale HTTP-API der SolarFlow-Geräte (zenSDK)
+#
+# GET  http://<host>/properties/report  -> {"sn": ..., "properties": {...}}
+# POST http://<host>/properties/write   <- {"sn": ..., "properties": {...}}
+#
+# Kein Umweg über Event-Bus, Service-Call und die Zendure-Integration:
+# eine persistente (gepoolte) Verbindung, quittierte Schreibzugriffe und
+# Bestätigung über das Rücklesen des Reports.
+# ==================================================
+
+# zenSDK acMode: 1 = AC-Eingang (laden), 2 = AC-Ausgang (entladen)
+AC_MODE_VALUES = {ZENDURE_MODE_INPUT: 1, ZENDURE_MODE_OUTPUT: 2}
+
+# ControllerState field of the confirmed value -> device property
+PROPERTY_BY_KEY = {
+    "last_set_mode": "acMode",
+    "last_set_input_w": "inputLimit",
+    "last_set_output_w": "outputLimit",
+}
+
+
+class ZendureLocalError(Exception):
+    """Device not reachable or request rejected."""
+
+
+class ZendureLocalClient:
+    """zenSDK HTTP client on a shared aiohttp session (keep-alive)."""
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        host: str,
+        *,
+        sn: str | None = None,
+        timeout_s: float = LOCAL_API_TIMEOUT_S,
+    ) -> None:
+        self._session = session
+        self.host = host.strip().rstrip("/")
+        self.sn = sn
+        self._timeout = aiohttp.ClientTimeout(total=timeout_s)
+        base = self.host if "://" in self.host else f"http://{self.host}"
+        self._report_url = f"{base}/properties/report"
+        self._write_url = f"{base}/properties/write"
+
+    async def async_report(self) -> dict[str, Any]:
+        """Current device properties (also learns the serial number)."""
+        try:
+            async with self._session.get(self._report_url, timeout=self._timeout) as resp:
+                resp.raise_for_status()
+                data = await resp.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as err:
+            raise ZendureLocalError(f"report failed: {err}") from err
+
+        if not isinstance(data, dict) or not isinstance(data.get("properties"), dict):
+            raise ZendureLocalError("report without properties")
+        if data.get("sn"):
+            self.sn = str(data["sn"])
+        return data["properties"]
+
+    async def async_write(self, properties: dict[str, Any]) -> None:
+        """Write properties; returns once the device acknowledged the request."""
+        if not self.sn:
+            await self.async_report()
+        payload = {"sn": self.sn, "properties": properties}
+        try:
+            async with self._session.post(
+                self._write_url, json=payload, timeout=self._timeout
+            ) as resp:
+                resp.raise_for_status()
+                await resp.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            raise ZendureLocalError(f"write failed: {err}") from err
+
+
+class LocalTransport:
+    """Actuator transport: write over HTTP, confirm by reading the report back."""
+
+    name = "local"
+
+    def __init__(self, client: ZendureLocalClient, *, poll_s: float = LOCAL_API_POLL_S) -> None:
+        self.client = client
+        self.poll_s = poll_s
+        self.last_ack_s: float | None = None
+
+    @staticmethod
+    def clamp(_entity_id: str, value: int) -> int:
+        # the report has no min/max: the device clamps itself, never negative
+        return max(int(value), 0)
+
+    @staticmethod
+    def _device_value(step: Any) -> tuple[str, Any]:
+        prop = PROPERTY_BY_KEY[step.key]
+        if prop == "acMode":
+            return prop, AC_MODE_VALUES[step.value]
+        return prop, int(step.value)
+
+    def _reported(self, props: dict[str, Any], step: Any, tolerance_w: float) -> bool:
+        prop, value = self._device_value(step)
+        try:
+            return abs(float(props[prop]) - float(value)) <= (0.0 if prop == "acMode" else tolerance_w)
+        except (KeyError, TypeError, ValueError):
+            return False
+
+    async def async_matches(self, step: Any, tolerance_w: float) -> bool:
+        try:
+            props = await self.client.async_report()
+        except ZendureLocalError:
+            return False
+        return self._reported(props, step, tolerance_w)
+
+    async def async_write_confirmed(self, step: Any, timeout_s: float, tolerance_w: float) -> bool:
+        prop, value = self._device_value(step)
+        t0 = time.monotonic()
+        await self.client.async_write({prop: value})
+        self.last_ack_s = round(time.monotonic() - t0, 3)
+
+        deadline = t0 + timeout_s
+        while time.monotonic() < deadline:
+            if await self.async_matches(step, tolerance_w):
+                return True
+            await asyncio.sleep(self.poll_s)
+        return False
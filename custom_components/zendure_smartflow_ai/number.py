@@ -7,10 +7,11 @@ from homeassistant.components.number import (
     NumberEntityDescription,
 )
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 
 from .const import (
+    DEFAULT_PLANNING_CHARGE_W,
     DOMAIN,
     INTEGRATION_NAME,
     INTEGRATION_MANUFACTURER,
@@ -22,6 +23,12 @@ from .const import (
 @dataclass(frozen=True, kw_only=True)
 class ZendureNumberEntityDescription(NumberEntityDescription):
     runtime_key: str
+    # shown until the option is set (the coordinator uses the same default)
+    default: float | None = None
+
+    @property
+    def initial_value(self) -> float:
+        return self.native_min_value if self.default is None else self.default
 
 
 NUMBERS: tuple[ZendureNumberEntityDescription, ...] = (
@@ -105,6 +112,17 @@ NUMBERS: tuple[ZendureNumberEntityDescription, ...] = (
         native_unit_of_measurement="€/kWh",
         icon="mdi:currency-eur",
     ),
+    ZendureNumberEntityDescription(
+        key="planning_charge_w",
+        translation_key="planning_charge_w",
+        runtime_key="planning_charge_w",
+        native_min_value=100,
+        native_max_value=2400,
+        native_step=50,
+        native_unit_of_measurement="W",
+        icon="mdi:battery-clock",
+        default=DEFAULT_PLANNING_CHARGE_W,
+    ),
 )
 
 
@@ -128,7 +146,7 @@ async def async_setup_entry(
         if key not in coordinator.runtime_settings:
             coordinator.runtime_settings[key] = entry.options.get(
                 key,
-                ent.entity_description.native_min_value,
+                ent.entity_description.initial_value,
             )
 
 
@@ -146,6 +164,7 @@ class ZendureSmartFlowNumber(NumberEntity):
         self._entry = entry
 
         self._attr_unique_id = f"{entry.entry_id}_{description.key}"
+        self._last_written: tuple | None = None
         self._attr_device_info = {
             "identifiers": {(DOMAIN, entry.entry_id)},
             "name": INTEGRATION_NAME,
@@ -158,7 +177,7 @@ class ZendureSmartFlowNumber(NumberEntity):
         if description.runtime_key not in coordinator.runtime_settings:
             coordinator.runtime_settings[description.runtime_key] = entry.options.get(
                 description.runtime_key,
-                description.native_min_value,
+                description.initial_value,
             )
 
     @property
@@ -182,7 +201,16 @@ class ZendureSmartFlowNumber(NumberEntity):
 
         self.async_write_ha_state()
 
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Coordinator refreshes only matter here when availability or value changed."""
+        snapshot = (self.available, self.native_value)
+        if snapshot == self._last_written:
+            return
+        self._last_written = snapshot
+        self.async_write_ha_state()
+
     async def async_added_to_hass(self) -> None:
         self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
+            self.coordinator.async_add_listener(self._handle_coordinator_update)
         )
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+from array import array
+from collections import deque
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+# numerischer Gleichstand: im Zweifel lieber nichts tun als laden/entladen
+_EPS = 1e-9
+
+
+@dataclass(frozen=True, slots=True)
+class Schedule:
+    """
+    Cost-optimal SoC trajectory over the price horizon.
+
+    soc[t]   SoC (%) at the start of slot t (len = slots + 1)
+    watts[t] AC power in slot t: + charge from grid, - discharge, 0 idle
+    value    € gained over the horizon incl. the value of the energy left
+    """
+
+    soc: list[float]
+    watts: list[float]
+    value: float
+
+
+def _window_max(values: Sequence[float], lo_off: int, hi_off: int) -> tuple[list[float], list[int]]:
+    """
+    Sliding window maximum: for every k the max of values[j] with
+    k + lo_off <= j <= k + hi_off (clipped to the array), plus its argmax.
+    """
+    n = len(values)
+    best = [0.0] * n
+    arg = [0] * n
+    dq: deque[int] = deque()
+    nxt = 0
+    for k in range(n):
+        hi = min(n - 1, k + hi_off)
+        while nxt <= hi:
+            v = values[nxt]
+            while dq and values[dq[-1]] <= v:
+                dq.pop()
+            dq.append(nxt)
+            nxt += 1
+        lo = k + lo_off
+        while dq[0] < lo:
+            dq.popleft()
+        arg[k] = dq[0]
+        best[k] = values[dq[0]]
+    return best, arg
+
+
+def optimize_schedule(
+    prices: Sequence[float],
+    durations_h: Sequence[float],
+    *,
+    soc: float,
+    soc_min: float,
+    soc_max: float,
+    capacity_kwh: float,
+    max_charge_w: float,
+    max_discharge_w: float,
+    round_trip_eff: float,
+    profit_margin_pct: float,
+    soc_step: float = 1.0,
+) -> Schedule | None:
+    """
+    Dynamic programming over discretized SoC.
+
+    Charging costs price / eta_c per stored kWh, discharging is worth
+    price * (1 - margin) * eta_d per stored kWh (eta_c = eta_d = sqrt(round trip)),
+    i.e. discharged energy is assumed to replace grid import.
+    Energy left at the end of the horizon is valued at the mean horizon price,
+    so the optimizer only cycles the battery when the spread pays for losses
+    and margin. Runtime is O(slots * states).
+    """
+    slots = min(len(prices), len(durations_h))
+    if slots == 0 or capacity_kwh <= 0.0 or soc_step <= 0.0 or soc_max <= soc_min:
+        return None
+
+    n = int((soc_max - soc_min) / soc_step + 1e-9) + 1
+    eta = min(max(float(round_trip_eff), 0.01), 1.0) ** 0.5
+    margin = min(max(float(profit_margin_pct or 0.0), 0.0) / 100.0, 1.0)
+    unit_kwh = capacity_kwh * soc_step / 100.0
+
+    k0 = int(round((min(max(soc, soc_min), soc_max) - soc_min) / soc_step))
+    k0 = min(max(k0, 0), n - 1)
+
+    # terminal value of stored energy
+    mean_price = sum(prices[:slots]) / slots
+    term = mean_price * (1.0 - margin) * eta * unit_kwh
+    value = [term * k for k in range(n)]
+
+    policy: list[array] = [array("h")] * slots  # filled backwards
+
+    for t in range(slots - 1, -1, -1):
+        p = float(prices[t])
+        dur = max(float(durations_h[t]), 0.0)
+        up = min(int(max_charge_w / 1000.0 * dur * eta / unit_kwh), n - 1)
+        down = min(int(max_discharge_w / 1000.0 * dur / eta / unit_kwh), n - 1)
+
+        a = p / eta * unit_kwh                  # € per unit charged
+        b = p * (1.0 - margin) * eta * unit_kwh  # € per unit discharged
+
+        best = list(value)
+        pol = array("h", range(n))
+
+        if up > 0:
+            shifted = [value[j] - a * j for j in range(n)]
+            ch_best, ch_arg = _window_max(shifted, 0, up)
+            for k in range(n):
+                v = ch_best[k] + a * k
+                if v > best[k] + _EPS:
+                    best[k] = v
+                    pol[k] = ch_arg[k]
+
+        if down > 0 and b > 0.0:
+            shifted = [value[j] - b * j for j in range(n)]
+            dis_best, dis_arg = _window_max(shifted, -down, 0)
+            for k in range(n):
+                v = dis_best[k] + b * k
+                if v > best[k] + _EPS:
+                    best[k] = v
+                    pol[k] = dis_arg[k]
+
+        value = best
+        policy[t] = pol
+
+    soc_path = [soc_min + k0 * soc_step]
+    watts: list[float] = []
+    k = k0
+    for t in range(slots):
+        j = policy[t][k]
+        dur = float(durations_h[t])
+        delta_kwh = (j - k) * unit_kwh
+        if j > k and dur > 0.0:
+            w = min(delta_kwh / eta / dur * 1000.0, float(max_charge_w))
+        elif j < k and dur > 0.0:
+            w = -min(-delta_kwh * eta / dur * 1000.0, float(max_discharge_w))
+        else:
+            w = 0.0
+        watts.append(w)
+        k = j
+        soc_path.append(soc_min + k * soc_step)
+
+    return Schedule(soc=soc_path, watts=watts, value=value[k0])
@@ -0,0 +1,452 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any
+
+from .const import (
+    AI_MODE_AUTOMATIC,
+    DEFAULT_BATTERY_CAPACITY_KWH,
+    DEFAULT_PLANNING_CHARGE_W,
+    DEFAULT_ROUND_TRIP_EFFICIENCY,
+    OPTIMIZER_HORIZON_H,
+    OPTIMIZER_SOC_STEP,
+    PLANNING_MIN_CHARGE_W,
+    PLANNING_STRATEGY_OPTIMIZER,
+    PLANNING_STRATEGY_PEAK_WINDOW,
+)
+from .optimizer import optimize_schedule
+from .price_curve import PriceCurve
+
+# ==================================================
+# Price planning (pure): works on a parsed PriceCurve and a timestamp,
+# so the coordinator and the offline replay share the same planner.
+# ==================================================
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+def evaluate_price_planning(
+    curve: PriceCurve | None,
+    now_ts: float,
+    *,
+    soc: float,
+    soc_max: float,
+    soc_min: float,
+    price_now: float | None,
+    expensive: float,
+    very_expensive: float,
+    profit_margin_pct: float,
+    max_charge: float,
+    max_discharge: float,
+    ai_mode: str,
+    strategy: str = PLANNING_STRATEGY_PEAK_WINDOW,
+    capacity_kwh: float = DEFAULT_BATTERY_CAPACITY_KWH,
+    round_trip_eff: float = DEFAULT_ROUND_TRIP_EFFICIENCY,
+    slot_charge_w: float = DEFAULT_PLANNING_CHARGE_W,
+) -> dict[str, Any]:
+    """Price planning: find the future peaks, then the cheap window before each."""
+    result: dict[str, Any] = {
+        "action": "none",
+        "watts": 0.0,
+        "status": "not_checked",
+        "blocked_by": None,
+        "next_peak": None,
+        "reason": None,
+        "latest_start": None,
+        "target_soc": None,
+        "schedule": None,
+        "charge_kwh": None,  # next planned charge: grid kWh ...
+        "charge_slots": None,  # ... and per-slot power
+    }
+
+    if ai_mode != AI_MODE_AUTOMATIC:
+        result.update(status="planning_inactive_mode", blocked_by="mode")
+        return result
+
+    if float(soc) >= float(soc_max) - 0.1:
+        result.update(status="planning_blocked_soc_full", blocked_by="soc")
+        return result
+
+    if price_now is None:
+        result.update(status="planning_no_price_now", blocked_by="price_now")
+        return result
+
+    if curve is None:
+        result.update(status="planning_no_price_data", blocked_by="price_data")
+        return result
+
+    starts, prices = curve.starts, curve.prices
+
+    # Only consider slots still (partly) in the future (avoid “peaks” from the past)
+    first = curve.first_future(now_ts)
+    if len(curve) - first < 8:
+        result.update(status="planning_no_price_data", blocked_by="price_data")
+        return result
+
+    if strategy == PLANNING_STRATEGY_OPTIMIZER:
+        return _plan_with_optimizer(
+            result,
+            curve,
+            first,
+            now_ts,
+            soc=soc,
+            soc_min=soc_min,
+            soc_max=soc_max,
+            profit_margin_pct=profit_margin_pct,
+            max_charge=max_charge,
+            max_discharge=max_discharge,
+            capacity_kwh=capacity_kwh,
+            round_trip_eff=round_trip_eff,
+        )
+
+    # Peak = Slot mit höchstem Preis (erster bei Gleichstand), suffix max
+    peak_idx = curve.peak_from(first)
+    peak_price = prices[peak_idx]
+
+    if peak_price < float(expensive) and peak_price < float(very_expensive):
+        result.update(status="planning_no_peak_detected", blocked_by=None)
+        return result
+
+    if peak_price >= float(very_expensive) and soc > soc_min:
+        result.update(
+            action="discharge",
+            status="planning_discharge_planned",
+            next_peak=_iso(starts[peak_idx]),
+            reason="discharge_during_price_peak",
+            target_soc=soc_min,
+        )
+        return result
+
+    return _plan_peak_windows(
+        result,
+        curve,
+        first,
+        now_ts,
+        soc=soc,
+        soc_min=soc_min,
+        soc_max=soc_max,
+        threshold=min(float(expensive), float(very_expensive)),
+        profit_margin_pct=profit_margin_pct,
+        max_charge=max_charge,
+        max_discharge=max_discharge,
+        capacity_kwh=capacity_kwh,
+        round_trip_eff=round_trip_eff,
+        slot_charge_w=slot_charge_w,
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class _PeakSegment:
+    """A price peak and the slots in front of it (back to the previous peak)."""
+
+    window_start: int  # first slot of the window in front of the peak
+    cheapest: int | None  # cheapest window slot (None: peak right at window_start)
+    block_start: int  # first slot >= threshold
+    block_end: int  # first slot after the peak
+    peak: int  # highest slot of the peak
+
+
+def _peak_segments(curve: PriceCurve, first: int, threshold: float) -> list[_PeakSegment]:
+    """
+    Every price peak after `first` with the cheapest slot in front of it.
+
+    A peak is a run of slots >= threshold (its highest slot counts), the
+    window in front of it reaches back to the previous peak. One pass,
+    running (prefix) minimum reset after each peak.
+    """
+    prices = curve.prices
+    segments: list[_PeakSegment] = []
+    window_start = first
+    cheapest: int | None = None
+    block_start = block_peak = -1
+
+    for i in range(first, len(curve)):
+        p = prices[i]
+        if p >= threshold:
+            if block_peak < 0:
+                block_start = block_peak = i
+            elif p > prices[block_peak]:
+                block_peak = i
+            continue
+        if block_peak >= 0:
+            segments.append(_PeakSegment(window_start, cheapest, block_start, i, block_peak))
+            block_peak = -1
+            window_start = i
+            cheapest = None
+        # ties: the later slot (shorter storage before the peak)
+        if cheapest is None or p <= prices[cheapest]:
+            cheapest = i
+
+    if block_peak >= 0:
+        segments.append(_PeakSegment(window_start, cheapest, block_start, len(curve), block_peak))
+    return segments
+
+
+def _charge_slots(
+    curve: PriceCurve,
+    seg: _PeakSegment,
+    now_ts: float,
+    *,
+    limit_price: float,
+    grid_kwh: float,
+    slot_charge_w: float,
+    max_charge: float,
+) -> tuple[list[tuple[int, float]], float]:
+    """
+    Per-slot charge power for grid_kwh: the window slots at most limit_price
+    are filled cheapest first with slot_charge_w; only if that is not enough
+    the cheapest ones are topped up to max_charge.
+    Returns ((slot index, W) in time order, kWh they take up).
+    """
+    starts, ends, prices = curve.starts, curve.ends, curve.prices
+    if grid_kwh <= 0.0 or max_charge <= 0.0:
+        return [], 0.0
+    if seg.cheapest is None or prices[seg.cheapest] > limit_price:
+        return [], 0.0
+
+    # ties: the later slot (shorter storage before the peak)
+    candidates = sorted(
+        (i for i in range(seg.window_start, seg.block_start) if prices[i] <= limit_price),
+        key=lambda i: (prices[i], -i),
+    )
+    hours = {i: (ends[i] - max(starts[i], now_ts)) / 3600.0 for i in candidates}
+    watts: dict[int, float] = {}
+    missing_wh = grid_kwh * 1000.0
+
+    for cap in (min(max(slot_charge_w, PLANNING_MIN_CHARGE_W), max_charge), max_charge):
+        for i in candidates:
+            if missing_wh <= 1e-3:
+                break
+            h = hours[i]
+            cur = watts.get(i, 0.0)
+            add = min(cap - cur, missing_wh / h) if h > 0.0 else 0.0
+            if add <= 0.0:
+                continue
+            # a tiny rest is not worth a slot of its own (device minimum)
+            add = min(max(add, PLANNING_MIN_CHARGE_W - cur), max_charge - cur)
+            watts[i] = cur + add
+            missing_wh -= add * h
+
+    plan = sorted((i, round(w, 0)) for i, w in watts.items())
+    return plan, sum(w * hours[i] for i, w in plan) / 1000.0
+
+
+def _plan_peak_windows(
+    result: dict[str, Any],
+    curve: PriceCurve,
+    first: int,
+    now_ts: float,
+    *,
+    soc: float,
+    soc_min: float,
+    soc_max: float,
+    threshold: float,
+    profit_margin_pct: float,
+    max_charge: float,
+    max_discharge: float,
+    capacity_kwh: float,
+    round_trip_eff: float,
+    slot_charge_w: float,
+) -> dict[str, Any]:
+    """
+    For each peak: the energy it takes (max_discharge over the peak, at most
+    the usable capacity) minus what is stored, charged in the cheapest
+    window slots worth it after margin (per-slot power, see _charge_slots). The first peak starts from the
+    current SoC, later ones from soc_min (drained by the peak before).
+    The next peak that needs charging drives `result`.
+    """
+    starts, ends, prices = curve.starts, curve.ends, curve.prices
+    margin = max(float(profit_margin_pct or 0.0), 0.0) / 100.0
+    eta = min(max(float(round_trip_eff), 0.01), 1.0) ** 0.5
+    cap = max(float(capacity_kwh), 1e-6)
+    usable_kwh = cap * max(float(soc_max) - float(soc_min), 0.0) / 100.0
+
+    segments = _peak_segments(curve, first, threshold)
+    if not any(seg.cheapest is not None for seg in segments):
+        result["schedule"] = []
+        result.update(status="planning_peak_detected_insufficient_window", blocked_by="price_data")
+        return result
+
+    schedule: list[dict[str, Any]] = []
+    plans: list[tuple[list[tuple[int, float]], float]] = []
+    for k, seg in enumerate(segments):
+        start_soc = float(soc) if k == 0 else float(soc_min)
+        peak_h = sum(
+            ends[i] - max(starts[i], now_ts) for i in range(seg.block_start, seg.block_end)
+        ) / 3600.0
+
+        # stored kWh the peak draws, minus what is already in the battery
+        need_kwh = min(max(float(max_discharge), 0.0) / 1000.0 * peak_h / eta, usable_kwh)
+        have_kwh = cap * max(start_soc - float(soc_min), 0.0) / 100.0
+        room_kwh = cap * max(float(soc_max) - start_soc, 0.0) / 100.0
+        store_kwh = min(max(need_kwh - have_kwh, 0.0), room_kwh)
+
+        chosen, grid_kwh = _charge_slots(
+            curve,
+            seg,
+            now_ts,
+            limit_price=prices[seg.peak] * (1.0 - margin),
+            grid_kwh=store_kwh / eta,
+            slot_charge_w=float(slot_charge_w),
+            max_charge=float(max_charge),
+        )
+        target_soc = start_soc + min(grid_kwh * eta, store_kwh) / cap * 100.0
+        plans.append((chosen, target_soc))
+        schedule.append(
+            {
+                "charge_start": _iso(starts[chosen[0][0]]) if chosen else None,
+                "charge_end": _iso(ends[chosen[-1][0]]) if chosen else None,
+                "charge_slots": [
+                    {"start": _iso(starts[i]), "end": _iso(ends[i]), "watts": w, "price": prices[i]}
+                    for i, w in chosen
+                ],
+                "charge_kwh": round(grid_kwh, 3),
+                "charge_price": max(prices[i] for i, _ in chosen) if chosen else None,
+                "needed_kwh": round(store_kwh / eta, 3),
+                "peak_start": _iso(starts[seg.block_start]),
+                "peak_price": prices[seg.peak],
+                "target_soc": round(target_soc, 1),
+                "worthwhile": bool(chosen),
+            }
+        )
+    result["schedule"] = schedule
+
+    needy = [k for k, entry in enumerate(schedule) if entry["needed_kwh"] > 0.0]
+    if not needy:
+        result.update(
+            status="planning_soc_sufficient",
+            next_peak=schedule[0]["peak_start"],
+            reason="soc_covers_price_peak",
+        )
+        return result
+
+    nxt = next((k for k in needy if schedule[k]["worthwhile"]), None)
+    if nxt is None:
+        result.update(
+            status="planning_waiting_for_cheap_window",
+            blocked_by="price_data",
+            next_peak=schedule[needy[0]]["peak_start"],
+            reason="waiting_for_cheap_price",
+        )
+        return result
+
+    chosen, target_soc = plans[nxt]
+    # --- FIX #4: Zeitfenster-basierte Entscheidung (EPEX & Tibber) ---
+    first_slot, first_w = chosen[0]
+    is_within_cheap_window = first_slot == first and starts[first] <= now_ts < ends[first]
+
+    result.update(
+        next_peak=schedule[nxt]["peak_start"],
+        reason="charge_before_price_peak" if is_within_cheap_window else "waiting_for_cheap_price",
+        latest_start=schedule[nxt]["charge_start"],
+        target_soc=min(float(soc_max), target_soc),
+        charge_kwh=schedule[nxt]["charge_kwh"],
+        charge_slots=schedule[nxt]["charge_slots"],
+    )
+    if is_within_cheap_window:
+        result.update(
+            action="charge",
+            watts=first_w,
+            status="planning_charge_now",
+        )
+    else:
+        result.update(action="none", status="planning_waiting_for_cheap_window")
+    return result
+
+
+def _plan_with_optimizer(
+    result: dict[str, Any],
+    curve: PriceCurve,
+    first: int,
+    now_ts: float,
+    *,
+    soc: float,
+    soc_min: float,
+    soc_max: float,
+    profit_margin_pct: float,
+    max_charge: float,
+    max_discharge: float,
+    capacity_kwh: float,
+    round_trip_eff: float,
+) -> dict[str, Any]:
+    """Price planning via DP schedule; the current slot's action feeds `result`."""
+    starts, ends, prices = curve.starts, curve.ends, curve.prices
+
+    last = bisect_left(starts, now_ts + OPTIMIZER_HORIZON_H * 3600.0, first)
+    slots = range(first, last)
+
+    schedule = optimize_schedule(
+        [prices[i] for i in slots],
+        [(ends[i] - max(starts[i], now_ts)) / 3600.0 for i in slots],
+        soc=soc,
+        soc_min=soc_min,
+        soc_max=soc_max,
+        capacity_kwh=capacity_kwh,
+        max_charge_w=max_charge,
+        max_discharge_w=max_discharge,
+        round_trip_eff=round_trip_eff,
+        profit_margin_pct=profit_margin_pct,
+        soc_step=OPTIMIZER_SOC_STEP,
+    )
+    if schedule is None:
+        result.update(status="planning_no_price_data", blocked_by="price_data")
+        return result
+
+    watts = schedule.watts
+    n = len(watts)
+
+    def _slot_iso(t: int) -> str:
+        return _iso(starts[first + t])
+
+    def _next(pred, start: int = 0) -> int | None:
+        return next((t for t in range(start, n) if pred(watts[t])), None)
+
+    charge_t = _next(lambda w: w > 0.0)
+    discharge_t = _next(lambda w: w < 0.0)
+
+    # charging block: up to the first discharge after it
+    if charge_t is not None and (discharge_t is None or charge_t < discharge_t):
+        peak_t = _next(lambda w: w < 0.0, charge_t)
+        block_end = n if peak_t is None else peak_t
+        last_charge_t = max(t for t in range(charge_t, block_end) if watts[t] > 0.0)
+        target_soc = min(float(soc_max), schedule.soc[last_charge_t + 1])
+        result.update(
+            next_peak=_slot_iso(peak_t) if peak_t is not None else None,
+            target_soc=target_soc,
+        )
+
+        if charge_t == 0:
+            result.update(
+                action="charge",
+                watts=round(watts[0], 0),
+                status="planning_charge_now",
+                reason="charge_before_price_peak",
+                latest_start=_slot_iso(last_charge_t),
+            )
+        else:
+            result.update(
+                action="none",
+                status="planning_waiting_for_cheap_window",
+                reason="waiting_for_cheap_price",
+                latest_start=_slot_iso(charge_t),
+            )
+        return result
+
+    if discharge_t is not None and soc > soc_min:
+        refill_t = _next(lambda w: w > 0.0, discharge_t)
+        block_end = n if refill_t is None else refill_t
+        result.update(
+            action="discharge",
+            status="planning_discharge_planned",
+            next_peak=_slot_iso(discharge_t),
+            reason="discharge_during_price_peak",
+            target_soc=max(float(soc_min), min(schedule.soc[discharge_t:block_end + 1])),
+        )
+        return result
+
+    result.update(status="planning_no_peak_detected", blocked_by=None)
+    return result
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone, tzinfo
+from typing import Any
+
+# Tibber / generisch: ohne end_time wird ein 15-Minuten-Slot angenommen
+DEFAULT_SLOT = timedelta(minutes=15)
+
+_START_KEYS = ("start_time", "starts_at", "start", "time")
+_END_KEYS = ("end_time", "ends_at")
+
+
+@dataclass(frozen=True, slots=True)
+class PriceCurve:
+    """
+    Pre-parsed price export (parallel arrays, sorted by slot start).
+
+    starts / ends are UTC epoch seconds, prices are €/kWh.
+    Slots never overlap, so both starts and ends are ascending.
+
+    One curve is shared by every entry on the same price entity
+    (price_service.py): the arrays are kept as read-only views, analyses
+    are computed on first use and cached on the curve.
+    """
+
+    starts: array | memoryview
+    ends: array | memoryview
+    prices: array | memoryview
+    _peak_from: array | None = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        for name in ("starts", "ends", "prices"):
+            object.__setattr__(self, name, memoryview(getattr(self, name)).toreadonly())
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def peak_from(self, first: int) -> int:
+        """Index of the highest price in [first, len) (first one on ties)."""
+        if self._peak_from is None:
+            # suffix argmax, built once per curve
+            prices = self.prices
+            best = array("l", range(len(prices)))
+            for i in range(len(prices) - 2, -1, -1):
+                if prices[best[i + 1]] > prices[i]:
+                    best[i] = best[i + 1]
+            object.__setattr__(self, "_peak_from", best)
+        return self._peak_from[first]
+
+    def index_at(self, ts: float) -> int | None:
+        """Index of the slot containing ts (binary search)."""
+        i = bisect_right(self.starts, ts) - 1
+        if i >= 0 and ts < self.ends[i]:
+            return i
+        return None
+
+    def first_future(self, ts: float) -> int:
+        """Index of the first slot that is still (partly) in the future."""
+        return bisect_right(self.ends, ts)
+
+
+def _to_price(v: Any) -> float | None:
+    try:
+        if v is None or isinstance(v, bool):
+            return None
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_epoch(v: Any, default_tz: tzinfo) -> float | None:
+    if not v:
+        return None
+    if isinstance(v, datetime):
+        dt = v
+    else:
+        try:
+            dt = datetime.fromisoformat(str(v))
+        except ValueError:
+            return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=default_tz)
+    return dt.timestamp()
+
+
+def parse_price_curve(
+    export: Any,
+    default_tz: tzinfo = timezone.utc,
+) -> PriceCurve | None:
+    """Parse the `data` attribute of a price export entity once."""
+    if not isinstance(export, list):
+        return None
+
+    slots: dict[float, tuple[float, float]] = {}
+    default_len = DEFAULT_SLOT.total_seconds()
+
+    for item in export:
+        if not isinstance(item, dict):
+            continue
+
+        start = next((item[k] for k in _START_KEYS if item.get(k)), None)
+        end = next((item[k] for k in _END_KEYS if item.get(k)), None)
+
+        p = _to_price(item.get("price_per_kwh"))
+        t_start = _to_epoch(start, default_tz)
+        if t_start is None or p is None:
+            continue
+
+        if end:
+            t_end = _to_epoch(end, default_tz)
+            if t_end is None:
+                continue
+        else:
+            t_end = t_start + default_len
+
+        if t_end <= t_start:
+            continue
+
+        # duplicate start: last entry wins
+        slots[t_start] = (t_end, p)
+
+    starts = array("d", sorted(slots))
+    ends = array("d")
+    prices = array("d")
+    for i, t_start in enumerate(starts):
+        t_end, p = slots[t_start]
+        # clip overlaps so the arrays stay ascending for bisect
+        if i + 1 < len(starts):
+            t_end = min(t_end, starts[i + 1])
+        ends.append(t_end)
+        prices.append(p)
+
+    return PriceCurve(starts=starts, ends=ends, prices=prices)
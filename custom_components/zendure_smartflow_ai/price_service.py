@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+from datetime import tzinfo
+from typing import Any
+
+from .price_curve import PriceCurve, parse_price_curve
+
+# ==================================================
+# Gemeinsamer Preisdienst aller Config-Einträge
+#
+# Zeigen mehrere Einträge (Häuser, Akkus) auf dieselbe Tibber-/EPEX-Entität,
+# wird deren `data`-Attribut nur einmal pro Aktualisierung geparst. Alle
+# Einträge bekommen dieselbe (schreibgeschützte) PriceCurve samt der darauf
+# zwischengespeicherten Peak-Analyse.
+# ==================================================
+
+
+class PriceService:
+    """Parsed price exports keyed by entity id, shared by all config entries."""
+
+    def __init__(self) -> None:
+        self._curves: dict[str, tuple[Any, PriceCurve | None]] = {}
+        self._users: dict[str, set[str]] = {}  # entity id -> entry ids
+        self.parses = 0
+        self.hits = 0
+
+    def __bool__(self) -> bool:
+        return bool(self._users)
+
+    def acquire(self, entity_id: str, user: str) -> None:
+        self._users.setdefault(entity_id, set()).add(user)
+
+    def release(self, user: str) -> None:
+        for entity_id in list(self._users):
+            users = self._users[entity_id]
+            users.discard(user)
+            if not users:
+                del self._users[entity_id]
+                self._curves.pop(entity_id, None)
+
+    def curve(
+        self,
+        entity_id: str,
+        stamp: Any,
+        export: Any,
+        default_tz: tzinfo,
+    ) -> PriceCurve | None:
+        """The curve for this entity state; parsed only when `stamp` changed."""
+        cached = self._curves.get(entity_id)
+        if cached is not None and cached[0] == stamp:
+            self.hits += 1
+            return cached[1]
+
+        curve = parse_price_curve(export, default_tz=default_tz)
+        self._curves[entity_id] = (stamp, curve)
+        self.parses += 1
+        return curve
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "entities": {
+                entity_id: {
+                    "users": len(self._users.get(entity_id, ())),
+                    "slots": len(curve) if curve is not None else 0,
+                }
+                for entity_id, (_stamp, curve) in self._curves.items()
+            },
+            "parses": self.parses,
+            "hits": self.hits,
+        }
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import cProfile
+import pstats
+from typing import Any
+
+# ==================================================
+# Profiling auf Abruf (Service profile_cycles)
+#
+# cProfile läuft nur innerhalb der nächsten N Regelzyklen und wird danach
+# als pstats-Datei gespeichert (python -m pstats, snakeviz, flameprof,
+# gprof2dot). Ohne aktiven Auftrag kostet das im Zyklus nur eine
+# None-Prüfung.
+# ==================================================
+
+
+class CycleProfiler:
+    """cProfile over the next `cycles` update cycles."""
+
+    def __init__(self, cycles: int, path: str) -> None:
+        self.cycles = max(int(cycles), 1)
+        self.path = path
+        self.recorded = 0
+        self._profile = cProfile.Profile()
+
+    @property
+    def finished(self) -> bool:
+        return self.recorded >= self.cycles
+
+    def enable(self) -> None:
+        self._profile.enable()
+
+    def disable(self) -> None:
+        self._profile.disable()
+        self.recorded += 1
+
+    def dump(self, top: int = 10) -> dict[str, Any]:
+        """Write the .prof file and summarise it (blocking I/O: executor)."""
+        self._profile.dump_stats(self.path)
+        stats = pstats.Stats(self._profile)
+
+        ranked = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        return {
+            "path": self.path,
+            "cycles": self.recorded,
+            "total_ms": round(stats.total_tt * 1000.0, 1),
+            "top_cumulative": [
+                {
+                    "function": pstats.func_std_string(func),
+                    "calls": nc,
+                    "cumulative_ms": round(ct * 1000.0, 2),
+                }
+                for func, (_cc, nc, _tt, ct, _callers) in ranked[:top]
+            ],
+        }
@@ -4,7 +4,7 @@ from dataclasses import dataclass
 
 from homeassistant.components.select import SelectEntity, SelectEntityDescription
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 
 from .const import (
@@ -17,6 +17,10 @@ from .const import (
     MANUAL_ACTIONS,
     AI_MODE_AUTOMATIC,
     MANUAL_STANDBY,
+    PLANNING_STRATEGIES,
+    PLANNING_STRATEGY_PEAK_WINDOW,
+    AUTOTUNE_MODES,
+    AUTOTUNE_OFF,
 )
 
 
@@ -52,6 +56,26 @@ SELECTS: tuple[ZendureSelectEntityDescription, ...] = (
         default_option=MANUAL_STANDBY,
         icon="mdi:gesture-tap-button",
     ),
+
+    # 3. Planungsstrategie
+    ZendureSelectEntityDescription(
+        key="planning_strategy",
+        translation_key="planning_strategy",
+        runtime_key="planning_strategy",
+        options_list=PLANNING_STRATEGIES,
+        default_option=PLANNING_STRATEGY_PEAK_WINDOW,
+        icon="mdi:chart-timeline-variant",
+    ),
+
+    # 4. Regler-Auto-Tune
+    ZendureSelectEntityDescription(
+        key="autotune",
+        translation_key="autotune",
+        runtime_key="autotune",
+        options_list=AUTOTUNE_MODES,
+        default_option=AUTOTUNE_OFF,
+        icon="mdi:tune-variant",
+    ),
 )
 
 
@@ -84,6 +108,7 @@ class ZendureSmartFlowSelect(SelectEntity):
         self._entry = entry
 
         self._attr_unique_id = f"{entry.entry_id}_{description.key}"
+        self._last_written: tuple | None = None
 
         self._attr_device_info = {
             "identifiers": {(DOMAIN, entry.entry_id)},
@@ -116,7 +141,16 @@ class ZendureSmartFlowSelect(SelectEntity):
         self.coordinator.runtime_mode[self.entity_description.runtime_key] = option
         self.async_write_ha_state()
 
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Coordinator refreshes only matter here when availability or value changed."""
+        snapshot = (self.available, self.current_option)
+        if snapshot == self._last_written:
+            return
+        self._last_written = snapshot
+        self.async_write_ha_state()
+
     async def async_added_to_hass(self) -> None:
         self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
+            self.coordinator.async_add_listener(self._handle_coordinator_update)
         )
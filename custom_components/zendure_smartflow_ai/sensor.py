@@ -9,7 +9,8 @@ from homeassistant.components.sensor import (
     SensorDeviceClass,
 )
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.const import MATCH_ALL, EntityCategory
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 
 from .const import (
@@ -36,6 +37,7 @@ PLANNING_STATUS_ENUMS = [
     "planning_no_price_data",
     "planning_no_peak_detected",
     "planning_peak_detected_insufficient_window",
+    "planning_soc_sufficient",
     "planning_waiting_for_cheap_window",
     "planning_charge_now",
     "planning_discharge_planned",
@@ -45,6 +47,11 @@ PLANNING_STATUS_ENUMS = [
 @dataclass(frozen=True, kw_only=True)
 class ZendureSensorEntityDescription(SensorEntityDescription):
     runtime_key: str
+    # keys of coordinator details exposed as attributes (keep slow-changing
+    # values here, volatile ones would force a state write every cycle)
+    attr_keys: tuple[str, ...] = ()
+    # expose the complete details payload (debug sensor only, not recorded)
+    all_details: bool = False
 
     def __post_init__(self):
         if not self.key:
@@ -59,6 +66,7 @@ SENSORS: tuple[ZendureSensorEntityDescription, ...] = (
         key="status",
         translation_key="status",
         runtime_key="status",
+        attr_keys=("ai_mode", "device_profile"),
         icon="mdi:power-plug",
         device_class=SensorDeviceClass.ENUM,
         options=STATUS_ENUMS,
@@ -67,6 +75,7 @@ SENSORS: tuple[ZendureSensorEntityDescription, ...] = (
         key="ai_status",
         translation_key="ai_status",
         runtime_key="ai_status",
+        attr_keys=("ai_mode", "manual_action", "power_state", "emergency_active"),
         icon="mdi:robot",
         device_class=SensorDeviceClass.ENUM,
         options=AI_STATUS_ENUMS,
@@ -75,6 +84,7 @@ SENSORS: tuple[ZendureSensorEntityDescription, ...] = (
         key="recommendation",
         translation_key="recommendation",
         runtime_key="recommendation",
+        attr_keys=("power_state", "emergency_active"),
         icon="mdi:lightbulb-outline",
         device_class=SensorDeviceClass.ENUM,
         options=RECO_ENUMS,
@@ -85,6 +95,7 @@ SENSORS: tuple[ZendureSensorEntityDescription, ...] = (
         key="next_action_state",
         translation_key="next_action_state",
         runtime_key="next_action_state",
+        attr_keys=("next_planned_action_time", "next_action_time"),
         icon="mdi:clock-outline",
         device_class=SensorDeviceClass.ENUM,
         options=NEXT_ACTION_STATE_ENUMS,
@@ -102,6 +113,7 @@ SENSORS: tuple[ZendureSensorEntityDescription, ...] = (
         key="next_planned_action",
         translation_key="next_planned_action",
         runtime_key="next_planned_action",
+        attr_keys=("next_planned_action_time", "next_action_time"),
         icon="mdi:calendar-arrow-right",
         device_class=SensorDeviceClass.ENUM,
         options=NEXT_PLANNED_ACTION_ENUMS,
@@ -119,12 +131,15 @@ SENSORS: tuple[ZendureSensorEntityDescription, ...] = (
         key="ai_debug",
         translation_key="ai_debug",
         runtime_key="debug",
+        all_details=True,
         icon="mdi:bug",
+        entity_category=EntityCategory.DIAGNOSTIC,
     ),
     ZendureSensorEntityDescription(
         key="decision_reason",
         translation_key="decision_reason",
         runtime_key="decision_reason",
+        attr_keys=("power_state", "force_no_charge"),
         icon="mdi:head-question-outline",
     ),
 
@@ -133,6 +148,7 @@ SENSORS: tuple[ZendureSensorEntityDescription, ...] = (
         key="planning_status",
         translation_key="planning_status",
         runtime_key="planning_status",
+        attr_keys=("planning_checked", "planning_blocked_by", "planning_next_peak", "planning_target_soc"),
         icon="mdi:timeline-alert",
         device_class=SensorDeviceClass.ENUM,
         options=PLANNING_STATUS_ENUMS,
@@ -141,19 +157,30 @@ SENSORS: tuple[ZendureSensorEntityDescription, ...] = (
         key="planning_active",
         translation_key="planning_active",
         runtime_key="planning_active",
+        attr_keys=("planning_status", "planning_next_peak"),
         icon="mdi:flash",
     ),
     ZendureSensorEntityDescription(
         key="planning_target_soc",
         translation_key="planning_target_soc",
         runtime_key="planning_target_soc",
+        attr_keys=("planning_status", "planning_next_peak"),
         icon="mdi:battery-high",
         native_unit_of_measurement="%",
     ),
+    ZendureSensorEntityDescription(
+        key="planning_charge_kwh",
+        translation_key="planning_charge_kwh",
+        runtime_key="planning_charge_kwh",
+        attr_keys=("planning_charge_slots", "planning_next_peak", "planning_target_soc"),
+        icon="mdi:calendar-export",
+        native_unit_of_measurement="kWh",
+    ),
     ZendureSensorEntityDescription(
         key="planning_reason",
         translation_key="planning_reason",
         runtime_key="planning_reason",
+        attr_keys=("planning_status", "planning_next_peak"),
         icon="mdi:text-long",
     ),
 
@@ -186,6 +213,17 @@ SENSORS: tuple[ZendureSensorEntityDescription, ...] = (
         icon="mdi:cash",
         native_unit_of_measurement="€",
     ),
+
+    # --- Run time of the update cycle (p95, timing.py) ---
+    ZendureSensorEntityDescription(
+        key="cycle_time",
+        translation_key="cycle_time",
+        runtime_key="cycle_time_ms",
+        icon="mdi:timer-outline",
+        native_unit_of_measurement="ms",
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
 )
 
 async def async_setup_entry(
@@ -202,7 +240,8 @@ async def async_setup_entry(
 
     entities = []
     for d in SENSORS:
-        entities.append(ZendureSmartFlowSensor(entry, coordinator, d))
+        cls = ZendureSmartFlowDebugSensor if d.all_details else ZendureSmartFlowSensor
+        entities.append(cls(entry, coordinator, d))
 
     add_entities(entities)
 
@@ -223,6 +262,7 @@ class ZendureSmartFlowSensor(SensorEntity):
             raise ValueError(f"ZendureSmartFlowSensor created without key: {description}")
 
         self._attr_unique_id = f"{DOMAIN}_{entry.entry_id}_{description.key}"
+        self._last_written: tuple | None = None
 
         self._attr_device_info = {
             "identifiers": {(DOMAIN, entry.entry_id)},
@@ -274,6 +314,7 @@ class ZendureSmartFlowSensor(SensorEntity):
             "planning_status",
             "planning_active",
             "planning_target_soc",
+            "planning_charge_kwh",
             "planning_reason",
             "next_action_state",
             "next_planned_action",
@@ -286,25 +327,35 @@ class ZendureSmartFlowSensor(SensorEntity):
     def extra_state_attributes(self):
         data = self.coordinator.data or {}
         details = data.get("details") or {}
+        description = self.entity_description
 
-        if self.entity_description.key in (
-            "status",
-            "ai_status",
-            "recommendation",
-            "decision_reason",
-            "ai_debug",
-            "planning_status",
-            "planning_active",
-            "planning_target_soc",
-            "planning_reason",
-            "next_action_state",
-            "next_planned_action",
-        ):
+        if description.all_details:
             return details
+        if not description.attr_keys:
+            return None
+        return {k: details.get(k) for k in description.attr_keys}
 
-        return None
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Write state only when value, attributes or availability changed."""
+        snapshot = (self.available, self.native_value, self.extra_state_attributes)
+        if snapshot == self._last_written:
+            return
+        self._last_written = snapshot
+        self.async_write_ha_state()
 
     async def async_added_to_hass(self) -> None:
         self.async_on_remove(
-            self.coordinator.async_add_listener(self.async_write_ha_state)
+            self.coordinator.async_add_listener(self._handle_coordinator_update)
         )
+
+
+class ZendureSmartFlowDebugSensor(ZendureSmartFlowSensor):
+    """
+    Single diagnostics surface for the full details payload.
+
+    The attributes change every cycle and are large, so they are excluded
+    from the recorder (live view / diagnostics download only).
+    """
+
+    _unrecorded_attributes = frozenset({MATCH_ALL})
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import voluptuous as vol
+
+from homeassistant.core import HomeAssistant, ServiceCall, callback
+from homeassistant.exceptions import ServiceValidationError
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    ATTR_CYCLES,
+    DOMAIN,
+    PROFILE_CYCLES_DEFAULT,
+    PROFILE_CYCLES_MAX,
+    SERVICE_PROFILE_CYCLES,
+)
+
+# ==================================================
+# Services der Integration (services.yaml)
+# ==================================================
+
+PROFILE_CYCLES_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_CYCLES, default=PROFILE_CYCLES_DEFAULT): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=PROFILE_CYCLES_MAX)
+        ),
+    }
+)
+
+
+@callback
+def async_setup_services(hass: HomeAssistant) -> None:
+    """Register the services once (shared by all config entries)."""
+    if hass.services.has_service(DOMAIN, SERVICE_PROFILE_CYCLES):
+        return
+
+    @callback
+    def _profile_cycles(call: ServiceCall) -> None:
+        coordinators = list(hass.data.get(DOMAIN, {}).items())
+        if not coordinators:
+            raise ServiceValidationError("Zendure SmartFlow AI is not set up")
+        if any(coordinator.profiling for _, coordinator in coordinators):
+            raise ServiceValidationError("Profiling is already running")
+
+        stamp = dt_util.now().strftime("%Y%m%d-%H%M%S")
+        for entry_id, coordinator in coordinators:
+            path = hass.config.path(f"{DOMAIN}_{stamp}_{entry_id[:8]}.prof")
+            coordinator.async_start_profiling(call.data[ATTR_CYCLES], path)
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_PROFILE_CYCLES, _profile_cycles, schema=PROFILE_CYCLES_SCHEMA
+    )
+
+
+@callback
+def async_unload_services(hass: HomeAssistant) -> None:
+    """Remove the services with the last config entry."""
+    if hass.data.get(DOMAIN):
+        return
+    hass.services.async_remove(DOMAIN, SERVICE_PROFILE_CYCLES)
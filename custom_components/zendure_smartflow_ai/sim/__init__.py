@@ -0,0 +1 @@
+"""Offline tools: replay, controller benchmark and a mock local Zendure device."""
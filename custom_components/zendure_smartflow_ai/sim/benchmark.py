@@ -0,0 +1,477 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from collections.abc import Mapping
+from dataclasses import asdict, dataclass
+
+from ..const import DEFAULT_MAX_DISCHARGE, DEFAULT_SOC_MIN, EVENT_DEBOUNCE_S
+from ..device_profiles import DEVICE_PROFILES
+from ..engine import (
+    delta_discharge_w,
+    feed_forward_inputs,
+    feed_forward_w,
+    predict_inflight_w,
+    track_setpoint,
+)
+from ..fleet import FleetUnit, split_setpoint
+from ..state import ControllerState
+from ..write_budget import WriteBudget
+from .plant import LoadProfile, Plant, PlantConfig
+
+# ==================================================
+# Closed-loop benchmark of the delta discharge controller
+#
+#   python -m custom_components.zendure_smartflow_ai.sim.benchmark
+#
+# Every device profile runs every scenario against the simulated plant.
+# The controller runs on each new meter reading (debounced like the
+# coordinator) and only writes the output limit when it changes.
+# ==================================================
+
+# |grid - TARGET_IMPORT_W| <= DEADBAND_W + margin counts as settled
+SETTLE_MARGIN_W = 25.0
+
+# (t_s, load_w, pv_w)
+SCENARIOS: dict[str, LoadProfile] = {
+    "load_steps": LoadProfile(
+        points=(
+            (0.0, 200.0, 0.0),
+            (60.0, 600.0, 0.0),
+            (240.0, 350.0, 0.0),
+            (420.0, 700.0, 0.0),
+            (600.0, 150.0, 0.0),
+        ),
+        duration_s=780.0,
+    ),
+    "pv_cloud": LoadProfile(
+        points=(
+            (0.0, 650.0, 400.0),
+            (120.0, 650.0, 50.0),
+            (300.0, 650.0, 450.0),
+            (480.0, 650.0, 100.0),
+        ),
+        duration_s=660.0,
+    ),
+    "appliance_cycling": LoadProfile(
+        points=tuple(
+            (t, 250.0 + (180.0 if (t // 45.0) % 2 else 0.0), 0.0)
+            for t in range(0, 540, 45)
+        ),
+        duration_s=540.0,
+    ),
+}
+
+
+@dataclass(slots=True)
+class BenchmarkResult:
+    profile: str
+    scenario: str
+    iae_wh: float  # ∫ |grid - target import| dt
+    import_wh: float
+    export_wh: float
+    peak_export_w: float
+    oscillations: int  # direction reversals of the written setpoint
+    settle_mean_s: float | None  # after load / PV steps, None = never settled
+    settle_max_s: float | None
+    unsettled_steps: int
+    writes: int
+
+
+def _settle_times(
+    trace: list[tuple[float, float]],
+    step_times: list[float],
+    duration_s: float,
+    target_w: float,
+    band_w: float,
+) -> list[float | None]:
+    """Per step: time until the error stays inside the band up to the next step."""
+    out: list[float | None] = []
+    bounds = list(step_times) + [duration_s]
+    for t_step, t_end in zip(bounds[:-1], bounds[1:]):
+        last_violation: float | None = None
+        inside_any = False
+        for t, grid in trace:
+            if t < t_step or t >= t_end:
+                continue
+            if abs(grid - target_w) > band_w:
+                last_violation = t
+                inside_any = False
+            else:
+                inside_any = True
+        if not inside_any:
+            out.append(None)
+        elif last_violation is None:
+            out.append(0.0)
+        else:
+            out.append(round(last_violation - t_step, 1))
+    return out
+
+
+def _count_direction(
+    val: int, last_written: int | None, last_dir: int, oscillations: int
+) -> tuple[int, int]:
+    direction = 1 if last_written is None or val > last_written else -1
+    if last_dir and direction != last_dir:
+        oscillations += 1
+    return direction, oscillations
+
+
+def run_scenario(
+    profile_key: str,
+    profile: Mapping[str, float],
+    scenario: str,
+    load: LoadProfile,
+    *,
+    plant_cfg: PlantConfig | None = None,
+    max_discharge: float = DEFAULT_MAX_DISCHARGE,
+    debounce_s: float = EVENT_DEBOUNCE_S,
+    seed: int = 0,
+    budget: WriteBudget | None = None,
+) -> BenchmarkResult:
+    cfg = plant_cfg or PlantConfig()
+    plant = Plant(cfg, load, seed=seed)
+    target = float(profile["TARGET_IMPORT_W"])
+
+    out_w = 0.0
+    state = ControllerState()
+    last_written: int | None = None
+    pending: int | None = None  # waiting for a write token
+    writes = 0
+    last_dir = 0
+    oscillations = 0
+
+    seen_seq = 0
+    last_run = -debounce_s
+
+    iae = imp = exp = peak_export = 0.0
+    trace: list[tuple[float, float]] = []
+    dt_h = cfg.dt_s / 3600.0
+
+    while plant.t < load.duration_s:
+        grid = plant.advance()
+        t = plant.t
+
+        err = abs(grid - target)
+        iae += err * dt_h
+        if grid > 0.0:
+            imp += grid * dt_h
+        else:
+            exp += -grid * dt_h
+            peak_export = max(peak_export, -grid)
+        trace.append((t, grid))
+
+        # coalesced value gets written as soon as a token is back
+        if pending is not None and budget is not None and budget.bucket.try_take(t):
+            budget.issued += 1
+            last_dir, oscillations = _count_direction(pending, last_written, last_dir, oscillations)
+            last_written = pending
+            pending = None
+            writes += 1
+            plant.write_output_limit(last_written)
+
+        # new reading -> control step (Debouncer: at most one per cooldown)
+        if plant.reading_seq == seen_seq or t - last_run < debounce_s - 1e-9:
+            continue
+        seen_seq = plant.reading_seq
+        last_run = t
+
+        # same prediction / load estimate as the engine: import + PV + visible discharge
+        reading = float(plant.reading)
+        pv = plant.pv_w
+        inflight = predict_inflight_w(state, profile, t)
+        load_step, pv_step = feed_forward_inputs(
+            state, house_load_w=max(reading + pv + out_w - inflight, 0.0), pv_w=pv
+        )
+        ff = feed_forward_w(profile, load_step, pv_step)
+
+        new_out = delta_discharge_w(
+            profile=profile,
+            deficit_w=reading,
+            prev_out_w=out_w,
+            max_discharge=max_discharge,
+            soc=50.0,
+            soc_min=DEFAULT_SOC_MIN,
+            ff_w=ff,
+            inflight_w=inflight,
+        )
+        val = int(round(new_out, 0))
+
+        if budget is not None and val != last_written:
+            if not budget.worth_writing(val, last_written, reading - inflight - target):
+                budget.suppressed += 1
+                pending = None
+                val = last_written
+            elif not budget.bucket.try_take(t):
+                budget.throttled += 1
+                if pending is not None:
+                    budget.coalesced += 1
+                pending = val
+                val = last_written
+            else:
+                budget.issued += 1
+                pending = None
+
+        if val is not None and val != last_written:
+            last_dir, oscillations = _count_direction(val, last_written, last_dir, oscillations)
+            last_written = val
+            writes += 1
+            plant.write_output_limit(val)
+
+        # like engine.track_applied_output: the controller continues from the
+        # written or pending limit, a suppressed change keeps the old one
+        out_w = new_out if budget is None or pending is not None else float(last_written or 0)
+        track_setpoint(state, t, out_w)
+
+    band = float(profile["DEADBAND_W"]) + SETTLE_MARGIN_W
+    settle = _settle_times(trace, load.step_times, load.duration_s, target, band)
+    settled = [s for s in settle if s is not None]
+
+    return BenchmarkResult(
+        profile=profile_key,
+        scenario=scenario,
+        iae_wh=round(iae, 2),
+        import_wh=round(imp, 2),
+        export_wh=round(exp, 2),
+        peak_export_w=round(peak_export, 0),
+        oscillations=oscillations,
+        settle_mean_s=round(sum(settled) / len(settled), 1) if settled else None,
+        settle_max_s=max(settled) if settled else None,
+        unsettled_steps=len(settle) - len(settled),
+        writes=writes,
+    )
+
+
+def run_fleet_scenario(
+    profile_key: str,
+    profile: Mapping[str, float],
+    scenario: str,
+    load: LoadProfile,
+    *,
+    units: int = 2,
+    fleet: bool = True,
+    plant_cfg: PlantConfig | None = None,
+    debounce_s: float = EVENT_DEBOUNCE_S,
+    seed: int = 0,
+) -> BenchmarkResult:
+    """
+    Several inverters behind one meter.
+
+    fleet=False: one controller per unit, all chasing the same reading
+    (separate config entries). fleet=True: one controller for the summed
+    battery, the setpoint split by fleet.split_setpoint.
+    """
+    cfg = plant_cfg or PlantConfig()
+    plant = Plant(cfg, load, seed=seed, units=units)
+    target = float(profile["TARGET_IMPORT_W"])
+    # different SoC per unit, so the split is not trivially even
+    fleet_units = [
+        FleetUnit(
+            key=str(i),
+            soc=70.0 - 40.0 * i / max(units - 1, 1),
+            pv_w=0.0,
+            soc_min=DEFAULT_SOC_MIN,
+            soc_max=100.0,
+            max_charge=cfg.max_output_w,
+            max_discharge=cfg.max_output_w,
+        )
+        for i in range(units)
+    ]
+
+    loops = 1 if fleet else units
+    states = [ControllerState() for _ in range(loops)]
+    outs = [0.0] * loops
+    max_out = cfg.max_output_w * (units if fleet else 1)
+    written: list[int | None] = [None] * units
+    writes = 0
+    last_total: int | None = None
+    last_dir = 0
+    oscillations = 0
+
+    seen_seq = 0
+    last_run = -debounce_s
+
+    iae = imp = exp = peak_export = 0.0
+    trace: list[tuple[float, float]] = []
+    dt_h = cfg.dt_s / 3600.0
+
+    while plant.t < load.duration_s:
+        grid = plant.advance()
+        t = plant.t
+
+        iae += abs(grid - target) * dt_h
+        if grid > 0.0:
+            imp += grid * dt_h
+        else:
+            exp += -grid * dt_h
+            peak_export = max(peak_export, -grid)
+        trace.append((t, grid))
+
+        if plant.reading_seq == seen_seq or t - last_run < debounce_s - 1e-9:
+            continue
+        seen_seq = plant.reading_seq
+        last_run = t
+
+        reading = float(plant.reading)
+        pv = plant.pv_w
+        for k, state in enumerate(states):
+            inflight = predict_inflight_w(state, profile, t)
+            load_step, pv_step = feed_forward_inputs(
+                state, house_load_w=max(reading + pv + outs[k] - inflight, 0.0), pv_w=pv
+            )
+            outs[k] = delta_discharge_w(
+                profile=profile,
+                deficit_w=reading,
+                prev_out_w=outs[k],
+                max_discharge=max_out,
+                soc=50.0,
+                soc_min=DEFAULT_SOC_MIN,
+                ff_w=feed_forward_w(profile, load_step, pv_step),
+                inflight_w=inflight,
+            )
+            track_setpoint(state, t, outs[k])
+
+        if fleet:
+            shares = split_setpoint(outs[0], fleet_units, charge=False)
+            setpoints = [shares[u.key] for u in fleet_units]
+        else:
+            setpoints = outs
+        for i, watts in enumerate(setpoints):
+            val = int(round(watts, 0))
+            if val != written[i]:
+                written[i] = val
+                writes += 1
+                plant.write_output_limit(val, unit=i)
+
+        total = sum(w or 0 for w in written)
+        if total != last_total:
+            last_dir, oscillations = _count_direction(total, last_total, last_dir, oscillations)
+            last_total = total
+
+    band = float(profile["DEADBAND_W"]) + SETTLE_MARGIN_W
+    settle = _settle_times(trace, load.step_times, load.duration_s, target, band)
+    settled = [s for s in settle if s is not None]
+
+    return BenchmarkResult(
+        profile=profile_key,
+        scenario=f"{scenario} x{units} {'fleet' if fleet else 'independent'}",
+        iae_wh=round(iae, 2),
+        import_wh=round(imp, 2),
+        export_wh=round(exp, 2),
+        peak_export_w=round(peak_export, 0),
+        oscillations=oscillations,
+        settle_mean_s=round(sum(settled) / len(settled), 1) if settled else None,
+        settle_max_s=max(settled) if settled else None,
+        unsettled_steps=len(settle) - len(settled),
+        writes=writes,
+    )
+
+
+def run_suite(
+    profiles: Mapping[str, Mapping[str, float]] = DEVICE_PROFILES,
+    scenarios: Mapping[str, LoadProfile] = SCENARIOS,
+    *,
+    plant_cfg: PlantConfig | None = None,
+    seed: int = 0,
+    write_budget: bool = False,
+    units: int = 1,
+) -> list[BenchmarkResult]:
+    if units > 1:
+        return [
+            run_fleet_scenario(
+                p_key,
+                profile,
+                s_key,
+                load,
+                units=units,
+                fleet=fleet,
+                plant_cfg=plant_cfg,
+                seed=seed,
+            )
+            for p_key, profile in profiles.items()
+            for s_key, load in scenarios.items()
+            for fleet in (False, True)
+        ]
+    return [
+        run_scenario(
+            p_key,
+            profile,
+            s_key,
+            load,
+            plant_cfg=plant_cfg,
+            seed=seed,
+            budget=WriteBudget() if write_budget else None,
+        )
+        for p_key, profile in profiles.items()
+        for s_key, load in scenarios.items()
+    ]
+
+
+# --------------------------------------------------
+# CLI
+# --------------------------------------------------
+_COLUMNS = (
+    ("profile", "profile"),
+    ("scenario", "scenario"),
+    ("iae_wh", "IAE Wh"),
+    ("import_wh", "imp Wh"),
+    ("export_wh", "exp Wh"),
+    ("peak_export_w", "peak exp W"),
+    ("oscillations", "osc"),
+    ("settle_mean_s", "settle Ø s"),
+    ("settle_max_s", "settle max s"),
+    ("unsettled_steps", "unsettled"),
+    ("writes", "writes"),
+)
+
+
+def _print_table(results: list[BenchmarkResult]) -> None:
+    rows = [[str(getattr(r, k)) for k, _ in _COLUMNS] for r in results]
+    header = [h for _, h in _COLUMNS]
+    widths = [max(len(x) for x in col) for col in zip(header, *rows)]
+    for row in [header, *rows]:
+        print("  ".join(x.ljust(w) for x, w in zip(row, widths)))
+
+
+def main(argv: list[str] | None = None) -> int:
+    d = PlantConfig()
+    p = argparse.ArgumentParser(
+        prog="python -m custom_components.zendure_smartflow_ai.sim.benchmark",
+        description="Closed-loop benchmark of the discharge controller for every device profile.",
+    )
+    p.add_argument("--dead-time", type=float, default=d.dead_time_s)
+    p.add_argument("--ramp", type=float, default=d.ramp_w_per_s, help="inverter ramp W/s")
+    p.add_argument("--meter-period", type=float, default=d.meter_period_s)
+    p.add_argument("--meter-delay", type=float, default=d.meter_delay_s)
+    p.add_argument("--noise", type=float, default=d.meter_noise_w)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--write-budget", action="store_true", help="writes through the device write budget")
+    p.add_argument(
+        "--units",
+        type=int,
+        default=1,
+        help="inverters behind the meter: independent controllers vs. fleet dispatcher",
+    )
+    p.add_argument("--json", action="store_true")
+    args = p.parse_args(argv)
+
+    cfg = PlantConfig(
+        dead_time_s=args.dead_time,
+        ramp_w_per_s=args.ramp,
+        meter_period_s=args.meter_period,
+        meter_delay_s=args.meter_delay,
+        meter_noise_w=args.noise,
+    )
+    results = run_suite(
+        plant_cfg=cfg, seed=args.seed, write_budget=args.write_budget, units=args.units
+    )
+    if args.json:
+        print(json.dumps([asdict(r) for r in results], indent=2))
+    else:
+        _print_table(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
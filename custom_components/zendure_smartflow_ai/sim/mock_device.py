@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from dataclasses import dataclass, field
+from statistics import median
+from typing import Any
+
+from aiohttp import ClientSession, TCPConnector, web
+
+from ..const import LOCAL_API_POLL_S
+from ..local_api import LocalTransport, ZendureLocalClient
+
+# ==================================================
+# Lokales Zendure-Gerät als Attrappe (zenSDK HTTP-API)
+#
+# Für Tests und Latenzmessungen ohne echte Hardware: Schreibzugriffe
+# werden quittiert und erst nach apply_delay_s im Report sichtbar
+# (Übernahme durch den Wechselrichter).
+# ==================================================
+
+
+@dataclass(slots=True)
+class MockDevice:
+    sn: str = "MOCK0000000001"
+    latency_s: float = 0.005  # HTTP response delay
+    apply_delay_s: float = 0.3  # write -> visible in /properties/report
+    properties: dict[str, Any] = field(
+        default_factory=lambda: {
+            "acMode": 2,
+            "inputLimit": 0,
+            "outputLimit": 0,
+            "electricLevel": 50,
+            "solarInputPower": 0,
+            "outputHomePower": 0,
+        }
+    )
+    writes: int = 0
+    reports: int = 0
+
+    async def _report(self, request: web.Request) -> web.Response:
+        await asyncio.sleep(self.latency_s)
+        self.reports += 1
+        return web.json_response(
+            {
+                "timestamp": int(time.time()),
+                "sn": self.sn,
+                "product": "mock",
+                "properties": dict(self.properties),
+            }
+        )
+
+    async def _write(self, request: web.Request) -> web.Response:
+        await asyncio.sleep(self.latency_s)
+        try:
+            body = await request.json()
+        except ValueError:
+            return web.json_response({"success": False, "error": "invalid json"}, status=400)
+        if body.get("sn") != self.sn or not isinstance(body.get("properties"), dict):
+            return web.json_response({"success": False, "error": "bad request"}, status=400)
+
+        self.writes += 1
+        props = dict(body["properties"])
+
+        def _apply() -> None:
+            self.properties.update(props)
+            if "outputLimit" in props:
+                self.properties["outputHomePower"] = props["outputLimit"]
+
+        asyncio.get_running_loop().call_later(self.apply_delay_s, _apply)
+        return web.json_response({"success": True})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/properties/report", self._report)
+        app.router.add_post("/properties/write", self._write)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> tuple[web.AppRunner, int]:
+        """Serve in the running loop; returns the runner and the bound port."""
+        runner = web.AppRunner(self.app())
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        return runner, runner.addresses[0][1]  # port 0 -> ephemeral
+
+
+# --------------------------------------------------
+# latency measurement (client + transport against the mock)
+# --------------------------------------------------
+@dataclass(frozen=True, slots=True)
+class _Step:
+    key: str
+    value: Any
+
+
+def _pct(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+async def measure(
+    *,
+    writes: int = 50,
+    latency_s: float = 0.005,
+    apply_delay_s: float = 0.3,
+    keepalive: bool = True,
+    poll_s: float = LOCAL_API_POLL_S,
+) -> dict[str, Any]:
+    """Setpoint latency end to end: write -> ack, write -> confirmed in the report."""
+    device = MockDevice(latency_s=latency_s, apply_delay_s=apply_delay_s)
+    runner, port = await device.start()
+    try:
+        async with ClientSession(connector=TCPConnector(force_close=not keepalive)) as session:
+            client = ZendureLocalClient(session, f"127.0.0.1:{port}")
+            transport = LocalTransport(client, poll_s=poll_s)
+            await client.async_report()
+
+            ack: list[float] = []
+            confirm: list[float] = []
+            failed = 0
+            for i in range(writes):
+                step = _Step("last_set_output_w", 100 + 10 * (i % 2))
+                t0 = time.monotonic()
+                ok = await transport.async_write_confirmed(step, 5.0, 0.0)
+                if not ok:
+                    failed += 1
+                    continue
+                confirm.append(time.monotonic() - t0)
+                ack.append(transport.last_ack_s or 0.0)
+    finally:
+        await runner.cleanup()
+
+    def _stats(values: list[float]) -> dict[str, float | None]:
+        if not values:
+            return {"p50_ms": None, "p95_ms": None, "max_ms": None}
+        return {
+            "p50_ms": round(median(values) * 1000.0, 1),
+            "p95_ms": round(_pct(values, 0.95) * 1000.0, 1),
+            "max_ms": round(max(values) * 1000.0, 1),
+        }
+
+    return {
+        "writes": writes,
+        "failed": failed,
+        "keepalive": keepalive,
+        "device_writes": device.writes,
+        "device_reports": device.reports,
+        "ack": _stats(ack),
+        "confirm": _stats(confirm),
+    }
+
+
+# --------------------------------------------------
+# CLI
+# --------------------------------------------------
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(
+        prog="python -m custom_components.zendure_smartflow_ai.sim.mock_device",
+        description="Mock SolarFlow device (zenSDK local HTTP API) and setpoint latency measurement.",
+    )
+    sub = p.add_subparsers(dest="cmd", required=True)
+
+    serve = sub.add_parser("serve", help="run the mock device")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8080)
+    serve.add_argument("--latency", type=float, default=0.005, help="HTTP response delay s")
+    serve.add_argument("--apply-delay", type=float, default=0.3, help="write -> report delay s")
+
+    m = sub.add_parser("measure", help="measure write/confirm latency against an in-process mock")
+    m.add_argument("--writes", type=int, default=50)
+    m.add_argument("--latency", type=float, default=0.005)
+    m.add_argument("--apply-delay", type=float, default=0.3)
+    m.add_argument("--poll", type=float, default=LOCAL_API_POLL_S, help="report read-back interval s")
+    m.add_argument("--no-keepalive", action="store_true", help="new connection per request")
+
+    args = p.parse_args(argv)
+
+    if args.cmd == "serve":
+        device = MockDevice(latency_s=args.latency, apply_delay_s=args.apply_delay)
+        web.run_app(device.app(), host=args.host, port=args.port)
+        return 0
+
+    result = asyncio.run(
+        measure(
+            writes=args.writes,
+            latency_s=args.latency,
+            apply_delay_s=args.apply_delay,
+            keepalive=not args.no_keepalive,
+            poll_s=args.poll,
+        )
+    )
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import random
+from bisect import bisect_right
+from collections import deque
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+# ==================================================
+# Simulated plant: house load + PV, inverter with dead time and ramp,
+# grid meter with noise and reporting delay.
+# Sign convention as in the coordinator: grid > 0 import, < 0 export.
+# ==================================================
+
+
+@dataclass(frozen=True, slots=True)
+class PlantConfig:
+    """Timing / noise of the simulated installation (defaults ≈ SolarFlow + Shelly 3EM)."""
+
+    dead_time_s: float = 3.0  # output_limit write -> inverter starts moving
+    ramp_w_per_s: float = 300.0  # inverter slew rate
+    max_output_w: float = 1200.0  # hardware limit of the inverter
+    meter_period_s: float = 2.0  # meter publishes a new value every n s
+    meter_delay_s: float = 1.0  # published value lags reality
+    meter_noise_w: float = 10.0  # gaussian sigma of the reading
+    dt_s: float = 0.1  # simulation step
+
+
+@dataclass(frozen=True, slots=True)
+class LoadProfile:
+    """
+    Piecewise constant house load / PV.
+
+    points: (t_s, load_w, pv_w), ascending t, first point at t = 0.
+    """
+
+    points: Sequence[tuple[float, float, float]]
+    duration_s: float
+
+    @property
+    def step_times(self) -> list[float]:
+        return [p[0] for p in self.points[1:]]
+
+
+class Plant:
+    """
+    Closed-loop plant; advance() in fixed steps, read the meter, write the limit.
+
+    units > 1: several inverters (same config) behind one meter.
+    """
+
+    def __init__(self, cfg: PlantConfig, load: LoadProfile, seed: int = 0, units: int = 1) -> None:
+        self.cfg = cfg
+        self.load = load
+        self._rng = random.Random(seed)
+        self._times = [p[0] for p in load.points]
+
+        self.t = 0.0
+        n = max(int(units), 1)
+        self.outputs_w = [0.0] * n  # actual AC output per inverter
+        self._targets_w = [0.0] * n
+        # (effective_at, watts) per inverter
+        self._pending: list[deque[tuple[float, float]]] = [deque() for _ in range(n)]
+
+        self._delay_steps = max(int(round(cfg.meter_delay_s / cfg.dt_s)), 0)
+        self._history: deque[float] = deque(maxlen=self._delay_steps + 1)
+        self._history.append(self.grid_w)
+        self._next_publish = 0.0
+        self.reading: float | None = None
+        self.reading_seq = 0  # increments with every published value
+
+    def _load_pv(self, t: float) -> tuple[float, float]:
+        i = max(bisect_right(self._times, t) - 1, 0)
+        _, load, pv = self.load.points[i]
+        return load, pv
+
+    @property
+    def pv_w(self) -> float:
+        return self._load_pv(self.t)[1]
+
+    @property
+    def output_w(self) -> float:
+        return sum(self.outputs_w)
+
+    @property
+    def grid_w(self) -> float:
+        load, pv = self._load_pv(self.t)
+        return load - pv - self.output_w
+
+    def write_output_limit(self, watts: float, unit: int = 0) -> None:
+        self._pending[unit].append((self.t + self.cfg.dead_time_s, float(watts)))
+
+    def advance(self) -> float:
+        """One simulation step; returns the true grid power after it."""
+        cfg = self.cfg
+        self.t += cfg.dt_s
+
+        max_step = cfg.ramp_w_per_s * cfg.dt_s
+        for i, pending in enumerate(self._pending):
+            while pending and pending[0][0] <= self.t:
+                self._targets_w[i] = min(max(pending.popleft()[1], 0.0), cfg.max_output_w)
+            delta = self._targets_w[i] - self.outputs_w[i]
+            self.outputs_w[i] += max(-max_step, min(max_step, delta))
+
+        grid = self.grid_w
+        self._history.append(grid)
+
+        if self.t + 1e-9 >= self._next_publish:
+            self._next_publish += cfg.meter_period_s
+            self.reading = self._history[0] + self._rng.gauss(0.0, cfg.meter_noise_w)
+            self.reading_seq += 1
+
+        return grid
@@ -0,0 +1,522 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterable, Mapping
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+from ..const import (
+    AI_MODE_AUTOMATIC,
+    DEFAULT_BATTERY_CAPACITY_KWH,
+    DEFAULT_PLANNING_CHARGE_W,
+    DEFAULT_DEVICE_PROFILE,
+    DEFAULT_EMERGENCY_CHARGE,
+    DEFAULT_EMERGENCY_SOC,
+    DEFAULT_MAX_CHARGE,
+    DEFAULT_MAX_DISCHARGE,
+    DEFAULT_PRICE_THRESHOLD,
+    DEFAULT_PROFIT_MARGIN_PCT,
+    DEFAULT_ROUND_TRIP_EFFICIENCY,
+    DEFAULT_SOC_MAX,
+    DEFAULT_SOC_MIN,
+    DEFAULT_VERY_EXPENSIVE_THRESHOLD,
+    MANUAL_STANDBY,
+    PLANNING_SLOT_MINUTES,
+    PLANNING_SOC_DELTA,
+    PLANNING_STRATEGY_PEAK_WINDOW,
+    ZENDURE_MODE_INPUT,
+)
+from ..device_profiles import DEVICE_PROFILES
+from ..engine import (
+    Decision,
+    Measurements,
+    Settings,
+    decide,
+    store_planning,
+    track_applied_output,
+    update_analytics,
+)
+from ..planner import evaluate_price_planning
+from ..price_curve import PriceCurve
+from ..state import ControllerState
+from ..write_budget import WriteBudget
+
+# ==================================================
+# Offline replay of recorded SoC / PV / grid / price series
+#
+#   python -m custom_components.zendure_smartflow_ai.sim.replay data.csv
+#
+# Columns (CSV header or JSON keys):
+#   timestamp   ISO 8601 or epoch seconds
+#   soc         %
+#   pv_w        W (alias: pv)
+#   grid_w      W, + import / - export
+#     or grid_import_w + grid_export_w
+#   price       €/kWh (optional)
+#   battery_w   W, + charge / - discharge (optional, closed loop only:
+#               removed from the recorded grid to get the baseline)
+# ==================================================
+
+SLOT_S = PLANNING_SLOT_MINUTES * 60
+
+
+@dataclass(slots=True)
+class Sample:
+    ts: float
+    soc: float
+    pv_w: float
+    grid_w: float
+    price: float | None = None
+    battery_w: float = 0.0
+
+
+@dataclass(slots=True)
+class ReplayReport:
+    steps: int = 0
+    duration_h: float = 0.0
+    runtime_s: float = 0.0
+    # battery (AC side, from the setpoints)
+    charged_kwh: float = 0.0
+    discharged_kwh: float = 0.0
+    profit_eur: float = 0.0
+    # grid with the simulated battery
+    import_kwh: float = 0.0
+    export_kwh: float = 0.0
+    import_cost_eur: float = 0.0
+    # setpoint writes (same dedupe as the coordinator)
+    writes_ac_mode: int = 0
+    writes_input_limit: int = 0
+    writes_output_limit: int = 0
+    writes_suppressed: int = 0  # below the change threshold
+    writes_throttled: int = 0  # out of write tokens, retried later
+    planning_runs: int = 0
+    decisions: dict[str, int] = field(default_factory=dict)
+
+    @property
+    def writes_total(self) -> int:
+        return self.writes_ac_mode + self.writes_input_limit + self.writes_output_limit
+
+    def as_dict(self) -> dict[str, Any]:
+        out = asdict(self)
+        out["writes_total"] = self.writes_total
+        out["steps_per_s"] = round(self.steps / self.runtime_s, 1) if self.runtime_s else None
+        return out
+
+
+# --------------------------------------------------
+# input
+# --------------------------------------------------
+def _to_ts(v: Any) -> float:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        pass
+    dt = datetime.fromisoformat(str(v))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def _num(row: Mapping[str, Any], *keys: str) -> float | None:
+    for k in keys:
+        v = row.get(k)
+        if v is None or v == "":
+            continue
+        try:
+            return float(v)
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+def _rows(path: Path) -> Iterable[Mapping[str, Any]]:
+    if path.suffix.lower() == ".json":
+        data = json.loads(path.read_text(encoding="utf-8"))
+        if isinstance(data, dict):
+            data = data.get("data") or []
+        return data
+    with path.open(newline="", encoding="utf-8") as fh:
+        return list(csv.DictReader(fh))
+
+
+def load_samples(path: str | Path) -> list[Sample]:
+    """Read a CSV / JSON series; rows with missing SoC / PV / grid are skipped."""
+    samples: list[Sample] = []
+    for row in _rows(Path(path)):
+        try:
+            ts = _to_ts(row.get("timestamp") or row.get("time"))
+        except (TypeError, ValueError):
+            continue
+
+        soc = _num(row, "soc")
+        pv = _num(row, "pv_w", "pv")
+        grid = _num(row, "grid_w", "grid")
+        if grid is None:
+            gi = _num(row, "grid_import_w", "grid_import")
+            ge = _num(row, "grid_export_w", "grid_export")
+            if gi is not None and ge is not None:
+                grid = gi - ge
+        if soc is None or pv is None or grid is None:
+            continue
+
+        samples.append(
+            Sample(
+                ts=ts,
+                soc=soc,
+                pv_w=pv,
+                grid_w=grid,
+                price=_num(row, "price", "price_now"),
+                battery_w=_num(row, "battery_w") or 0.0,
+            )
+        )
+    samples.sort(key=lambda s: s.ts)
+    return samples
+
+
+def price_curve_from_samples(samples: list[Sample]) -> PriceCurve | None:
+    """Price per planning slot (first sample in the slot wins)."""
+    starts = array("d")
+    prices = array("d")
+    for s in samples:
+        if s.price is None:
+            continue
+        slot = s.ts - (s.ts % SLOT_S)
+        if starts and starts[-1] == slot:
+            continue
+        starts.append(slot)
+        prices.append(s.price)
+    if not starts:
+        return None
+    ends = array("d", (t + SLOT_S for t in starts))
+    return PriceCurve(starts=starts, ends=ends, prices=prices)
+
+
+def _visible(curve: PriceCurve, now_ts: float, lookahead_s: float) -> PriceCurve:
+    """What a day-ahead export would show at now_ts (no perfect foresight)."""
+    lo = curve.first_future(now_ts)
+    hi = bisect_left(curve.starts, now_ts + lookahead_s, lo)
+    return PriceCurve(
+        starts=curve.starts[lo:hi],
+        ends=curve.ends[lo:hi],
+        prices=curve.prices[lo:hi],
+    )
+
+
+# --------------------------------------------------
+# actuator (mirrors the coordinator's write dedupe)
+# --------------------------------------------------
+class CountingActuator:
+    """Applies setpoints like ZendureSmartFlowCoordinator and counts the writes."""
+
+    def __init__(self, report: ReplayReport, budget: WriteBudget | None = None) -> None:
+        self.report = report
+        self.budget = budget
+        self.device_mode: str | None = None
+        self.pending: dict[str, int] = {}  # waiting for a write token
+
+    def _set_ac_mode(self, state: ControllerState, mode: str) -> None:
+        state.last_set_mode = mode
+        if self.device_mode != mode:
+            self.device_mode = mode
+            self.report.writes_ac_mode += 1
+
+    def _set_limit(
+        self,
+        state: ControllerState,
+        key: str,
+        watts: float,
+        now_ts: float,
+        error_w: float | None,
+        *,
+        mandatory: bool = False,
+    ) -> bool:
+        val = int(round(float(watts), 0))
+        last = getattr(state, key)
+        self.pending.pop(key, None)
+        if last == val:
+            return False
+        budget = self.budget
+        if budget is not None:
+            if mandatory:
+                budget.bucket.take(now_ts)
+                budget.mandatory += 1
+            elif not budget.worth_writing(val, last, error_w):
+                budget.suppressed += 1
+                return False
+            elif not budget.bucket.try_take(now_ts):
+                # retried with the newest value on the next sample
+                budget.throttled += 1
+                self.pending[key] = val
+                return False
+            else:
+                budget.issued += 1
+        setattr(state, key, val)
+        return True
+
+    def apply(self, state: ControllerState, d: Decision, now_ts: float, error_w: float | None = None) -> None:
+        # same order as actuation.Actuator, every step confirmed at once
+        if (
+            d.ac_mode == ZENDURE_MODE_INPUT
+            and state.last_set_mode != ZENDURE_MODE_INPUT
+            and state.last_set_output_w != 0
+        ):
+            if self._set_limit(state, "last_set_output_w", 0, now_ts, error_w, mandatory=True):
+                self.report.writes_output_limit += 1
+
+        self._set_ac_mode(state, d.ac_mode)
+        if self._set_limit(state, "last_set_input_w", d.in_w, now_ts, error_w):
+            self.report.writes_input_limit += 1
+        if self._set_limit(state, "last_set_output_w", d.out_w, now_ts, error_w):
+            self.report.writes_output_limit += 1
+
+    def held_output_w(self, state: ControllerState) -> int | None:
+        """Like Actuator.expected_output_w: written or pending output limit."""
+        return self.pending.get("last_set_output_w", state.last_set_output_w)
+
+    def battery_w(self, state: ControllerState, d: Decision) -> float:
+        """AC power the device runs with (last written limits, + charge)."""
+        if self.device_mode == ZENDURE_MODE_INPUT:
+            return float(state.last_set_input_w or 0)
+        if d.out_w_real <= 0.0:
+            return 0.0
+        return -float(state.last_set_output_w or 0)
+
+
+# --------------------------------------------------
+# replay
+# --------------------------------------------------
+def default_settings(
+    profile_key: str = DEFAULT_DEVICE_PROFILE,
+    ai_mode: str = AI_MODE_AUTOMATIC,
+) -> Settings:
+    profile = DEVICE_PROFILES[profile_key]
+    return Settings(
+        soc_min=DEFAULT_SOC_MIN,
+        soc_max=DEFAULT_SOC_MAX,
+        max_charge=min(DEFAULT_MAX_CHARGE, float(profile.get("MAX_INPUT_W", DEFAULT_MAX_CHARGE))),
+        max_discharge=min(DEFAULT_MAX_DISCHARGE, float(profile.get("MAX_OUTPUT_W", DEFAULT_MAX_DISCHARGE))),
+        expensive=DEFAULT_PRICE_THRESHOLD,
+        very_expensive=DEFAULT_VERY_EXPENSIVE_THRESHOLD,
+        emergency_soc=DEFAULT_EMERGENCY_SOC,
+        emergency_w=DEFAULT_EMERGENCY_CHARGE,
+        profit_margin_pct=DEFAULT_PROFIT_MARGIN_PCT,
+        ai_mode=ai_mode,
+        manual_action=MANUAL_STANDBY,
+        profile=profile,
+    )
+
+
+def replay(
+    samples: list[Sample],
+    settings: Settings,
+    *,
+    strategy: str = PLANNING_STRATEGY_PEAK_WINDOW,
+    closed_loop: bool = False,
+    capacity_kwh: float | None = None,
+    planning_charge_w: float = DEFAULT_PLANNING_CHARGE_W,
+    lookahead_h: float = 24.0,
+    state: ControllerState | None = None,
+    write_budget: bool = True,
+) -> ReplayReport:
+    """
+    Feed the samples through the engine.
+
+    Open loop (default): the engine sees the recorded SoC and grid, i.e. what
+    it would have decided on that day; grid totals are recorded grid plus the
+    difference between decided and recorded battery power.
+    Closed loop: SoC is integrated from the setpoints and the grid the engine
+    sees is the recorded baseline plus the simulated battery (ideal actuator,
+    setpoints take effect on the next sample).
+    With write_budget the limits go through the same change threshold and
+    token bucket as on the device, and the battery runs on the written values.
+    """
+    report = ReplayReport()
+    budget = WriteBudget() if write_budget else None
+    actuator = CountingActuator(report, budget)
+    state = ControllerState() if state is None else state
+    if not samples:
+        return report
+
+    curve = price_curve_from_samples(samples)
+    lookahead_s = lookahead_h * 3600.0
+    eta = min(max(float(settings.profile.get("ROUND_TRIP_EFF", DEFAULT_ROUND_TRIP_EFFICIENCY)), 0.01), 1.0) ** 0.5
+    if capacity_kwh is None:
+        capacity_kwh = float(settings.profile.get("BATTERY_CAPACITY_KWH", DEFAULT_BATTERY_CAPACITY_KWH))
+    cap_wh = max(capacity_kwh, 1e-6) * 1000.0
+
+    planning: dict[str, Any] = {}
+    plan_slot: float | None = None
+    plan_soc: float | None = None
+
+    soc = samples[0].soc
+    battery_w = 0.0  # simulated AC battery power of the previous setpoint
+    prev_ts: float | None = None
+    decisions = report.decisions
+
+    started = time.perf_counter()
+    for s in samples:
+        dt_h = 0.0 if prev_ts is None else max(s.ts - prev_ts, 0.0) / 3600.0
+        prev_ts = s.ts
+
+        if closed_loop:
+            if battery_w > 0.0:
+                soc += battery_w * dt_h * eta / cap_wh * 100.0
+            elif battery_w < 0.0:
+                soc += battery_w * dt_h / eta / cap_wh * 100.0
+            soc = min(max(soc, 0.0), 100.0)
+            grid = s.grid_w - s.battery_w + battery_w
+        else:
+            soc = s.soc
+            grid = s.grid_w
+
+        m = Measurements(
+            now_ts=s.ts,
+            soc=soc,
+            pv_w=s.pv_w,
+            deficit_w=grid if grid > 0.0 else 0.0,
+            surplus_w=-grid if grid < 0.0 else 0.0,
+            price_now=s.price,
+        )
+
+        # slow loop: same triggers as the coordinator (slot boundary, SoC move)
+        slot = s.ts - (s.ts % SLOT_S)
+        if plan_slot != slot or plan_soc is None or abs(soc - plan_soc) >= PLANNING_SOC_DELTA:
+            planning = evaluate_price_planning(
+                _visible(curve, s.ts, lookahead_s) if curve is not None else None,
+                s.ts,
+                soc=soc,
+                soc_max=settings.soc_max,
+                soc_min=settings.soc_min,
+                price_now=s.price,
+                expensive=settings.expensive,
+                very_expensive=settings.very_expensive,
+                profit_margin_pct=settings.profit_margin_pct,
+                max_charge=settings.max_charge,
+                max_discharge=settings.max_discharge,
+                ai_mode=settings.ai_mode,
+                strategy=strategy,
+                capacity_kwh=capacity_kwh,
+                slot_charge_w=min(planning_charge_w, settings.max_charge),
+                round_trip_eff=float(settings.profile.get("ROUND_TRIP_EFF", DEFAULT_ROUND_TRIP_EFFICIENCY)),
+            )
+            store_planning(state, planning)
+            plan_slot, plan_soc = slot, soc
+            report.planning_runs += 1
+
+        d = decide(state, m, settings, planning, track_output=False)
+        actuator.apply(
+            state,
+            d,
+            s.ts,
+            error_w=d.net_grid_w - float(settings.profile.get("TARGET_IMPORT_W", 0.0)),
+        )
+        track_applied_output(state, s.ts, d, actuator.held_output_w(state))
+        update_analytics(state, m, settings, d)
+
+        decisions[d.decision_reason] = decisions.get(d.decision_reason, 0) + 1
+
+        # grid balance over the interval that just ended (previous setpoint)
+        if dt_h > 0.0:
+            if not closed_loop:
+                grid = s.grid_w - s.battery_w + battery_w
+            if grid > 0.0:
+                report.import_kwh += grid * dt_h / 1000.0
+                if s.price is not None:
+                    report.import_cost_eur += grid * dt_h / 1000.0 * s.price
+            else:
+                report.export_kwh += -grid * dt_h / 1000.0
+
+        if budget is None:
+            battery_w = d.in_w if d.ac_mode == ZENDURE_MODE_INPUT else -d.out_w_real
+        else:
+            battery_w = actuator.battery_w(state, d)
+        if closed_loop and (
+            (battery_w > 0.0 and soc >= 100.0) or (battery_w < 0.0 and soc <= 0.0)
+        ):
+            battery_w = 0.0
+
+    report.runtime_s = time.perf_counter() - started
+    report.steps = len(samples)
+    report.duration_h = (samples[-1].ts - samples[0].ts) / 3600.0
+    report.charged_kwh = state.charged_kwh
+    report.discharged_kwh = state.discharged_kwh
+    report.profit_eur = state.profit_eur
+    if budget is not None:
+        report.writes_suppressed = budget.suppressed
+        report.writes_throttled = budget.throttled
+    return report
+
+
+# --------------------------------------------------
+# CLI
+# --------------------------------------------------
+def _print_report(report: ReplayReport, out: Any = sys.stdout) -> None:
+    d = report.as_dict()
+    decisions = d.pop("decisions")
+    width = max(len(k) for k in d)
+    for k, v in d.items():
+        if isinstance(v, float):
+            v = round(v, 3)
+        print(f"{k:<{width}}  {v}", file=out)
+    print("decisions:", file=out)
+    for k, v in sorted(decisions.items(), key=lambda kv: -kv[1]):
+        print(f"  {k:<{width - 2}}  {v}", file=out)
+
+
+def _parse_args(argv: list[str] | None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(
+        prog="python -m custom_components.zendure_smartflow_ai.sim.replay",
+        description="Replay recorded SoC / PV / grid / price series through the decision engine.",
+    )
+    p.add_argument("file", help="CSV or JSON time series")
+    p.add_argument("--profile", default=DEFAULT_DEVICE_PROFILE, choices=sorted(DEVICE_PROFILES))
+    p.add_argument("--ai-mode", default=AI_MODE_AUTOMATIC)
+    p.add_argument("--strategy", default=PLANNING_STRATEGY_PEAK_WINDOW)
+    p.add_argument("--closed-loop", action="store_true", help="integrate SoC / grid from the setpoints")
+    p.add_argument("--capacity-kwh", type=float, default=None, help="default: device profile")
+    p.add_argument(
+        "--planning-charge-w",
+        type=float,
+        default=DEFAULT_PLANNING_CHARGE_W,
+        help="planned charge power per slot (max charge: all-or-nothing)",
+    )
+    p.add_argument("--lookahead-h", type=float, default=24.0, help="visible price horizon")
+    p.add_argument("--no-write-budget", action="store_true", help="write every setpoint change")
+    p.add_argument("--json", action="store_true", help="print the report as JSON")
+    return p.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = _parse_args(argv)
+    samples = load_samples(args.file)
+    if not samples:
+        print(f"no usable rows in {args.file}", file=sys.stderr)
+        return 1
+
+    report = replay(
+        samples,
+        default_settings(args.profile, args.ai_mode),
+        strategy=args.strategy,
+        closed_loop=args.closed_loop,
+        capacity_kwh=args.capacity_kwh,
+        planning_charge_w=args.planning_charge_w,
+        lookahead_h=args.lookahead_h,
+        write_budget=not args.no_write_budget,
+    )
+    if args.json:
+        print(json.dumps(report.as_dict(), indent=2))
+    else:
+        _print_report(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+from typing import Any
+
+# ==================================================
+# Regler-/Auswertungszustand eines Config-Eintrags
+#
+# Feste Attribute (__slots__) statt eines freien Dicts: Typen stehen
+# einmal fest (Umwandlung nur beim Laden), Zugriffe ohne String-Lookup.
+# Gespeichert werden nur die DURABLE-Felder, und davon nur die, die vom
+# Startwert abweichen (STORE_VERSION 2).
+# ==================================================
+
+# Only these fields go to .storage (delayed, coalesced). Everything else
+# (EMA state, timestamps, last setpoints, planning transparency) is volatile
+# and rebuilt within a few cycles after a restart.
+DURABLE_FIELDS: dict[str, type] = {
+    "emergency_active": bool,
+    "price_discharge_latched": bool,
+    "block_planning_charge_until_price": float,
+    "trade_avg_charge_price": float,
+    "trade_charged_kwh": float,
+    "avg_charge_price": float,
+    "charged_kwh": float,
+    "discharged_kwh": float,
+    "profit_eur": float,
+    "autotune": dict,
+}
+
+
+class ControllerState:
+    """Engine, actuation and analytics state of one config entry."""
+
+    __slots__ = (
+        # hysteresis / latches
+        "pv_surplus_cnt",
+        "emergency_active",
+        "price_discharge_latched",
+        "block_planning_charge_until_price",
+        "prev_ai_mode",
+        # planning transparency
+        "planning_checked",
+        "planning_status",
+        "planning_blocked_by",
+        "planning_active",
+        "planning_target_soc",
+        "planning_next_peak",
+        "planning_reason",
+        "next_planned_action",
+        "next_planned_action_time",
+        "next_action_time",
+        # analytics
+        "trade_avg_charge_price",
+        "trade_charged_kwh",
+        "prev_soc",
+        "avg_charge_price",
+        "charged_kwh",
+        "discharged_kwh",
+        "profit_eur",
+        "last_ts",
+        # last confirmed setpoints (actuation.py)
+        "last_set_mode",
+        "last_set_input_w",
+        "last_set_output_w",
+        # controller memory
+        "power_state",
+        "discharge_target_w",
+        "ema_surplus",
+        "ema_house_load",
+        "ema_last_ts",
+        "inflight",
+        "last_out_w",
+        "ff_prev_load",
+        "ff_prev_pv",
+        # auto-tune result (estimates + learned controller parameters)
+        "autotune",
+    )
+
+    def __init__(self) -> None:
+        self.pv_surplus_cnt: int = 0
+        self.emergency_active: bool = False
+        self.price_discharge_latched: bool = False
+        self.block_planning_charge_until_price: float | None = None
+        self.prev_ai_mode: str | None = None
+
+        self.planning_checked: bool = False
+        self.planning_status: str | None = "not_checked"
+        self.planning_blocked_by: str | None = None
+        self.planning_active: bool = False
+        self.planning_target_soc: float | None = None
+        self.planning_next_peak: str | None = None
+        self.planning_reason: str | None = None
+        self.next_planned_action: str | None = None  # charge | discharge | wait | emergency | none
+        self.next_planned_action_time: str | None = None  # ISO timestamp / ""
+        self.next_action_time: str | None = None
+
+        self.trade_avg_charge_price: float | None = None
+        self.trade_charged_kwh: float = 0.0
+        self.prev_soc: float | None = None
+        self.avg_charge_price: float | None = None
+        self.charged_kwh: float = 0.0
+        self.discharged_kwh: float = 0.0
+        self.profit_eur: float = 0.0
+        self.last_ts: float | None = None
+
+        self.last_set_mode: str | None = None
+        self.last_set_input_w: int | None = None
+        self.last_set_output_w: int | None = None
+
+        self.power_state: str = "idle"  # idle | discharging | charging
+        self.discharge_target_w: float = 0.0
+        self.ema_surplus: float | None = None
+        self.ema_house_load: float | None = None
+        self.ema_last_ts: float | None = None
+        self.inflight: list[tuple[float, float]] = []  # (ts, output change) in dead time
+        self.last_out_w: float | None = None
+        self.ff_prev_load: float | None = None
+        self.ff_prev_pv: float | None = None
+
+        self.autotune: dict[str, Any] | None = None
+
+    def as_dict(self) -> dict[str, Any]:
+        """All fields (diagnostics)."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    # --------------------------------------------------
+    # Store (STORE_VERSION 2)
+    # --------------------------------------------------
+    def durable(self) -> dict[str, Any]:
+        """Durable fields that differ from a fresh state."""
+        return {
+            name: value
+            for name in DURABLE_FIELDS
+            if (value := getattr(self, name)) != getattr(_DEFAULTS, name)
+        }
+
+    def restore(self, data: dict[str, Any]) -> None:
+        """Load durable fields (already migrated); types are checked once here."""
+        for name, value in coerce_durable(data).items():
+            setattr(self, name, value)
+
+
+def coerce_durable(data: dict[str, Any]) -> dict[str, Any]:
+    """Known durable fields with the right type; unknown keys and junk are dropped."""
+    out: dict[str, Any] = {}
+    for name, kind in DURABLE_FIELDS.items():
+        value = data.get(name)
+        if value is None:
+            continue
+        if kind is dict:
+            if isinstance(value, dict):
+                out[name] = value
+            continue
+        try:
+            out[name] = kind(value)
+        except (TypeError, ValueError):
+            continue
+    return out
+
+
+def migrate_v1(data: dict[str, Any]) -> dict[str, Any]:
+    """
+    v1 (free-form _persist dict, every durable key, older releases also the
+    volatile ones) -> v2 (runtime_mode + durable fields that are not default).
+    """
+    out: dict[str, Any] = {}
+    if isinstance(data.get("runtime_mode"), dict):
+        out["runtime_mode"] = dict(data["runtime_mode"])
+    out.update(
+        (name, value)
+        for name, value in coerce_durable(data).items()
+        if value != getattr(_DEFAULTS, name)
+    )
+    return out
+
+
+_DEFAULTS = ControllerState()
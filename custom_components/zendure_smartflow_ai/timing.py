@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import time
+from collections import deque
+from typing import Any
+
+from .const import TIMING_WINDOW
+
+# ==================================================
+# Laufzeitmessung des Regelzyklus
+#
+# Jede Stufe wird mit der monotonen Uhr gemessen, die letzten
+# TIMING_WINDOW Werte je Stufe bleiben im Speicher (p50/p95/max).
+# Nur Zeitstempel im heißen Pfad, Perzentile erst bei Abfrage.
+# ==================================================
+
+
+class _Lap:
+    """One cycle: mark() closes the stage that started at the previous mark."""
+
+    __slots__ = ("_timer", "_start", "_last")
+
+    def __init__(self, timer: StageTimer) -> None:
+        self._timer = timer
+        self._start = self._last = time.perf_counter()
+
+    def mark(self, stage: str) -> None:
+        now = time.perf_counter()
+        self._timer.record(stage, now - self._last)
+        self._last = now
+
+    def done(self) -> None:
+        self._timer.record("total", time.perf_counter() - self._start)
+
+
+class StageTimer:
+    """Rolling per-stage durations of the update cycle."""
+
+    def __init__(self, window: int = TIMING_WINDOW) -> None:
+        self.window = window
+        self._samples: dict[str, deque[float]] = {}
+
+    def lap(self) -> _Lap:
+        return _Lap(self)
+
+    def record(self, stage: str, seconds: float) -> None:
+        samples = self._samples.get(stage)
+        if samples is None:
+            samples = self._samples[stage] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def percentile_ms(self, stage: str, q: float) -> float | None:
+        samples = self._samples.get(stage)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000.0, 1)
+
+    def summary(self) -> dict[str, Any]:
+        """p50 / p95 / max in ms per stage (diagnostics)."""
+        out: dict[str, Any] = {}
+        for stage, samples in self._samples.items():
+            ordered = sorted(samples)
+            n = len(ordered)
+            out[stage] = {
+                "p50_ms": round(ordered[n // 2] * 1000.0, 1),
+                "p95_ms": round(ordered[min(int(0.95 * n), n - 1)] * 1000.0, 1),
+                "max_ms": round(ordered[-1] * 1000.0, 1),
+                "samples": n,
+            }
+        return out
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+from typing import Any
+
+from .const import (
+    WRITE_BUDGET_BURST,
+    WRITE_BUDGET_PER_MIN,
+    WRITE_ERROR_SCALE_W,
+    WRITE_MAX_DELTA_W,
+    WRITE_MIN_DELTA_W,
+)
+
+# ==================================================
+# Schreibbudget für Leistungslimits
+#
+# Zendure leitet jeden Sollwert über Cloud/MQTT weiter und drosselt bei
+# zu vielen Schreibzugriffen. Deshalb:
+# - Mindeständerung abhängig vom Regelfehler: nahe am Ziel (Rauschen)
+#   groß, bei großem Fehler klein
+# - Token-Bucket: höchstens WRITE_BUDGET_PER_MIN Schreibzugriffe pro Minute
+#   (jede Wiederholung zählt; ein bereits gemeldeter Wert kostet nichts)
+# - Zwischenwerte, die auf ein Token warten, werden vom neuesten ersetzt
+# AC-Modus und das Nullsetzen vor AC-Eingang sind nie gedrosselt.
+# ==================================================
+
+
+def min_change_w(
+    error_w: float | None,
+    *,
+    min_w: float = WRITE_MIN_DELTA_W,
+    max_w: float = WRITE_MAX_DELTA_W,
+    error_scale_w: float = WRITE_ERROR_SCALE_W,
+) -> float:
+    """Smallest setpoint change worth a write at this controller error."""
+    if error_w is None or error_scale_w <= 0.0:
+        return min_w
+    share = min(abs(float(error_w)) / error_scale_w, 1.0)
+    return max_w - (max_w - min_w) * share
+
+
+class TokenBucket:
+    """rate_per_min tokens per minute, at most burst saved up."""
+
+    def __init__(self, rate_per_min: float, burst: float) -> None:
+        self.rate_s = max(float(rate_per_min), 0.0) / 60.0
+        self.burst = max(float(burst), 1.0)
+        self.tokens = self.burst
+        self._last: float | None = None
+
+    def _refill(self, now: float) -> None:
+        if self._last is not None and now > self._last:
+            self.tokens = min(self.burst, self.tokens + (now - self._last) * self.rate_s)
+        self._last = now
+
+    def try_take(self, now: float) -> bool:
+        self._refill(now)
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+    def take(self, now: float) -> None:
+        """Mandatory write: always allowed, still uses up budget."""
+        self._refill(now)
+        self.tokens = max(self.tokens - 1.0, 0.0)
+
+    def wait_s(self, now: float) -> float:
+        self._refill(now)
+        if self.tokens >= 1.0:
+            return 0.0
+        if self.rate_s <= 0.0:
+            return float("inf")
+        return (1.0 - self.tokens) / self.rate_s
+
+
+class WriteBudget:
+    """Change threshold + token bucket + counters for limit writes."""
+
+    def __init__(
+        self,
+        *,
+        rate_per_min: float = WRITE_BUDGET_PER_MIN,
+        burst: float = WRITE_BUDGET_BURST,
+    ) -> None:
+        self.bucket = TokenBucket(rate_per_min, burst)
+        self.issued = 0
+        self.mandatory = 0
+        self.suppressed = 0  # change below the threshold
+        self.coalesced = 0  # replaced by a newer value before it was written
+        self.throttled = 0  # had to wait for a token
+
+    @staticmethod
+    def worth_writing(new_w: int, last_w: int | None, error_w: float | None) -> bool:
+        # unknown device value and "off" always go through
+        if last_w is None or new_w == 0:
+            return new_w != last_w
+        return abs(new_w - last_w) >= min_change_w(error_w)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "issued": self.issued,
+            "mandatory": self.mandatory,
+            "suppressed": self.suppressed,
+            "coalesced": self.coalesced,
+            "throttled": self.throttled,
+            "tokens": round(self.bucket.tokens, 2),
+        }